@@ -3,13 +3,13 @@ Created on 13.02.2017
 
 @author: Paul
 '''
-import sqlite3
 import os
 import time
 from   datetime import date
 import datetime
 from   eezz.table    import TDbTable
 from   eezz.service  import TBlackBoard
+from   eezz.dbpool   import TDbPool
 from   optparse      import OptionParser
 
 class TChart(TDbTable):
@@ -18,18 +18,16 @@ class TChart(TDbTable):
         self.mLocation   = os.path.join(self.mBlackboard.mRootPath, '..', 'database', 'carfleet.db') # os.path.join(aRootPath, 'database', 'carfleet.db')        
         
         if not os.path.exists(self.mLocation):            
-            self.mDatabase = sqlite3.connect(self.mLocation) 
-            self.mDatabase.execute('''CREATE TABLE tEvents
+            xDatabase = TDbPool().getConnection(self.mLocation) 
+            xDatabase.execute('''CREATE TABLE tEvents
                  (cdate date, csymbol text, cdescr text)''')
             
             xDate = date(2017, 1, 14)
             for i in range(10):
-                self.mDatabase.execute('''INSERT INTO tEvents (cdate, csymbol, cdescr) values(?,?,?) ''',
+                xDatabase.execute('''INSERT INTO tEvents (cdate, csymbol, cdescr) values(?,?,?) ''',
                     (xDate, chr(ord('A')+i), 'some description texts'))
                 xDate += datetime.timedelta(weeks=4)
-            self.mDatabase.commit()
-        else:
-            self.mDatabase   = sqlite3.connect(self.mLocation) 
+            xDatabase.commit()
         
         super().__init__(self.mLocation, {'select':['cdate','csymbol','cdescr'], 'from':['tEvents']})
 
@@ -42,14 +42,11 @@ class TDirView(TTable):
         self.mHeaderDic['selected_entry'] = xWalk[0]
             
         self.clear()
-        self.append(['..'])
-        for xFile in xWalk[1]:
-            self.append([xFile])
+        self.extend_rows([['..']] + [[xFile] for xFile in xWalk[1]])
 
         self.mDetail.clear()
         self.mDetail.mHeaderDic['selected_entry'] = self.mHeaderDic['selected_entry']
-        for xFile in xWalk[2]:
-            self.mDetail.append([xFile])
+        self.mDetail.extend_rows([[xFile] for xFile in xWalk[2]])
 
     # ---------------------------------------------------------------
     # ---------------------------------------------------------------
@@ -108,14 +105,11 @@ class TDirView(TTable):
             
         self.mHeaderDic['selected_entry'] = xWalk[0]
         
-        for xFile in xWalk[1]:
-            xTblNode = TTable(list(), xFile)
-            xCell    = TCell(0, 'directory', {'data-current-path': os.path.join(xWalk[0], xFile)})
-            xTree.append([xTblNode], xCell)
+        xTree.extend_rows([[TTable(list(), xFile)] for xFile in xWalk[1]],
+                          [TCell(0, 'directory', {'data-current-path': os.path.join(xWalk[0], xFile)}) for xFile in xWalk[1]])
         
-        for xFile in xWalk[2]:
-            xCell    = TCell(0, 'file', {'data-current-path': os.path.join(xWalk[0], xFile)})
-            xTree.append([xFile], xCell)
+        xTree.extend_rows([[xFile] for xFile in xWalk[2]],
+                          [TCell(0, 'file', {'data-current-path': os.path.join(xWalk[0], xFile)}) for xFile in xWalk[2]])
         
         xTree.mHeaderDic['selected_entry'] = path
         xTree.mHeaderDic['table_id']       = node
@@ -22,6 +22,7 @@
  
 """
 import os, re, io, sys
+import string
 import uuid
 import html
 from   html.parser   import HTMLParser
@@ -34,8 +35,9 @@ import json
 import threading
 import sqlite3
 
-from   eezz.table    import TTable, TCell
+from   eezz.table    import TTable, TCell, TDbTable
 from   eezz.service  import TBlackBoard
+from   eezz.template import TTemplate, TTemplateCache, cloneJson
 
 
 # --------------------------------------------------------
@@ -63,6 +65,7 @@ class THtmlTag(dict):
         self.mChildren   = list()
         self.mElements   = list()
         self.mId         = str()
+        self.mRows       = list()
   
     # --------------------------------------------------------
     # Generate HTML output according the parser input 
@@ -109,6 +112,8 @@ class THtmlTag(dict):
 # tag attributes and data content
 # --------------------------------------------------------
 class TEezzAgent(HTMLParser):
+    # Slots of a compiled table row: Row-id, column values and the row-id in the event
+    mRowSlots = re.compile('\x01(R|C[0-9]+)\x01|%5Cu0001(R)%5Cu0001')
     
     # --------------------------------------------------------
     # Initialize the parser
@@ -133,6 +138,10 @@ class TEezzAgent(HTMLParser):
         self.mtimer       = 0
         self.mGlobals     = dict()
         self.mUpdateVector = dict()
+        self.mPatchRows   = True
+        self.mCompileRows = True
+        self.mRowSegments = dict()
+        self.mRowSnapshot = dict()
         self.mCookie      = uuid.uuid1()
         self.mBlackboard  = TBlackBoard()
         self.mAsyncThr    = None
@@ -367,6 +376,8 @@ class TEezzAgent(HTMLParser):
                 xJsonResult = dict()
                 xJsonResult['update']      = dict()
                 xJsonResult['updateValue'] = dict()
+                xJsonResult['patch']       = dict()
+                xFragments                 = list()
                                 
                 xKeyList = list(aJsonObj['update'].keys())
                 if xTraceUpdate.get('update'):
@@ -408,7 +419,16 @@ class TEezzAgent(HTMLParser):
                         #if xHtmlTag.get('class') == 'eezzTreeNode':
                         #    xNodeId = xHtmlTag.get('id')
                         #    xEntry  = '{}.{}'.format(xKey, xNodeId)
+                        
+                        # Send only the rows changed since the last update of this table
+                        if xUpdateFromServer and len(xDstFields) == 2 and 'path' not in aJsonObj:
+                            xPatch = self.diffTableRows(xSrcName, xHtmlTag)
+                            if xPatch != None:
+                                xJsonResult['patch'][xSrcName] = xPatch
+                                continue
+                        
                         xJsonResult['update'][xEntry] = urllib.parse.quote( xHtmlTag.mInnerHtml.getvalue() )
+                        xFragments.append( (xDstFields[0], xUpdateFromServer and len(xDstFields) == 2) )
                         continue
                     
                     if xUpdateFromServer:
@@ -418,21 +438,119 @@ class TEezzAgent(HTMLParser):
                     elif len(xSrcFields) > 1:
                         xServerValue = xHtmlTag.get(xSrcAttr)
                         xJsonResult['update'][xKey] = urllib.parse.quote(xServerValue)
+                
+                self.resetTableRows(xFragments, xJsonResult['patch'])
             except (KeyError, AttributeError) as aEx:
                 print('key error:' + str(aEx))            
             
+            # The document is sent in total: Keep the rows for the next update
+            if 'path' in aJsonObj:
+                self.mRowSnapshot.clear()
+                for xName in self.mRowSegments.keys():
+                    self.diffTableRows(xName, self.mElements.get(xName))
+            
             # send the response
             aJsonObj['update']      = xJsonResult['update']
             aJsonObj['updateValue'] = xJsonResult['updateValue']
+            if xJsonResult['patch']:
+                aJsonObj['patch']   = xJsonResult['patch']
             
             return json.dumps(aJsonObj)
             
+    # --------------------------------------------------------
+    # The browser replaces the fragments sent as innerHTML in
+    # total, including the rows of the tables inside. A patch
+    # of these tables would repeat rows already on the page:
+    # The patch is dropped and the snapshot is taken from the
+    # rows sent. For a fragment sent to another element or to
+    # a sub-tree the snapshot is dropped.
+    # --------------------------------------------------------
+    def resetTableRows(self, aFragments, aPatch):
+        if not aFragments:
+            return
+        
+        xTemplate = TTemplateCache().getTemplate(self.mCurrentDocument)
+        for xName in set(self.mRowSegments.keys()) | set(self.mRowSnapshot.keys()):
+            for xDstName, xRendered in aFragments:
+                # Tables unknown to the template could be anywhere
+                if xName != xDstName and xName in xTemplate.mNames and not xTemplate.isNameInside(xName, xDstName):
+                    continue
+                
+                aPatch.pop(xName, None)
+                self.mRowSnapshot.pop(xName, None)
+                if xRendered and xName in self.mRowSegments:
+                    self.diffTableRows(xName, self.mElements.get(xName))
+                break
+        
+    # --------------------------------------------------------
+    # Compare the rows of a table with the rows sent with the
+    # last update. Returns a patch with the rows inserted, removed
+    # and changed, or None if the table has to be sent in total.
+    # The rows are identified by the row-id in column 0.
+    # --------------------------------------------------------
+    def diffTableRows(self, aName, aHtmlTag):
+        xSnapshot = self.mRowSnapshot.pop(aName, None)
+        xSegment  = self.mRowSegments.get(aName)
+        
+        if not self.mPatchRows or aHtmlTag == None or xSegment == None:
+            return None
+        
+        xInnerRows = xSegment.mInnerHtml.getvalue()
+        if xInnerRows != ''.join([x[1] for x in xSegment.mRows]):
+            return None
+        
+        # The selection is sent separately from the row content
+        xRows, xSelect = list(), None
+        for xRowId, xRowHtml, xSelected in xSegment.mRows:
+            if xSelected:
+                xSelect  = xRowId
+                xRowHtml = xRowHtml.replace('eezzTreeLeaf eezzSelected', 'eezzTreeLeaf', 1)
+            xRows.append( (xRowId, xRowHtml) )
+        
+        xRowMap = dict(xRows)
+        if len(xRowMap) != len(xRows):
+            return None
+        
+        xInner = aHtmlTag.mInnerHtml.getvalue()
+        xFrame = xInner.replace(xInnerRows, '', 1)
+        self.mRowSnapshot[aName] = (xFrame, xRows, xSelect)
+        
+        # Everything outside the rows has to be unchanged
+        if xSnapshot == None or xSnapshot[0] != xFrame:
+            return None
+        
+        xOldFrame, xOldRows, xOldSelect = xSnapshot
+        xOldMap  = dict(xOldRows)
+        xPatch   = dict()
+        xSize    = 0
+        
+        xRemove  = [x for x, y in xOldRows if x not in xRowMap]
+        xInsert  = {x: y for x, y in xRows if x not in xOldMap}
+        xChange  = {x: y for x, y in xRows if x in xOldMap and xOldMap[x] != y}
+        
+        if xRemove:
+            xPatch['remove'] = xRemove
+        if xInsert:
+            xPatch['insert'] = {x: urllib.parse.quote(y) for x, y in xInsert.items()}
+        if xChange:
+            xPatch['change'] = {x: urllib.parse.quote(y) for x, y in xChange.items()}
+        if [x for x, y in xRows] != [x for x, y in xOldRows if x in xRowMap]:
+            xPatch['order']  = [x for x, y in xRows]
+        if xSelect != xOldSelect or xSelect in xInsert or xSelect in xChange:
+            xPatch['select'] = xSelect
+        
+        for xValue in list(xInsert.values()) + list(xChange.values()):
+            xSize += len(xValue)
+        if xSize >= len(xInner):
+            return None
+        return xPatch
+    
     # --------------------------------------------------------
     # The method asyncResponse is designed to run in an own
     # thread. It executes a given JSON-callback and send the
     # changes to the UI.
     # --------------------------------------------------------
-    def async(self):
+    def asyncResponse(self):
         while True:
             xInterest = self.mBlackboard.getInterest(self.mCookie)
             if xInterest:
@@ -468,11 +586,16 @@ class TEezzAgent(HTMLParser):
 
                 self.mSession         = aSession
                 self.mCurrentDocument = aFile
+                self.mRowSegments     = dict()
                         
                 aParent.mInnerHtml = io.StringIO()        
-                with open(self.mCurrentDocument, 'r') as aFile:
-                    for xContent in aFile:
-                        self.feed(xContent)
+                xTemplate = TTemplateCache().getTemplate(self.mCurrentDocument)
+                xUpdate   = self.getUpdateNames(aJsonObj)
+                
+                if xUpdate:
+                    self.evaluate(xTemplate, xTemplate.getPlan(*xUpdate))
+                else:
+                    self.evaluate(xTemplate)
                 
                 # At this point the stack has to be finished
                 if len(self.mTagStack) > 1:
@@ -493,6 +616,79 @@ class TEezzAgent(HTMLParser):
         except Exception as xEx:
             raise xEx
             
+    # --------------------------------------------------------
+    # Replay the compiled document on this session
+    # --------------------------------------------------------
+    def evaluate(self, aTemplate, aPlan = None):
+        if aPlan == None:
+            for xCode, xPos, xArgs in aTemplate.mCode:
+                self.evaluateCode(xCode, xPos, xArgs)
+            return
+        
+        for xStart, xEnd, xMode in aPlan:
+            for xCode, xPos, xArgs in aTemplate.mCode[xStart:xEnd]:
+                if xMode == TTemplate.POP:
+                    if len(self.mTagStack) > 1:
+                        self.mTagStack.pop()
+                else:
+                    self.evaluateCode(xCode, xPos, xArgs)
+    
+    # --------------------------------------------------------
+    # Execute a single instruction of the compiled document
+    # --------------------------------------------------------
+    def evaluateCode(self, aCode, aPos, aArgs):
+        self.lineno, self.offset = aPos
+        
+        if aCode == TTemplate.START:
+            self.handle_starttag(*aArgs)
+        elif aCode == TTemplate.END:
+            self.handle_endtag(*aArgs)
+        elif aCode == TTemplate.DATA:
+            self.handle_data(*aArgs)
+        elif aCode == TTemplate.CHARREF:
+            self.handle_charref(*aArgs)
+        elif aCode == TTemplate.DECL:
+            self.handle_decl(*aArgs)
+    
+    # --------------------------------------------------------
+    # Collect the elements referenced by the update of a request
+    # Returns (render, attributes) or None for a complete render
+    # --------------------------------------------------------
+    def getUpdateNames(self, aJsonObj):
+        if not aJsonObj or 'path' in aJsonObj:
+            return None
+        
+        if not isinstance(aJsonObj.get('update'), dict):
+            return None
+        
+        xRender = set()
+        xAttrs  = set()
+        
+        for xKey, xValue in aJsonObj['update'].items():
+            xDstFields = xKey.split('.')
+            xSrcFields = str(xValue).split('.')
+            
+            if xValue == '*':
+                xSrcFields = xDstFields
+            if len(xSrcFields) not in (2, 3):
+                continue
+            
+            if xSrcFields[1] == 'innerHTML':
+                xRender.add(xSrcFields[0])
+            else:
+                xAttrs.add(xSrcFields[0])
+        return (xRender, xAttrs)
+    
+    # --------------------------------------------------------
+    # Decode a JSON attribute, take the compiled value if available
+    # --------------------------------------------------------
+    def decodeJson(self, aKey, aValue, aJsonAttr = None):
+        if aJsonAttr and aKey in aJsonAttr:
+            if aJsonAttr[aKey] == None:
+                raise ValueError(aValue)
+            return cloneJson(aJsonAttr[aKey])
+        return json.loads(aValue.replace('\'', '\"'))
+            
     # --------------------------------------------------------
     # Change the web-socket client address
     # --------------------------------------------------------
@@ -592,7 +788,7 @@ class TEezzAgent(HTMLParser):
     # format attributes reference the context of the current scope
     # format specification covers all embedded tags          
     # -------------------------------------------------------- 
-    def handle_starttag(self, aTagName, aAttrs):  
+    def handle_starttag(self, aTagName, aAttrs, aJsonAttr = None):  
         aParent     = self.mTagStack[-1]
         aSession    = self.mSession
         aHtmlTag    = None
@@ -624,7 +820,7 @@ class TEezzAgent(HTMLParser):
             #-- print('process start {} - {} {}'.format(aTagName, xKey, xValue))
             if xKey in ['data-eezz-action', 'data-eezz-event', 'data-eezz-push']:
                 try:
-                    xJsonObj = json.loads(xValue.replace('\'', '\"'))
+                    xJsonObj = self.decodeJson(xKey, xValue, aJsonAttr)
                 except ValueError as aEx:
                     self.mTraceStack.append(aCell=TCell(aType=601, aObject=[str(xLine), str(xOffset), xKey, xValue])) 
                     continue
@@ -747,7 +943,7 @@ class TEezzAgent(HTMLParser):
                                 if ('eezzAgent.async' in xJsonObj):
                                     self.mBlackboard.addInterest(self.mCookie)
                                     if self.mAsyncThr == None or not self.mAsyncThr.is_alive():
-                                        self.mAsyncThr = threading.Thread(target=self.async)
+                                        self.mAsyncThr = threading.Thread(target=self.asyncResponse)
                                         self.mAsyncThr.start()
                                     if xJsonObj.get('update'):
                                         self.mUpdateVector.update(xJsonObj.get('update'))
@@ -779,7 +975,7 @@ class TEezzAgent(HTMLParser):
                     aHtmlTag.mChildren.clear()
                 else:
                     try:
-                        aHtmlTag.mTemplate = json.loads(xValue.replace('\'', '\"'))
+                        aHtmlTag.mTemplate = self.decodeJson(xKey, xValue, aJsonAttr)
                     except ValueError as xEx:
                         self.mTraceStack.append(aCell=TCell(aType=601, aObject=[str(xLine), str(xOffset), xKey, xValue])) 
                         continue
@@ -1021,6 +1217,18 @@ class TEezzAgent(HTMLParser):
                     xNameInx.append(aNames.index(i))
         return xNameInx
             
+    # --------------------------------------------------------
+    # Return the indices of the columns referenced by the
+    # table-columns of the row templates
+    # --------------------------------------------------------
+    def getTableProjection(self, aRowList, aColumnNames):
+        xColumnInx = set()
+        for xTr in aRowList:
+            for xTd in xTr.mChildren:
+                if xTd.mTemplate.get('table-columns') and aColumnNames:
+                    xColumnInx.update( self.evalRange(xTd.mTemplate.get('table-columns'), aColumnNames) )
+        return xColumnInx
+    
     # --------------------------------------------------------
     # --------------------------------------------------------
     def generateTableSegment(self, aParent, aHtmlTag, aTableName):  
@@ -1047,10 +1255,14 @@ class TEezzAgent(HTMLParser):
             xTblName  = xTableTag.get('name')
                       
         xTableSeg.mInnerHtml = io.StringIO()
+        xTableSeg.mRows      = list()
 
         if xTable == None:
             xTable    = xTableTag.mObject
             xTblName  = xTableTag.get('name')
+        
+        if xTable != None and xTableSeg.mTagName == 'tbody':
+            self.mRowSegments[xTblName] = xTableSeg
             
         if xTable != None:
             xColumnNames  = xTable.get_columns()[0]
@@ -1076,6 +1288,10 @@ class TEezzAgent(HTMLParser):
             else:
                 xRowList.append(xTr)
         
+        # Select only the columns of the templates from the database
+        if isinstance(xTable, TDbTable) and xTableSeg.mTagName == 'tbody':
+            xTable.set_projection( self.getTableProjection(xRowList, xColumnNames) )
+            
         xTreeId = None
         if xTable != None and xTableTag.get('class') in ['eezzTreeNode', 'eezzTreeLeaf', 'eezzTreeTiles']:
             xTreeId = '{}:{}'.format(xTblName, xTable.mPath)
@@ -1106,6 +1322,33 @@ class TEezzAgent(HTMLParser):
                 else:
                     xColumnList = list()
                     
+                    # Plain rows are rendered by a compiled row function
+                    xRenderer = None
+                    if self.mCompileRows and not xTileLayout and not xTemplates and xTr.mTagName == 'tr':
+                        xRenderer = self.compileTableRow(xTableSeg, xTr, xColumnNames, xTblName, xTreeId, xTblUpdate)
+                    
+                    if xRenderer != None:
+                        xBuffer = list()
+                        for xInx, xRows in enumerate(xTable.get_raw_rows()):
+                            xRowId = str(xRows[0])
+                            
+                            if xRenderer == self.generatePlainRow:
+                                xRowHtml = self.generatePlainRow(xTableSeg, xTr, xRows, xColumnNames, xTblName, xTreeId, xTblUpdate)
+                            else:
+                                xRowHtml = xRenderer(xRows, xRowId)
+                            
+                            # Verify the compiled function on the first row
+                            if xInx == 0:
+                                xVerify = self.generatePlainRow(xTableSeg, xTr, xRows, xColumnNames, xTblName, xTreeId, xTblUpdate)
+                                if xVerify != xRowHtml:
+                                    xRowHtml  = xVerify
+                                    xRenderer = self.generatePlainRow
+                            
+                            xBuffer.append( xRowHtml )
+                            xTableSeg.mRows.append( (xRowId, xRowHtml, False) )
+                        xTableSeg.mInnerHtml.write( ''.join(xBuffer) )
+                        continue
+                    
                     for xInx, xRows in enumerate(xTable.get_raw_rows()):
                         xTrSave = xTr
                         xCell   = xRows[0]                        
@@ -1158,9 +1401,11 @@ class TEezzAgent(HTMLParser):
                             xTrTemplate['id']    = xSubTreeQt
                             xTrTemplate['class'] = xTrSave.get('class')
 
+                        xSelected = False
                         if xTrSave.get('class') == 'eezzTreeLeaf':
                             if xTable and xInx == xTable.get_selected_index():
                                 xTrTemplate['class'] = ' '.join(['eezzTreeLeaf','eezzSelected']) 
+                                xSelected = True
                             
                         if xTrSave.mJsonObj and xTrSave.mJsonObj.get('callback'):
                             xEvtUpdate.update( xTblUpdate )
@@ -1196,14 +1441,118 @@ class TEezzAgent(HTMLParser):
                                 xTableSeg.mInnerHtml.write( xTrTemplate.generateHtml() )
                                 xColumnList = list()
                         else:
+                            xRowId = str(xRows[0])
                             xTrTemplate['data-eezz-event'] = urllib.parse.quote( json.dumps( xEvent) )
+                            xTrTemplate['data-eezz-row']   = html.escape( xRowId )
                             xColumnList = self.generateTableRow(xTableSeg, xTrTemplate, xColumnNames, (xTblName, xTreeId, None))
                             self.generateTableCols( xTrTemplate, xColumnList )
-                            xTableSeg.mInnerHtml.write( xTrTemplate.generateHtml() )
+                            xRowHtml    = xTrTemplate.generateHtml()
+                            xTableSeg.mInnerHtml.write( xRowHtml )
+                            xTableSeg.mRows.append( (xRowId, xRowHtml, xSelected) )
 
         if aParent != None:
             aParent.mInnerHtml.write( aHtmlTag.generateHtml() )
 
+    # --------------------------------------------------------
+    # Generate a row without display templates and tree classes
+    # --------------------------------------------------------
+    def generatePlainRow(self, aTableSeg, aTr, aRow, aColumnNames, aTblName, aTreeId, aTblUpdate):
+        xTrTemplate = THtmlTag(aTr.mTagName)
+        xTrTemplate.update(aTr)
+        xTrTemplate.mJsonObj  = aTr.mJsonObj
+        xTrTemplate.mValue    = aRow
+        xTrTemplate.mChildren = aTr.mChildren
+        xTrTemplate.mDictionary.update(aTableSeg.mDictionary)
+        
+        xRowId     = str(aRow[0])
+        xEvent     = dict()
+        xEvtUpdate = dict()
+        xEvtUpdate.update( aTblUpdate )
+        
+        if aTr.mJsonObj and aTr.mJsonObj.get('callback'):
+            xEvent['callback'] = aTr.mJsonObj.get('callback')
+        else:
+            xEvent['callback'] = {'{}.do_select'.format(aTblName) : {'index': xRowId}}
+        xEvent['update'] = xEvtUpdate
+        
+        xTrTemplate['data-eezz-event'] = urllib.parse.quote( json.dumps( xEvent) )
+        xTrTemplate['data-eezz-row']   = html.escape( xRowId )
+        xColumnList = self.generateTableRow(aTableSeg, xTrTemplate, aColumnNames, (aTblName, aTreeId, None))
+        self.generateTableCols( xTrTemplate, xColumnList )
+        return xTrTemplate.generateHtml()
+    
+    # --------------------------------------------------------
+    # Compile a row template into a function, which takes the
+    # row and the row-id and returns the HTML of the row.
+    # The template is rendered once with marker values in the
+    # columns, which are replaced by slots of the function.
+    # Returns None if the output depends on more than the values
+    # --------------------------------------------------------
+    def compileTableRow(self, aTableSeg, aTr, aColumnNames, aTblName, aTreeId, aTblUpdate):
+        if aTr.get('class') in ['eezzTreeNode', 'eezzTreeLeaf', 'eezzTreeTiles'] or not aColumnNames:
+            return None
+        
+        xStack = list(aTr.mChildren)
+        while xStack:
+            xElem = xStack.pop()
+            if xElem.mTemplate.get('display'):
+                return None
+            if xElem.mTagName == 'cdata' and not self.isPlainFormat(xElem.mValue):
+                return None
+            xStack.extend(xElem.mChildren)
+        
+        xRow   = ['\x01R\x01'] + ['\x01C{}\x01'.format(i) for i in range(1, len(aColumnNames))]
+        xHtml  = self.generatePlainRow(aTableSeg, aTr, xRow, aColumnNames, aTblName, aTreeId, aTblUpdate)
+        xParts = self.mRowSlots.split(xHtml)
+        xSpace = {'escape': html.escape, 'quote': urllib.parse.quote, 'dumps': json.dumps}
+        xExprs = list()
+        
+        for xInx in range(0, len(xParts), 3):
+            xLiteral = xParts[xInx]
+            if '\x01' in xLiteral or '%5Cu0001' in xLiteral:
+                return None
+            if xLiteral:
+                xSpace['L{}'.format(xInx)] = xLiteral
+                xExprs.append('L{}'.format(xInx))
+            
+            if xInx + 1 >= len(xParts):
+                break
+            if xParts[xInx + 1] == 'R':
+                xExprs.append('xR')
+            elif xParts[xInx + 1]:
+                xExprs.append('escape(str(aRow[{}]))'.format(xParts[xInx + 1][1:]))
+            else:
+                xExprs.append('xJ')
+        
+        xSource = ['def render(aRow, aRowId):']
+        if 'xR' in xExprs:
+            xSource.append("    xR = escape(escape(aRowId)).replace('{', '&lbrace;').replace('}', '&rbrace;')")
+        if 'xJ' in xExprs:
+            xSource.append("    xJ = quote(dumps(aRowId)[1:-1])")
+        xSource.append("    return ''.join(({},))".format(', '.join(xExprs)))
+        
+        exec('\n'.join(xSource), xSpace)
+        return xSpace['render']
+    
+    # --------------------------------------------------------
+    # Check that a cell format uses the column value as it is
+    # --------------------------------------------------------
+    def isPlainFormat(self, aValue):
+        if not isinstance(aValue, str):
+            return True
+        
+        try:
+            for xLiteral, xField, xSpec, xConv in string.Formatter().parse(aValue):
+                if xField == None:
+                    continue
+                if xField.split('.')[0].split('[')[0] not in ('', '0'):
+                    continue
+                if xField not in ('', '0') or xSpec or xConv:
+                    return False
+        except ValueError:
+            pass
+        return True
+    
     # --------------------------------------------------------
     # --------------------------------------------------------
     def generateTableRow(self, aParent, aHtmlTag, aColumnNames, aJsnColEvt, aTilesLayout = False):
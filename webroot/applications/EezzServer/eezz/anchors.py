@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Sparse position index for the keyset navigation of TDbTable.
+   The index keeps the sort key of every mStep-th row of a select
+   statement in its current order: mAnchors[j] is the key of the row
+   at position (j + 1) * mStep - 1. A position p is reached by a seek
+   behind mAnchors[p // mStep - 1] and a scan of less than mStep rows.
+
+   The index is built by a background thread. Each anchor is read by
+   a seek behind the previous anchor, so the anchors are available
+   for the beginning of the result while the build continues.
+
+"""
+import sqlite3
+import threading
+from   eezz.dbpool   import TDbPool
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TAnchorIndex(threading.Thread):
+    # --------------------------------------------------------
+    # aCreateStmt(aValues) returns (statement, parameters) to
+    # select the key of the mStep-th row behind the key aValues
+    # or from the beginning for None
+    # --------------------------------------------------------
+    def __init__(self, aDatabase, aStep, aCreateStmt):
+        super().__init__(daemon=True)
+        self.mDatabase   = aDatabase
+        self.mStep       = aStep
+        self.mCreateStmt = aCreateStmt
+        self.mAnchors    = list()
+        self.mComplete   = False
+        self.mStop       = False
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def run(self):
+        xDatabase = TDbPool().getConnection(self.mDatabase)
+        xValues   = None
+        try:
+            while not self.mStop:
+                xStmt, xParameter = self.mCreateStmt(xValues)
+                xValues = xDatabase.execute(xStmt, xParameter).fetchone()
+                if xValues == None:
+                    self.mComplete = True
+                    break
+                self.mAnchors.append(tuple(xValues))
+        except sqlite3.Error:
+            pass
+        finally:
+            TDbPool().closeThread()
+
+    # --------------------------------------------------------
+    # Stop the build, e.g. after a change of the data
+    # --------------------------------------------------------
+    def stop(self):
+        self.mStop = True
+
+    # --------------------------------------------------------
+    # Return the nearest anchor before a position as
+    # (key values, position behind the key). The key values
+    # are None, if no anchor is available
+    # --------------------------------------------------------
+    def getAnchor(self, aPos):
+        xInx = min(aPos // self.mStep, len(self.mAnchors))
+        if xInx == 0:
+            return None, 0
+        return self.mAnchors[xInx - 1], xInx * self.mStep
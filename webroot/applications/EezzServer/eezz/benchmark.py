@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Benchmarks for the eezz components
+   python3 -m eezz.benchmark [name]
+
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from   datetime      import date
+from   eezz.table    import TTable, TColumnTable
+from   eezz.agent    import TEezzAgent
+from   eezz.masking  import applyMask, maskWords, maskInt, maskTranslate, maskNumpy, numpy
+from   eezz.deflate  import TDeflate
+from   eezz.websocket import TWebSocketClient
+
+
+# --------------------------------------------------------
+# Measure the best of a number of runs in seconds
+# --------------------------------------------------------
+def measure(aFunction, aRepeat = 5):
+    xBest = None
+    for i in range(aRepeat):
+        xStart  = time.perf_counter()
+        aFunction()
+        xResult = time.perf_counter() - xStart
+        if xBest == None or xResult < xBest:
+            xBest = xResult
+    return xBest
+
+
+# --------------------------------------------------------
+# Provides a table for the benchmark pages
+# --------------------------------------------------------
+class TBenchTable:
+    def __init__(self, aNumRows):
+        self.mTable = TTable(['name', 'size', 'type'], 'bench', visible_items=aNumRows)
+        for i in range(aNumRows):
+            self.mTable.append(['file{}.txt'.format(i), str(i * 17), 'text/plain'])
+
+    def get_selected_obj(self, index = -1):
+        return {'return':{'code':200, 'value': self.mTable}}
+
+
+BENCH_PAGE = """<!DOCTYPE html>
+<html>
+<body name="aBody">
+<table name="aTable" data-eezz-action="{'eezzAgent.assign':{'aBench.get_selected_obj':{'index':'-1'}}}">
+    <thead>
+        <tr data-eezz-template="{'table-rows':[':']}">
+            <th data-eezz-template="{'table-columns':['1:']}">{}</th></tr></thead>
+    <tbody>
+        <tr data-eezz-template="{'table-rows':[':']}">
+            <td data-eezz-template="{'table-columns':['1:']}">{}</td></tr></tbody>
+</table>
+</body>
+</html>
+"""
+
+
+# --------------------------------------------------------
+# Render 1000 rows with the compiled row function and
+# with the generic path of generateTableRow/generateTableCols
+# --------------------------------------------------------
+def bench_rows(aNumRows = 1000):
+    with tempfile.TemporaryDirectory() as xDocRoot:
+        xPath = os.path.join(xDocRoot, 'bench.html')
+        with open(xPath, 'w') as xFile:
+            xFile.write(BENCH_PAGE)
+
+        xResults = dict()
+        for xCompile in (False, True):
+            xAgent = TEezzAgent(xDocRoot, ('localhost', 8100))
+            xAgent.mGlobals['aBench'] = TBenchTable(aNumRows)
+            xAgent.mCompileRows = xCompile
+            xAgent.handle_websocket({'path': '/bench.html'})
+
+            xRequest = lambda: xAgent.handle_websocket({'update': {'aTable.innerHTML':'*'}})
+            xResults[xCompile] = (measure(xRequest), xAgent.mElements['aTable'].mInnerHtml.getvalue())
+            xAgent.shutdown()
+
+    xGeneric, xCompiled = xResults[False], xResults[True]
+    print('rows: {} rows, output identical: {}'.format(aNumRows, xGeneric[1] == xCompiled[1]))
+    print('  generic  {:8.2f} ms'.format(xGeneric[0]  * 1000))
+    print('  compiled {:8.2f} ms'.format(xCompiled[0] * 1000))
+
+
+# --------------------------------------------------------
+# Memory and sort time of a table with list rows compared
+# to the columnar storage
+# --------------------------------------------------------
+def bench_columns(aNumRows = 200000):
+    xToday   = date.today().toordinal()
+    xResults = dict()
+
+    for xClass in (TTable, TColumnTable):
+        tracemalloc.start()
+        xTable = xClass(['name', 'size', 'ratio', 'modified', 'type'], 'bench')
+        for i in range(aNumRows):
+            xTable.append(['file{}.txt'.format(i % 5000), i * 17 % 100003, i / 7, date.fromordinal(xToday - i % 3650), 'text/plain'])
+        xMemory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        xSort = measure(lambda: xTable.do_sort(1), 3)
+        xResults[xClass] = (xMemory, xSort)
+
+    print('columns: {} rows'.format(aNumRows))
+    for xClass, (xMemory, xSort) in xResults.items():
+        print('  {:14} {:8.1f} bytes/row  sort {:8.2f} ms'.format(xClass.__name__, xMemory / aNumRows, xSort * 1000))
+
+
+# --------------------------------------------------------
+# Load rows one by one with append and in one pass with
+# extend_rows
+# --------------------------------------------------------
+def bench_load(aNumRows = 1000000):
+    xRows = [['file{}.txt'.format(i), i * 17, 'text/plain'] for i in range(aNumRows)]
+
+    def loadAppend(aClass):
+        xTable = aClass(['name', 'size', 'type'], 'bench')
+        for xRow in xRows:
+            xTable.append(xRow)
+
+    def loadExtend(aClass):
+        xTable = aClass(['name', 'size', 'type'], 'bench')
+        xTable.extend_rows(xRows)
+
+    print('load: {} rows'.format(aNumRows))
+    for xClass in (TTable, TColumnTable):
+        print('  {:14} append {:8.1f} ms  extend_rows {:8.1f} ms'.format(xClass.__name__,
+              measure(lambda: loadAppend(xClass), 1) * 1000, measure(lambda: loadExtend(xClass), 1) * 1000))
+
+
+# --------------------------------------------------------
+# Throughput of the websocket masking functions for an
+# upload chunk
+# --------------------------------------------------------
+def bench_mask(aSize = 131072):
+    xData    = bytearray(os.urandom(aSize))
+    xMask    = os.urandom(4)
+    xResult  = bytes(x ^ xMask[i % 4] for i, x in enumerate(xData))
+    xMethods = [maskWords, maskInt, maskTranslate] + ([maskNumpy] if numpy != None else [])
+
+    print('mask: {} bytes, applyMask = {}'.format(aSize, applyMask.__name__))
+    for xMethod in xMethods:
+        xBuffer  = bytearray(xData)
+        xMethod(xBuffer, xMask, aSize)
+        xCorrect = xBuffer == xResult
+        xTime    = measure(lambda: xMethod(xBuffer, xMask, aSize), 20)
+        print('  {:14} {:8.1f} MB/s  correct: {}'.format(xMethod.__name__, aSize / xTime / 1e6, xCorrect))
+
+
+# --------------------------------------------------------
+# Bytes sent for the table updates of esptest.html with
+# and without permessage-deflate. The directory view walks
+# into the first aNumDirs directories of the python library
+# and back
+# --------------------------------------------------------
+def bench_deflate(aNumDirs = 20):
+    xDocRoot  = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'public')
+    xCurrDir  = os.getcwd()
+    xMessages = list()
+    os.chdir(os.path.dirname(os.__file__))
+    try:
+        xAgent = TEezzAgent(xDocRoot, ('localhost', 8100))
+        xMessages.append(xAgent.handle_websocket({'path': '/esptest.html'}))
+        xUpdate = {'aFileList.innerHTML':'*', 'aDirList.innerHTML':'*'}
+        for i in range(aNumDirs):
+            for xIndex in (i + 1, 0):
+                xMessages.append(xAgent.handle_websocket({'callback': {'aExample.do_select': {'index': str(xIndex)}}, 'update': xUpdate}))
+        xAgent.shutdown()
+    finally:
+        os.chdir(xCurrDir)
+
+    xMessages = [x.encode('utf-8') for x in xMessages]
+    xRaw      = sum(len(x) for x in xMessages)
+    print('deflate: esptest.html, {} messages, {} bytes, threshold {} bytes'.format(len(xMessages), xRaw, TWebSocketClient.mDeflateSize))
+    for xTakeover in (False, True):
+        xDeflate = TDeflate(xTakeover, xTakeover)
+        xStart   = time.perf_counter()
+        xSize    = sum(len(xDeflate.compress(x)) if len(x) >= TWebSocketClient.mDeflateSize else len(x) for x in xMessages)
+        xTime    = time.perf_counter() - xStart
+        print('  context takeover {:5} {:9} bytes {:6.1f} %  {:8.2f} ms'.format(str(xTakeover), xSize, xSize * 100 / xRaw, xTime * 1000))
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+if __name__ == '__main__':
+    xBenchmarks = {'rows': bench_rows, 'columns': bench_columns, 'load': bench_load, 'mask': bench_mask, 'deflate': bench_deflate}
+    for xName in sys.argv[1:] or xBenchmarks.keys():
+        xBenchmarks[xName]()
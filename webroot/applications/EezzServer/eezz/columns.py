@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Columnar storage for large in-memory tables. Each column is kept
+   in a typed array: int, float and date values as machine words,
+   strings dictionary encoded. All other values are kept as objects.
+
+   TColumnRows is a sequence of rows on top of the columns, so that
+   TTable can use it as its data. Rows are materialized on access.
+   Sorting calculates a permutation and does not move any values.
+
+   TSortCache keeps the sort keys and the sorted permutation for each
+   column until the rows change. It is used by TTable and TColumnRows.
+
+"""
+import sys
+from   array     import array
+from   datetime  import date
+from   itertools import count, filterfalse
+
+
+# --------------------------------------------------------
+# Column of python objects
+# Fallback for all types without a compact representation
+# --------------------------------------------------------
+class TColumn:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self, aValues = None):
+        self.mValues = list() if aValues == None else aValues
+
+    def __len__(self):
+        return len(self.mValues)
+
+    # --------------------------------------------------------
+    # Returns False, if the value cannot be stored
+    # --------------------------------------------------------
+    def append(self, aValue):
+        self.mValues.append(aValue)
+        return True
+
+    # --------------------------------------------------------
+    # Append a list of values. Returns False and leaves the
+    # column unchanged, if a value cannot be stored
+    # --------------------------------------------------------
+    def extend(self, aValues):
+        self.mValues.extend(aValues)
+        return True
+
+    def get(self, aInx):
+        return self.mValues[aInx]
+
+    def values(self):
+        return self.mValues
+
+    # --------------------------------------------------------
+    # Return a function, which maps a position to a sort key
+    # aType is the column type used by TTable.do_sort
+    # --------------------------------------------------------
+    def getSortKey(self, aType):
+        xConvert = {int: int, float: float}.get(aType, str)
+        return list(map(xConvert, self.mValues)).__getitem__
+
+    def getMemorySize(self):
+        return sys.getsizeof(self.mValues)
+
+
+# --------------------------------------------------------
+# Column of int, float or date values in an array
+# Dates are stored by ordinal
+# --------------------------------------------------------
+class TArrayColumn(TColumn):
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self, aType):
+        self.mType   = aType
+        self.mValues = array({int: 'q', float: 'd', date: 'l'}[aType])
+
+    def append(self, aValue):
+        if type(aValue) != self.mType:
+            return False
+        try:
+            self.mValues.append(aValue.toordinal() if self.mType == date else aValue)
+        except OverflowError:
+            return False
+        return True
+
+    def extend(self, aValues):
+        if set(map(type, aValues)) != {self.mType}:
+            return False
+        if self.mType == date:
+            aValues = map(date.toordinal, aValues)
+        try:
+            self.mValues.extend(array(self.mValues.typecode, aValues))
+        except OverflowError:
+            return False
+        return True
+
+    def get(self, aInx):
+        if self.mType == date:
+            return date.fromordinal(self.mValues[aInx])
+        return self.mValues[aInx]
+
+    def values(self):
+        if self.mType == date:
+            return [date.fromordinal(x) for x in self.mValues]
+        return self.mValues.tolist()
+
+    # --------------------------------------------------------
+    # The stored values are the sort keys for the own type.
+    # Dates sort by ordinal in the same order as by str
+    # --------------------------------------------------------
+    def getSortKey(self, aType):
+        if aType == self.mType:
+            return self.mValues.__getitem__
+        return TColumn(self.values()).getSortKey(aType)
+
+    def getMemorySize(self):
+        return sys.getsizeof(self.mValues)
+
+
+# --------------------------------------------------------
+# Dictionary encoded column of strings
+# --------------------------------------------------------
+class TDictColumn(TColumn):
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mCodes  = array('l')
+        self.mDict   = list()
+        self.mLookup = dict()
+
+    def __len__(self):
+        return len(self.mCodes)
+
+    def append(self, aValue):
+        if type(aValue) != str:
+            return False
+
+        xCode = self.mLookup.get(aValue)
+        if xCode == None:
+            xCode = len(self.mDict)
+            self.mLookup[aValue] = xCode
+            self.mDict.append(aValue)
+        self.mCodes.append(xCode)
+        return True
+
+    def extend(self, aValues):
+        if set(map(type, aValues)) != {str}:
+            return False
+
+        xNew = list(filterfalse(self.mLookup.__contains__, dict.fromkeys(aValues)))
+        self.mLookup.update(zip(xNew, count(len(self.mDict))))
+        self.mDict.extend(xNew)
+        self.mCodes.extend(array('l', map(self.mLookup.__getitem__, aValues)))
+        return True
+
+    def get(self, aInx):
+        return self.mDict[self.mCodes[aInx]]
+
+    def values(self):
+        return [self.mDict[x] for x in self.mCodes]
+
+    # --------------------------------------------------------
+    # Sort the dictionary once and use the rank of each code
+    # as key for the rows
+    # --------------------------------------------------------
+    def getSortKey(self, aType):
+        if aType != str:
+            return TColumn(self.values()).getSortKey(aType)
+
+        xRank = array('l', bytes(len(self.mDict) * array('l').itemsize))
+        for xRankInx, xCode in enumerate(sorted(range(len(self.mDict)), key=self.mDict.__getitem__)):
+            xRank[xCode] = xRankInx
+        return array('l', map(xRank.__getitem__, self.mCodes)).__getitem__
+
+    def getMemorySize(self):
+        return sys.getsizeof(self.mCodes) + sys.getsizeof(self.mDict) + sys.getsizeof(self.mLookup)
+
+
+# --------------------------------------------------------
+# Create the column for the type of the first value
+# --------------------------------------------------------
+def createColumn(aValue):
+    if type(aValue) in (int, float, date):
+        return TArrayColumn(type(aValue))
+    if type(aValue) == str:
+        return TDictColumn()
+    return TColumn()
+
+
+# --------------------------------------------------------
+# Sort keys and ascending permutation for each column
+# --------------------------------------------------------
+class TSortCache:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mKeys  = dict()
+        self.mPerms = dict()
+
+    def clear(self):
+        self.mKeys.clear()
+        self.mPerms.clear()
+
+    # --------------------------------------------------------
+    # aCreate(aInx) returns the key function for a column
+    # --------------------------------------------------------
+    def getKey(self, aInx, aCreate):
+        xKey = self.mKeys.get(aInx)
+        if xKey == None:
+            xKey = self.mKeys[aInx] = aCreate(aInx)
+        return xKey
+
+    # --------------------------------------------------------
+    # Return the permutation for a list of (column, reverse)
+    # and a flag, if it has to be read in reverse order.
+    # A single column uses the cached ascending permutation,
+    # more columns are sorted stable from the last to the first
+    # The returned permutation must not be modified
+    # --------------------------------------------------------
+    def getOrder(self, aSize, aSortCols, aCreate):
+        if len(aSortCols) == 1:
+            xInx, xReverse = aSortCols[0]
+            xPerm = self.mPerms.get(xInx)
+            if xPerm == None:
+                xPerm = self.mPerms[xInx] = array('l', sorted(range(aSize), key=self.getKey(xInx, aCreate)))
+            return xPerm, xReverse
+
+        xOrder = range(aSize)
+        for xInx, xReverse in reversed(aSortCols):
+            xOrder = sorted(xOrder, key=self.getKey(xInx, aCreate), reverse=xReverse)
+        return array('l', xOrder), False
+
+
+# --------------------------------------------------------
+# Sequence of rows stored in columns
+# --------------------------------------------------------
+class TColumnRows:
+    # --------------------------------------------------------
+    # mOrder is the permutation of the stored rows or None
+    # for the order of insertion. mReverse reads the order
+    # from the end
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mColumns = list()
+        self.mOrder   = None
+        self.mReverse = False
+        self.mSize    = 0
+        self.mSorts   = TSortCache()
+
+    def __len__(self):
+        return self.mSize
+
+    def __iter__(self):
+        for xInx in range(self.mSize):
+            yield self.getRow(xInx)
+
+    def __getitem__(self, aInx):
+        if isinstance(aInx, slice):
+            return [self.getRow(x) for x in range(self.mSize)[aInx]]
+        if aInx < 0:
+            aInx += self.mSize
+        if not 0 <= aInx < self.mSize:
+            raise IndexError('row index out of range')
+        return self.getRow(aInx)
+
+    # --------------------------------------------------------
+    # Materialize the row at the given position
+    # --------------------------------------------------------
+    def getRow(self, aInx):
+        if self.mOrder != None:
+            aInx = self.mOrder[self.mSize - aInx - 1 if self.mReverse else aInx]
+        return [xColumn.get(aInx) for xColumn in self.mColumns]
+
+    # --------------------------------------------------------
+    # The first row defines the column types. A value, which
+    # does not fit the type, converts the column to objects
+    # --------------------------------------------------------
+    def append(self, aRow):
+        self.mSorts.clear()
+        if self.mReverse:
+            self.mOrder   = array('l', reversed(self.mOrder))
+            self.mReverse = False
+
+        if not self.mColumns:
+            self.mColumns = [createColumn(x) for x in aRow]
+
+        for xInx, xValue in enumerate(aRow):
+            xColumn = self.mColumns[xInx]
+            if not xColumn.append(xValue):
+                xColumn = TColumn(xColumn.values())
+                xColumn.append(xValue)
+                self.mColumns[xInx] = xColumn
+
+        if self.mOrder != None:
+            self.mOrder.append(self.mSize)
+        self.mSize += 1
+
+    # --------------------------------------------------------
+    # Append a list of rows column by column
+    # --------------------------------------------------------
+    def extend(self, aRows):
+        if not aRows:
+            return
+
+        self.mSorts.clear()
+        if self.mReverse:
+            self.mOrder   = array('l', reversed(self.mOrder))
+            self.mReverse = False
+
+        if not self.mColumns:
+            self.mColumns = [createColumn(x) for x in aRows[0]]
+
+        for xInx, xValues in enumerate(zip(*aRows)):
+            xColumn = self.mColumns[xInx]
+            if not xColumn.extend(xValues):
+                xColumn = TColumn(xColumn.values())
+                xColumn.extend(xValues)
+                self.mColumns[xInx] = xColumn
+
+        if self.mOrder != None:
+            self.mOrder.extend(range(self.mSize, self.mSize + len(aRows)))
+        self.mSize += len(aRows)
+
+    def clear(self):
+        self.mColumns = list()
+        self.mOrder   = None
+        self.mReverse = False
+        self.mSize    = 0
+        self.mSorts.clear()
+
+    # --------------------------------------------------------
+    # Sort by a list of (column, reverse). aTypes are the column
+    # types used for the sort keys. Toggling the direction of a
+    # single column only flips the reading direction
+    # --------------------------------------------------------
+    def sortBy(self, aSortCols, aTypes):
+        if not self.mColumns:
+            return
+
+        xCreate = lambda xInx: self.mColumns[xInx].getSortKey(aTypes[xInx])
+        self.mOrder, self.mReverse = self.mSorts.getOrder(self.mSize, aSortCols, xCreate)
+
+    # --------------------------------------------------------
+    # Return the values of a column in the order of the rows
+    # --------------------------------------------------------
+    def getColumn(self, aInx):
+        if not self.mColumns:
+            return list()
+
+        xValues = self.mColumns[aInx].values()
+        if self.mOrder == None:
+            return xValues
+        return [xValues[x] for x in (reversed(self.mOrder) if self.mReverse else self.mOrder)]
+
+    def getMemorySize(self):
+        xSize = sum(x.getMemorySize() for x in self.mColumns)
+        if self.mOrder != None:
+            xSize += sys.getsizeof(self.mOrder)
+        return xSize
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Bounded executor for database work. A fixed number of worker threads
+   (mWorkers) execute the tasks of a queue with at most mQueueSize entries,
+   a caller blocks while the queue is full. Each worker uses the pooled
+   connections of TDbPool.
+
+   A task runs with a progress handler on its connection, which interrupts
+   the running statement as soon as the task is cancelled or its deadline
+   is reached. The interrupted statement raises sqlite3.OperationalError,
+   the task raises TDbCancelled to the waiting caller.
+
+   A thread can define a cancel scope, an event shared by all tasks it
+   submits, e.g. the handler thread of a websocket client, which stops
+   the pending queries of the client on disconnect.
+
+"""
+import time
+import queue
+import sqlite3
+import threading
+from   eezz.service  import singleton
+from   eezz.dbpool   import TDbPool
+
+
+# --------------------------------------------------------
+# Raised for a cancelled or timed out task
+# --------------------------------------------------------
+class TDbCancelled(Exception):
+    def __init__(self, aValue):
+        self.value = aValue
+    def __str__(self):
+        return repr(self.value)
+
+
+# --------------------------------------------------------
+# A function aFunction(connection, *aArgs) to be executed
+# by the workers
+# --------------------------------------------------------
+class TDbTask:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self, aDatabase, aFunction, aArgs, aTimeout = None, aScope = None):
+        self.mDatabase    = aDatabase
+        self.mFunction    = aFunction
+        self.mArgs        = aArgs
+        self.mDeadline    = None if aTimeout == None else time.monotonic() + aTimeout
+        self.mScope       = aScope
+        self.mParent      = None
+        self.mConnection  = None
+        self.mCancelled   = False
+        self.mInterrupted = False
+        self.mDone        = threading.Event()
+        self.mResult      = None
+        self.mError       = None
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def cancel(self):
+        self.mCancelled = True
+
+    # --------------------------------------------------------
+    # Returns the reason, if the task has to stop, else None.
+    # A nested task stops with the task it runs in
+    # --------------------------------------------------------
+    def getStopReason(self):
+        if self.mParent != None and self.mParent.getStopReason() != None:
+            return self.mParent.getStopReason()
+        if self.mCancelled or (self.mScope != None and self.mScope.is_set()):
+            return 'cancelled'
+        if self.mDeadline != None and time.monotonic() > self.mDeadline:
+            return 'timeout'
+        return None
+
+    # --------------------------------------------------------
+    # Progress handler: a non zero result interrupts sqlite
+    # --------------------------------------------------------
+    def onProgress(self):
+        if self.getStopReason() != None:
+            self.mInterrupted = True
+            return 1
+        return 0
+
+    # --------------------------------------------------------
+    # Wait for the result. Exceptions of the function are
+    # raised in the calling thread
+    # --------------------------------------------------------
+    def wait(self):
+        self.mDone.wait()
+        if self.mError != None:
+            raise self.mError
+        return self.mResult
+
+    # --------------------------------------------------------
+    # Executed by a worker thread. A nested task runs inline
+    # on the connection of the same thread: The task and the
+    # progress handler of the outer task are restored after it
+    # --------------------------------------------------------
+    def execute(self, aExecutor):
+        try:
+            if self.getStopReason() != None:
+                raise TDbCancelled('{}: {}'.format(self.getStopReason(), self.mDatabase))
+
+            xConnection = self.mConnection = TDbPool().getConnection(self.mDatabase)
+            xConnection.set_progress_handler(self.onProgress, aExecutor.mProgressSteps)
+            aExecutor.mLocal.mTask = self
+            try:
+                self.mResult = self.mFunction(xConnection, *self.mArgs)
+            finally:
+                self.mConnection       = None
+                aExecutor.mLocal.mTask = self.mParent
+                if self.mParent != None and self.mParent.mConnection is xConnection:
+                    xConnection.set_progress_handler(self.mParent.onProgress, aExecutor.mProgressSteps)
+                else:
+                    xConnection.set_progress_handler(None, 0)
+        except sqlite3.OperationalError as xEx:
+            if self.mInterrupted:
+                self.mError = TDbCancelled('{}: {}'.format(self.getStopReason(), self.mDatabase))
+            else:
+                self.mError = xEx
+        except Exception as xEx:
+            self.mError = xEx
+        finally:
+            self.mDone.set()
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+@singleton
+class TDbExecutor:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mWorkers       = 4
+        self.mQueueSize     = 64
+        self.mTimeout       = 30.0
+        self.mProgressSteps = 1000
+        self.mQueue         = queue.Queue(self.mQueueSize)
+        self.mLocal         = threading.local()
+        self.mThreads       = list()
+        self.mLock          = threading.Lock()
+
+    # --------------------------------------------------------
+    # Change the number of workers or the default timeout
+    # before the first task is submitted
+    # --------------------------------------------------------
+    def configure(self, aWorkers = None, aTimeout = None):
+        if aWorkers != None:
+            self.mWorkers = aWorkers
+        if aTimeout != None:
+            self.mTimeout = aTimeout
+
+    # --------------------------------------------------------
+    # Set the cancel event for the tasks of the calling thread
+    # --------------------------------------------------------
+    def setScope(self, aEvent):
+        self.mLocal.mScope = aEvent
+
+    # --------------------------------------------------------
+    # Queue aFunction(connection, *aArgs) and return the task.
+    # aTimeout in seconds, None for the default timeout
+    # --------------------------------------------------------
+    def submit(self, aDatabase, aFunction, *aArgs, aTimeout = None):
+        xTask = TDbTask(aDatabase, aFunction, aArgs,
+                        self.mTimeout if aTimeout == None else aTimeout,
+                        getattr(self.mLocal, 'mScope', None))
+
+        # A worker submitting a task would wait for itself
+        if getattr(self.mLocal, 'mTask', None) != None:
+            xTask.mParent = self.mLocal.mTask
+            xTask.execute(self)
+            return xTask
+
+        self.startWorkers()
+        self.mQueue.put(xTask)
+        return xTask
+
+    # --------------------------------------------------------
+    # Submit a task and wait for the result
+    # --------------------------------------------------------
+    def execute(self, aDatabase, aFunction, *aArgs, aTimeout = None):
+        return self.submit(aDatabase, aFunction, *aArgs, aTimeout=aTimeout).wait()
+
+    # --------------------------------------------------------
+    # Raise TDbCancelled, if the task of the calling worker
+    # was interrupted. Used to distinguish an interrupt from
+    # other operational errors
+    # --------------------------------------------------------
+    def checkTask(self):
+        xTask = getattr(self.mLocal, 'mTask', None)
+        if xTask != None and xTask.mInterrupted:
+            raise TDbCancelled('{}: {}'.format(xTask.getStopReason(), xTask.mDatabase))
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def startWorkers(self):
+        with self.mLock:
+            while len(self.mThreads) < self.mWorkers:
+                xThread = threading.Thread(target=self.run, daemon=True)
+                xThread.start()
+                self.mThreads.append(xThread)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def run(self):
+        while True:
+            xTask = self.mQueue.get()
+            xTask.execute(self)
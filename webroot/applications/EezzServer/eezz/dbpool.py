@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Process wide pool of sqlite connections. Each thread keeps one open
+   connection per database path, so that the file is opened and the
+   schema is read only once. New connections are set up with the pragmas
+   in mPragmas, by default WAL journal mode, which allows readers and a
+   writer at the same time. Each connection keeps up to mStatements
+   prepared statements, which are reused for the same statement text.
+
+   A connection, which was not used for mCheckTime seconds, is checked
+   before it is handed out again and replaced if it fails.
+
+   The connections stay open, so callers close their cursors, but never
+   the connection.
+
+"""
+import os
+import time
+import sqlite3
+import threading
+from   eezz.service  import singleton
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+@singleton
+class TDbPool:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mLocal       = threading.local()
+        self.mLock        = threading.Lock()
+        self.mConnections = list()
+        self.mPaths       = dict()
+        self.mMonitors    = dict()
+        self.mGeneration  = 0
+        self.mCheckTime   = 30.0
+        self.mTimeout     = 5.0
+        self.mStatements  = 256
+        self.mPragmas     = {
+            'journal_mode' : 'WAL',
+            'synchronous'  : 'NORMAL',
+            'cache_size'   : -8192,
+            'mmap_size'    : 64 * 1024 * 1024 }
+
+    # --------------------------------------------------------
+    # Change the pragmas for new connections
+    # e.g. TDbPool().configure(cache_size=-65536, mmap_size=0)
+    # --------------------------------------------------------
+    def configure(self, **aPragmas):
+        self.mPragmas.update(aPragmas)
+
+    # --------------------------------------------------------
+    # Return the connection of the calling thread
+    # --------------------------------------------------------
+    def getConnection(self, aPath):
+        xPath = aPath if aPath == ':memory:' else os.path.abspath(aPath)
+        xPool = getattr(self.mLocal, 'mPool', None)
+        if xPool == None:
+            xPool = self.mLocal.mPool = dict()
+
+        xNow   = time.monotonic()
+        xEntry = xPool.get(xPath)
+
+        if xEntry != None and xEntry[2] == self.mGeneration:
+            if xNow - xEntry[1] < self.mCheckTime or self.isHealthy(xEntry[0]):
+                xEntry[1] = xNow
+                return xEntry[0]
+            self.closeConnection(xEntry[0])
+
+        xConnection   = self.connect(xPath)
+        xPool[xPath]  = [xConnection, xNow, self.mGeneration]
+        return xConnection
+
+    # --------------------------------------------------------
+    # Open a new connection and apply the pragmas. A pragma,
+    # which is not accepted, e.g. WAL on a read-only file, is
+    # skipped
+    # --------------------------------------------------------
+    def connect(self, aPath):
+        xConnection = sqlite3.connect(aPath, timeout=self.mTimeout, check_same_thread=False, cached_statements=self.mStatements)
+
+        for xName, xValue in self.mPragmas.items():
+            if xName == 'journal_mode' and aPath == ':memory:':
+                continue
+            try:
+                xConnection.execute('PRAGMA {} = {}'.format(xName, xValue)).fetchall()
+            except sqlite3.DatabaseError:
+                pass
+
+        with self.mLock:
+            self.mConnections.append(xConnection)
+            self.mPaths[xConnection] = id(xConnection) if aPath == ':memory:' else aPath
+        return xConnection
+
+    # --------------------------------------------------------
+    # Version of the data of a database, the same for all
+    # threads. The data_version of a monitor connection, which
+    # does not change any data, counts the commits of all other
+    # connections. A connection in a transaction sees its own
+    # uncommitted changes (total_changes) in addition
+    # --------------------------------------------------------
+    def getDataVersion(self, aConnection):
+        xPath = self.mPaths.get(aConnection)
+        if xPath == None or xPath == id(aConnection):
+            xVersion = aConnection.execute('PRAGMA data_version').fetchone()[0]
+            return (self.mGeneration, id(aConnection), xVersion, aConnection.total_changes)
+
+        with self.mLock:
+            xMonitor = self.mMonitors.get(xPath)
+            if xMonitor == None:
+                xMonitor = self.mMonitors[xPath] = sqlite3.connect(xPath, timeout=self.mTimeout, check_same_thread=False)
+            xVersion = (self.mGeneration, xPath, xMonitor.execute('PRAGMA data_version').fetchone()[0])
+
+        if aConnection.in_transaction:
+            xVersion += (id(aConnection), aConnection.total_changes)
+        return xVersion
+
+    # --------------------------------------------------------
+    # Health check
+    # --------------------------------------------------------
+    def isHealthy(self, aConnection):
+        try:
+            aConnection.execute('select 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def closeConnection(self, aConnection):
+        with self.mLock:
+            if aConnection in self.mConnections:
+                self.mConnections.remove(aConnection)
+            self.mPaths.pop(aConnection, None)
+        try:
+            aConnection.close()
+        except sqlite3.Error:
+            pass
+
+    # --------------------------------------------------------
+    # Close the connections of the calling thread. To be called
+    # by worker threads before they terminate
+    # --------------------------------------------------------
+    def closeThread(self):
+        xPool = getattr(self.mLocal, 'mPool', None)
+        if xPool == None:
+            return
+        for xConnection, xTime, xGeneration in xPool.values():
+            self.closeConnection(xConnection)
+        xPool.clear()
+
+    # --------------------------------------------------------
+    # Close all connections, e.g. at shutdown. The threads
+    # open new connections on the next request
+    # --------------------------------------------------------
+    def closeAll(self):
+        with self.mLock:
+            xConnections      = self.mConnections
+            xConnections.extend(self.mMonitors.values())
+            self.mConnections = list()
+            self.mPaths.clear()
+            self.mMonitors.clear()
+            self.mGeneration += 1
+
+        for xConnection in xConnections:
+            try:
+                xConnection.close()
+            except sqlite3.Error:
+                pass
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Compression extension permessage-deflate for websockets (rfc 7692).
+   https://tools.ietf.org/html/rfc7692
+
+   The payload of a message is compressed with raw deflate and flushed
+   with Z_SYNC_FLUSH, the final 00 00 ff ff of the flush is removed.
+
+   With context takeover the zlib contexts of a connection are kept for
+   all messages, so a message refers to the data of the previous ones.
+   The repeated table markup of the updates is then sent as back
+   references. Without context takeover each message is compressed on
+   its own, which saves the memory of the contexts between messages.
+
+"""
+import zlib
+
+
+# The end of a flushed deflate block, removed from each message
+DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+# --------------------------------------------------------
+# The zlib contexts of a connection
+# --------------------------------------------------------
+class TDeflate:
+    # --------------------------------------------------------
+    # aServerTakeover: keep the context for sent messages
+    # aClientTakeover: keep the context for received messages
+    # aWindowBits:     window size of sent messages
+    # --------------------------------------------------------
+    def __init__(self, aServerTakeover = True, aClientTakeover = True, aWindowBits = 15, aLevel = 6):
+        self.mServerTakeover = aServerTakeover
+        self.mClientTakeover = aClientTakeover
+        self.mWindowBits     = aWindowBits
+        self.mLevel          = aLevel
+        self.mDeflater       = None
+        self.mInflater       = zlib.decompressobj(-15)
+
+    # --------------------------------------------------------
+    # Compress the payload of a message
+    # --------------------------------------------------------
+    def compress(self, aData):
+        if self.mDeflater == None or not self.mServerTakeover:
+            self.mDeflater = zlib.compressobj(self.mLevel, zlib.DEFLATED, -self.mWindowBits)
+
+        xData = self.mDeflater.compress(aData) + self.mDeflater.flush(zlib.Z_SYNC_FLUSH)
+        if xData.endswith(DEFLATE_TAIL):
+            return xData[:-4]
+        return xData
+
+    # --------------------------------------------------------
+    # Decompress a part of a message, aLast for the final part.
+    # At most aLimit + 1 bytes are returned, so the caller
+    # detects a message exceeding aLimit
+    # --------------------------------------------------------
+    def decompress(self, aData, aLast, aLimit):
+        xData = self.mInflater.decompress(aData, aLimit + 1)
+        if aLast and len(xData) <= aLimit:
+            xData += self.mInflater.decompress(DEFLATE_TAIL, aLimit + 1 - len(xData))
+        if aLast and not self.mClientTakeover:
+            self.mInflater = zlib.decompressobj(-15)
+        return xData
+
+
+# --------------------------------------------------------
+# Select the first acceptable permessage-deflate offer of
+# the header Sec-WebSocket-Extensions. Returns the contexts
+# and the value of the response header, or (None, None)
+# --------------------------------------------------------
+def negotiateDeflate(aExtensions, aTakeover = True):
+    for xOffer in aExtensions.split(','):
+        xParams = [x.strip() for x in xOffer.split(';')]
+        if xParams[0] != 'permessage-deflate':
+            continue
+
+        xValues = dict()
+        for xParam in xParams[1:]:
+            xName, xSep, xValue = xParam.partition('=')
+            xValues.setdefault(xName.strip(), []).append(xValue.strip().strip('"'))
+
+        # Decline offers with unknown or repeated parameters
+        if any(len(y) > 1 or x not in ('server_no_context_takeover', 'client_no_context_takeover',
+               'server_max_window_bits', 'client_max_window_bits') for x, y in xValues.items()):
+            continue
+        if any(xValues.get(x, [''])[0] for x in ('server_no_context_takeover', 'client_no_context_takeover')):
+            continue
+        if xValues.get('client_max_window_bits', [''])[0] not in [''] + [str(x) for x in range(8, 16)]:
+            continue
+
+        # zlib does not support a raw deflate window of 8 bits
+        xWindowBits = 15
+        if 'server_max_window_bits' in xValues:
+            if xValues['server_max_window_bits'][0] not in [str(x) for x in range(9, 16)]:
+                continue
+            xWindowBits = int(xValues['server_max_window_bits'][0])
+
+        xServerTakeover = aTakeover and 'server_no_context_takeover' not in xValues
+        xResponse       = ['permessage-deflate']
+        if not xServerTakeover:
+            xResponse.append('server_no_context_takeover')
+        if not aTakeover:
+            xResponse.append('client_no_context_takeover')
+        if 'server_max_window_bits' in xValues:
+            xResponse.append('server_max_window_bits={}'.format(xWindowBits))
+        return (TDeflate(xServerTakeover, aTakeover, xWindowBits), '; '.join(xResponse))
+    return (None, None)
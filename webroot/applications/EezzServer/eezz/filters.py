@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Filter engine for the column filters of a TTable (mColsFilter).
+   The filters are matched case insensitive on the string value:
+     '*' or ''   all rows
+     'text'      rows containing text
+     'text*'     rows starting with text
+     other glob  rows matching the pattern, e.g. '*.py' or 'a?c*'
+
+   The result is a view, which is the ascending list of the positions
+   of the matching rows. The rows itself are not copied.
+
+   The index of a column is built on the first filter request. The
+   column is dictionary encoded, so that a pattern is matched once for
+   each distinct value. A sorted list of the distinct values is used
+   for prefix search. The rows of each distinct value are grouped, so
+   that the matching rows are collected without a scan of the column.
+   Further columns only test the rows selected so far.
+
+   sqlCondition translates a filter into a condition for sqlite, which
+   is used by TDbTable to filter on the database.
+
+"""
+import re
+import fnmatch
+import operator
+from   array     import array
+from   bisect    import bisect_left
+from   itertools import accumulate, chain, compress, count, repeat
+from   collections import Counter
+
+
+# --------------------------------------------------------
+# Return (kind, text) for a column filter or None
+# --------------------------------------------------------
+def parseFilter(aFilter):
+    xFilter = str(aFilter).lower()
+    xStrip  = xFilter.strip('*')
+
+    if xStrip == '':
+        return None
+    if not any(x in xStrip for x in '*?['):
+        if xFilter == xStrip or xFilter == '*' + xStrip + '*':
+            return ('substring', xStrip)
+        if xFilter == xStrip + '*':
+            return ('prefix', xStrip)
+    return ('glob', xFilter)
+
+
+# --------------------------------------------------------
+# Match a single value, used for rows appended to a view
+# --------------------------------------------------------
+def matchValue(aCond, aValue):
+    xKind, xText = aCond
+    xValue = str(aValue).lower()
+
+    if xKind == 'substring':
+        return xText in xValue
+    if xKind == 'prefix':
+        return xValue.startswith(xText)
+    return fnmatch.fnmatchcase(xValue, xText)
+
+
+# --------------------------------------------------------
+# Return (condition, parameters) for a filter on a column
+# expression. LIKE and lower() ignore the case of ASCII
+# characters only
+# --------------------------------------------------------
+def sqlCondition(aExpr, aCond):
+    xKind, xText = aCond
+    if xKind == 'glob':
+        return 'lower({}) glob ?'.format(aExpr), (xText.replace('[!', '[^'),)
+
+    xText = xText.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    if xKind == 'substring':
+        xText = '%' + xText + '%'
+    else:
+        xText = xText + '%'
+    return "{} like ? escape '\\'".format(aExpr), (xText,)
+
+
+# --------------------------------------------------------
+# Index of a single column
+# --------------------------------------------------------
+class TFilterIndex:
+    # --------------------------------------------------------
+    # The column is dictionary encoded: mKeys are the distinct
+    # values, mCodes the code of each row
+    # --------------------------------------------------------
+    def __init__(self, aValues):
+        xValues   = [str(x).lower() for x in aValues]
+        xLookup   = dict.fromkeys(xValues)
+        for xCode, xKey in enumerate(xLookup):
+            xLookup[xKey] = xCode
+
+        self.mKeys   = list(xLookup)
+        self.mCodes  = array('l', map(xLookup.__getitem__, xValues))
+        self.mSorted = None
+        self.mGroups = None
+
+    # --------------------------------------------------------
+    # Distinct values starting with aPrefix
+    # --------------------------------------------------------
+    def findPrefix(self, aPrefix):
+        if self.mSorted == None:
+            xOrder       = sorted(range(len(self.mKeys)), key=self.mKeys.__getitem__)
+            self.mSorted = ([self.mKeys[x] for x in xOrder], xOrder)
+
+        xSortedKeys, xOrder = self.mSorted
+        xFlags = bytearray(len(self.mKeys))
+        for xInx in range(bisect_left(xSortedKeys, aPrefix), len(xSortedKeys)):
+            if not xSortedKeys[xInx].startswith(aPrefix):
+                break
+            xFlags[xOrder[xInx]] = 1
+        return xFlags
+
+    # --------------------------------------------------------
+    # Distinct values containing aText
+    # --------------------------------------------------------
+    def findSubstring(self, aText):
+        return bytes(map(operator.contains, self.mKeys, repeat(aText)))
+
+    # --------------------------------------------------------
+    # Distinct values matching a glob pattern. The literal
+    # prefix or the longest literal part selects the candidates
+    # --------------------------------------------------------
+    def findGlob(self, aPattern):
+        xMatch    = re.compile(fnmatch.translate(aPattern)).match
+        xLiterals = re.split(r'\*|\?|\[[^\]]*\]', aPattern)
+
+        if xLiterals[0]:
+            xFlags = self.findPrefix(xLiterals[0])
+        elif max(xLiterals, key=len):
+            xFlags = bytearray(self.findSubstring(max(xLiterals, key=len)))
+        else:
+            return bytes(map(bool, map(xMatch, self.mKeys)))
+
+        for xCode in compress(count(), xFlags):
+            if not xMatch(self.mKeys[xCode]):
+                xFlags[xCode] = 0
+        return xFlags
+
+    # --------------------------------------------------------
+    # Rows grouped by code: The rows of code c are found in
+    # mOrder[mStart[c]:mStart[c+1]] in ascending order
+    # --------------------------------------------------------
+    def getGroups(self):
+        if self.mGroups == None:
+            xCount = Counter(self.mCodes)
+            xOrder = array('l', sorted(range(len(self.mCodes)), key=self.mCodes.__getitem__))
+            xStart = array('l', accumulate(chain([0], map(xCount.__getitem__, range(len(self.mKeys))))))
+            self.mGroups = (xOrder, xStart)
+        return self.mGroups
+
+    # --------------------------------------------------------
+    # Return the ascending positions of the rows matching a
+    # condition. If aPositions is given, only these rows are
+    # tested
+    # --------------------------------------------------------
+    def select(self, aCond, aPositions = None):
+        xKind, xText = aCond
+        if xKind == 'substring':
+            xFlags = self.findSubstring(xText)
+        elif xKind == 'prefix':
+            xFlags = self.findPrefix(xText)
+        else:
+            xFlags = self.findGlob(xText)
+
+        if aPositions != None:
+            return array('l', compress(aPositions, map(xFlags.__getitem__, map(self.mCodes.__getitem__, aPositions))))
+
+        xOrder, xStart = self.getGroups()
+        xResult = array('l')
+        for xCode in compress(count(), xFlags):
+            xResult.extend(xOrder[xStart[xCode]:xStart[xCode + 1]])
+        return array('l', sorted(xResult))
+
+
+# --------------------------------------------------------
+# Filter of a table with the indexes of the columns
+# --------------------------------------------------------
+class TFilter:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mIndexes = dict()
+
+    # --------------------------------------------------------
+    # Drop the indexes after a change of the rows
+    # --------------------------------------------------------
+    def clear(self):
+        self.mIndexes.clear()
+
+    # --------------------------------------------------------
+    # Return the conditions for the column filters
+    # --------------------------------------------------------
+    def getConditions(self, aFilters):
+        xConds = list()
+        for xInx, xFilter in enumerate(aFilters):
+            xCond = parseFilter(xFilter)
+            if xCond != None:
+                xConds.append((xInx, xCond))
+        return xConds
+
+    # --------------------------------------------------------
+    # Return the positions of the matching rows or None if
+    # no filter is set. aGetValues(aInx) returns the values
+    # of a column
+    # --------------------------------------------------------
+    def getView(self, aFilters, aGetValues):
+        xResult = None
+
+        for xInx, xCond in self.getConditions(aFilters):
+            xIndex = self.mIndexes.get(xInx)
+            if xIndex == None:
+                xIndex = self.mIndexes[xInx] = TFilterIndex(aGetValues(xInx))
+
+            xResult = xIndex.select(xCond, xResult)
+            if not xResult:
+                break
+        return xResult
+
+    # --------------------------------------------------------
+    # Return True if a row passes all filters
+    # --------------------------------------------------------
+    def matchRow(self, aFilters, aRow):
+        return all(matchValue(xCond, aRow[xInx]) for xInx, xCond in self.getConditions(aFilters))
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Index advisor for TDbTable. The tables report the columns they sort
+   and filter on together with a statement using them. A list of columns,
+   which is reported mHotCount times, is checked in the background: if the
+   query plan of the statement sorts in a temporary b-tree or scans the
+   whole table, an index on the columns is created.
+
+   An index on the sort columns returns the rows in the order of the
+   keyset navigation, because sqlite appends the rowid to each index. The
+   directions of the columns are relative to the last sort column, which
+   has the direction of the rowid in the order. An
+   index on a filter column is a covering index for counting the rows,
+   which is scanned instead of the table.
+
+   The index on the sort columns covers the selected columns, if the
+   table has an INTEGER PRIMARY KEY: The key column, which is the rowid,
+   follows the sort columns, so the index keeps the order of the keyset
+   navigation. sqlite does not index the rowid of other tables, there
+   each row of a page is read from the table.
+
+   The indexes are created by a task of TDbExecutor, which takes the
+   write lock with BEGIN IMMEDIATE and waits at most mBusyTimeout for
+   it. A busy or interrupted index is checked again after the next
+   reports. The advisor creates at most aBudget indexes per table. The
+   indexes are named eezz_idx_<table>_<columns>, only these are counted.
+
+"""
+import re
+import queue
+import sqlite3
+import threading
+from   eezz.service  import singleton
+from   eezz.dbexec   import TDbExecutor, TDbCancelled
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+@singleton
+class TIndexAdvisor:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mHotCount    = 3
+        self.mBusyTimeout = 1.0
+        self.mTimeout     = 60.0
+        self.mCounts      = dict()
+        self.mChecked     = set()
+        self.mLock        = threading.Lock()
+        self.mQueue       = queue.Queue()
+        self.mThread      = threading.Thread(target=self.run, daemon=True)
+        self.mThread.start()
+
+    # --------------------------------------------------------
+    # Report the use of a list of (column, descending) for a
+    # statement (text, parameters). aCover are the columns
+    # selected by the statement. Only plain column names are
+    # indexed
+    # --------------------------------------------------------
+    def observe(self, aDatabase, aTable, aColumns, aStmt, aBudget, aCover = tuple()):
+        if aBudget <= 0 or not aColumns:
+            return
+        if any(not re.match(r'^\w+$', x) or x.lower() == 'rowid' for x, xReverse in aColumns):
+            return
+        if any(not re.match(r'^\w+$', x) for x in aCover):
+            aCover = tuple()
+
+        xKey = (aDatabase, aTable, tuple(aColumns), tuple(aCover))
+        with self.mLock:
+            if xKey in self.mChecked:
+                return
+            self.mCounts[xKey] = self.mCounts.get(xKey, 0) + 1
+            if self.mCounts[xKey] < self.mHotCount:
+                return
+            self.mChecked.add(xKey)
+            del self.mCounts[xKey]
+        self.mQueue.put((xKey, aStmt, aBudget))
+
+    # --------------------------------------------------------
+    # Returns True, if the query plan sorts the result in a
+    # temporary b-tree or scans the table without an index
+    # --------------------------------------------------------
+    def needsIndex(self, aConnection, aStmt):
+        xPlan = [x[-1] for x in aConnection.execute('explain query plan ' + aStmt[0], aStmt[1])]
+        return any(x.startswith('USE TEMP B-TREE') or re.match(r'^SCAN \w+( AS \w+)?$', x) for x in xPlan)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def getIndexName(self, aTable, aColumns):
+        return 'eezz_idx_{}_{}'.format(aTable, '_'.join(x + ('_desc' if xReverse else '') for x, xReverse in aColumns))
+
+    # --------------------------------------------------------
+    # Return the columns to append to the sort columns for a
+    # covering index: The INTEGER PRIMARY KEY and the columns
+    # in aCover. Empty for a table without such a key
+    # --------------------------------------------------------
+    def getCoverColumns(self, aConnection, aTable, aColumns, aCover):
+        xInfo  = aConnection.execute('pragma table_info({})'.format(aTable)).fetchall()
+        xNames = {x[1].lower() for x in xInfo}
+        xKeys  = [x for x in xInfo if x[5] > 0]
+        if len(xKeys) != 1 or xKeys[0][2].upper() != 'INTEGER':
+            return list()
+        if any(x.lower() not in xNames for x in aCover):
+            return list()
+
+        xRowid = xKeys[0][1]
+        xUsed  = {x.lower() for x, xReverse in aColumns} | {xRowid.lower()}
+        xCover = [(x, False) for x in dict.fromkeys(aCover) if x.lower() not in xUsed]
+        if not xCover:
+            return list()
+        return [(xRowid, aColumns[-1][1])] + xCover
+
+    # --------------------------------------------------------
+    # Create the index, if the budget of the table allows. The
+    # write lock is taken before the budget is counted
+    # --------------------------------------------------------
+    def createIndex(self, aConnection, aTable, aColumns, aBudget):
+        xName    = self.getIndexName(aTable, aColumns)
+        xColumns = ', '.join(x + (' DESC' if xReverse else '') for x, xReverse in aColumns)
+        xTimeout = aConnection.execute('pragma busy_timeout').fetchone()[0]
+        aConnection.execute('pragma busy_timeout = {}'.format(int(self.mBusyTimeout * 1000)))
+        try:
+            aConnection.execute('begin immediate')
+            try:
+                xCount = aConnection.execute("select count(*) from sqlite_master where type = 'index' and tbl_name = ? and name like 'eezz\\_idx\\_%' escape '\\'", (aTable,)).fetchone()[0]
+                if xCount < aBudget:
+                    aConnection.execute('create index if not exists {} on {} ({})'.format(xName, aTable, xColumns))
+                aConnection.commit()
+            except sqlite3.Error:
+                aConnection.rollback()
+                raise
+        finally:
+            aConnection.execute('pragma busy_timeout = {}'.format(xTimeout))
+
+    # --------------------------------------------------------
+    # Executed by a worker of TDbExecutor
+    # --------------------------------------------------------
+    def checkIndex(self, aConnection, aKey, aStmt, aBudget):
+        xDatabase, xTable, xColumns, xCover = aKey
+        if not self.needsIndex(aConnection, aStmt):
+            return
+
+        # The rowid appended to the index is ascending. With the directions
+        # relative to the last column, the index is read backwards for a
+        # descending order of the last column and the rowid
+        xColumns = [(x, xReverse != xColumns[-1][1]) for x, xReverse in xColumns]
+        xColumns = xColumns + self.getCoverColumns(aConnection, xTable, xColumns, xCover)
+        self.createIndex(aConnection, xTable, xColumns, aBudget)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def run(self):
+        while True:
+            xKey, xStmt, xBudget = self.mQueue.get()
+            try:
+                TDbExecutor().execute(xKey[0], self.checkIndex, xKey, xStmt, xBudget, aTimeout=self.mTimeout)
+            except (sqlite3.Error, TDbCancelled):
+                # Busy or interrupted: Check again after the next reports
+                with self.mLock:
+                    self.mChecked.discard(xKey)
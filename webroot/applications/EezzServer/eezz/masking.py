@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Masking of websocket payloads (rfc 6455, 5.3): byte i of the payload
+   is XORed with byte i % 4 of the mask. The same operation masks and
+   unmasks. Each function masks aLength bytes of a bytearray from
+   position aOffset in place:
+
+   maskWords:     XOR of 32 bit words in a python loop
+   maskInt:       XOR of the whole payload as one big integer
+   maskTranslate: bytes.translate of every 4th byte with the XOR table
+                  of the mask byte, the fastest pure python version
+   maskNumpy:     numpy, if available
+
+   applyMask is the fastest available version.
+
+"""
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# XOR table for each mask byte
+XOR_TABLES = [bytes(x ^ xKey for x in range(256)) for xKey in range(256)]
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+def maskWords(aBuffer, aMask, aLength, aOffset = 0):
+    xView  = memoryview(aBuffer)
+    xWords = aLength // 4
+    xMask  = struct.unpack('=I', bytes(aMask))[0]
+
+    with xView[aOffset:aOffset + xWords * 4] as xSlice, xSlice.cast('I') as xInts:
+        for i in range(xWords):
+            xInts[i] ^= xMask
+    for i in range(xWords * 4, aLength):
+        aBuffer[aOffset + i] ^= aMask[i % 4]
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+def maskInt(aBuffer, aMask, aLength, aOffset = 0):
+    xMask = (bytes(aMask) * ((aLength + 3) // 4))[:aLength]
+    xData = int.from_bytes(aBuffer[aOffset:aOffset + aLength], 'little') ^ int.from_bytes(xMask, 'little')
+    aBuffer[aOffset:aOffset + aLength] = xData.to_bytes(aLength, 'little')
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+def maskTranslate(aBuffer, aMask, aLength, aOffset = 0):
+    for i in range(min(4, aLength)):
+        aBuffer[aOffset + i:aOffset + aLength:4] = aBuffer[aOffset + i:aOffset + aLength:4].translate(XOR_TABLES[aMask[i]])
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+def maskNumpy(aBuffer, aMask, aLength, aOffset = 0):
+    xData = numpy.frombuffer(aBuffer, dtype=numpy.uint8, count=aLength, offset=aOffset)
+    xData ^= numpy.resize(numpy.frombuffer(bytes(aMask), dtype=numpy.uint8), aLength)
+
+
+applyMask = maskTranslate if numpy == None else maskNumpy
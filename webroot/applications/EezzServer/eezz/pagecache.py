@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Page cache for the data slices of TDbTable. A page is the result
+   of a select statement with limit, offset or seek condition, so the
+   statement and its parameters are the key. Each page is stored with
+   the data version of the database, a page of an older version is not
+   returned.
+
+   TPrefetch loads pages into a cache in the background, e.g. the next
+   and the previous block after a navigation.
+
+"""
+import queue
+import sqlite3
+import threading
+from   collections   import OrderedDict
+from   eezz.service  import singleton
+from   eezz.dbpool   import TDbPool
+
+
+# --------------------------------------------------------
+# LRU cache of pages: key is (statement, parameters),
+# the page is (rows, column names)
+# --------------------------------------------------------
+class TPageCache:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self, aSize = 32):
+        self.mSize  = aSize
+        self.mPages = OrderedDict()
+        self.mLock  = threading.Lock()
+
+    # --------------------------------------------------------
+    # Return the page or None. The returned rows must not be
+    # modified
+    # --------------------------------------------------------
+    def get(self, aKey, aVersion):
+        with self.mLock:
+            xEntry = self.mPages.get(aKey)
+            if xEntry == None:
+                return None
+            if xEntry[0] != aVersion:
+                del self.mPages[aKey]
+                return None
+            self.mPages.move_to_end(aKey)
+            return xEntry[1]
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def put(self, aKey, aVersion, aPage):
+        with self.mLock:
+            self.mPages[aKey] = (aVersion, aPage)
+            self.mPages.move_to_end(aKey)
+            while len(self.mPages) > self.mSize:
+                self.mPages.popitem(last=False)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def contains(self, aKey, aVersion):
+        with self.mLock:
+            xEntry = self.mPages.get(aKey)
+            return xEntry != None and xEntry[0] == aVersion
+
+    def clear(self):
+        with self.mLock:
+            self.mPages.clear()
+
+
+# --------------------------------------------------------
+# Background thread to load pages into a cache
+# --------------------------------------------------------
+@singleton
+class TPrefetch:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mQueue  = queue.Queue()
+        self.mThread = threading.Thread(target=self.run, daemon=True)
+        self.mThread.start()
+
+    # --------------------------------------------------------
+    # Request a page. aVersion is the data version of the
+    # requesting connection
+    # --------------------------------------------------------
+    def submit(self, aDatabase, aCache, aKey, aVersion):
+        if not aCache.contains(aKey, aVersion):
+            self.mQueue.put((aDatabase, aCache, aKey, aVersion))
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def run(self):
+        while True:
+            xDatabase, xCache, xKey, xVersion = self.mQueue.get()
+            if xCache.contains(xKey, xVersion):
+                continue
+            try:
+                xCursor = TDbPool().getConnection(xDatabase).execute(*xKey)
+                xPage   = (xCursor.fetchall(), [x[0] for x in xCursor.description])
+                xCursor.close()
+                xCache.put(xKey, xVersion, xPage)
+            except sqlite3.Error:
+                pass
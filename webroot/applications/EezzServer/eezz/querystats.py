@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Statistics of the statements of TDbTable. Each statement is timed in
+   four phases:
+   prepare: from the call until sqlite starts the statement, i.e. parse
+            and plan, nearly zero for a statement in the statement cache
+   execute: the first step of the statement
+   fetch:   reading the remaining rows
+   convert: the rows into the table, added by the caller
+
+   The times are added up per statement text. All values of TDbTable are
+   bound as parameters, so the text is the shape of a statement.
+
+   A statement, which takes longer than mThreshold seconds, is passed with
+   its query plan to the logger, which is set by TTracer.
+
+"""
+import time
+import sqlite3
+import threading
+from   eezz.service  import singleton
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+@singleton
+class TQueryStats:
+    # Index of the values per statement
+    COUNT, HITS, ROWS, PREPARE, EXECUTE, FETCH, CONVERT, MAX, SLOW = range(9)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mEnabled   = True
+        self.mThreshold = 0.1
+        self.mMaxShapes = 500
+        self.mLogger    = None
+        self.mShapes    = dict()
+        self.mLock      = threading.Lock()
+
+    # --------------------------------------------------------
+    # Change the threshold for slow statements in seconds or
+    # switch the statistics on or off
+    # --------------------------------------------------------
+    def configure(self, aThreshold = None, aEnabled = None):
+        if aThreshold != None:
+            self.mThreshold = float(aThreshold)
+        if aEnabled != None:
+            self.mEnabled   = aEnabled
+
+    # --------------------------------------------------------
+    # aLogger(aStmt, aSeconds, aRows, aPlan) is called for
+    # each slow statement. aSeconds are the times of prepare,
+    # execute and fetch, aPlan the details of the query plan
+    # --------------------------------------------------------
+    def setLogger(self, aLogger):
+        self.mLogger = aLogger
+
+    # --------------------------------------------------------
+    # Execute a statement and return (rows, column names)
+    # --------------------------------------------------------
+    def execute(self, aDatabase, aStmt, aParameter = tuple()):
+        if not self.mEnabled:
+            xCursor = aDatabase.execute(aStmt, aParameter)
+            xPage   = (xCursor.fetchall(), [x[0] for x in xCursor.description])
+            xCursor.close()
+            return xPage
+
+        # The trace callback is called, when sqlite starts the
+        # prepared statement
+        xStarted = list()
+        xStart   = time.perf_counter()
+        aDatabase.set_trace_callback(lambda x: xStarted.append(time.perf_counter()))
+        try:
+            xCursor = aDatabase.execute(aStmt, aParameter)
+        finally:
+            aDatabase.set_trace_callback(None)
+        xExecuted = time.perf_counter()
+        xRows     = xCursor.fetchall()
+        xFetched  = time.perf_counter()
+        xPage     = (xRows, [x[0] for x in xCursor.description])
+        xCursor.close()
+
+        xPrepared = xStarted[0] if xStarted else xStart
+        xSeconds  = (xPrepared - xStart, xExecuted - xPrepared, xFetched - xExecuted)
+        xSlow     = sum(xSeconds) > self.mThreshold
+        self.add(aStmt, (1, 0, len(xRows)) + xSeconds + (0.0, sum(xSeconds), int(xSlow)))
+
+        if xSlow and self.mLogger != None:
+            self.mLogger(aStmt, xSeconds, len(xRows), self.getQueryPlan(aDatabase, aStmt, aParameter))
+        return xPage
+
+    # --------------------------------------------------------
+    # A statement answered from a cache
+    # --------------------------------------------------------
+    def addHit(self, aStmt):
+        if self.mEnabled:
+            self.add(aStmt, (0, 1, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0))
+
+    # --------------------------------------------------------
+    # Time to convert the rows of a statement into a table
+    # --------------------------------------------------------
+    def addConversion(self, aStmt, aSeconds):
+        if self.mEnabled:
+            self.add(aStmt, (0, 0, 0, 0.0, 0.0, 0.0, aSeconds, 0.0, 0))
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def add(self, aStmt, aValues):
+        with self.mLock:
+            xValues = self.mShapes.get(aStmt)
+            if xValues == None:
+                if len(self.mShapes) >= self.mMaxShapes:
+                    return
+                xValues = self.mShapes[aStmt] = [0, 0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0]
+            for xInx, xValue in enumerate(aValues):
+                if xInx == self.MAX:
+                    xValues[xInx]  = max(xValues[xInx], xValue)
+                else:
+                    xValues[xInx] += xValue
+
+    # --------------------------------------------------------
+    # Return the details of EXPLAIN QUERY PLAN
+    # --------------------------------------------------------
+    def getQueryPlan(self, aDatabase, aStmt, aParameter):
+        try:
+            return [x[-1] for x in aDatabase.execute('explain query plan ' + aStmt, aParameter)]
+        except sqlite3.Error:
+            return list()
+
+    # --------------------------------------------------------
+    # Return a list of (statement, values) with the highest
+    # total time first
+    # --------------------------------------------------------
+    def getStatistics(self):
+        with self.mLock:
+            xShapes = [(x, list(y)) for x, y in self.mShapes.items()]
+        xTotal = lambda x: sum(x[1][self.PREPARE:self.MAX])
+        return sorted(xShapes, key=xTotal, reverse=True)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def clear(self):
+        with self.mLock:
+            self.mShapes.clear()
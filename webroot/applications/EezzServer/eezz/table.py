@@ -32,11 +32,22 @@ Documentation:
   For HTML output and it's possible (and recommended) to hide this column.     
 """
 import os
+import re
+import time
 import collections
 import sqlite3
 from   datetime import date
 from   copy     import deepcopy
 import uuid
+from   itertools import chain, repeat
+from   eezz.columns import TColumnRows, TSortCache
+from   eezz.filters import TFilter, parseFilter, sqlCondition
+from   eezz.dbpool  import TDbPool
+from   eezz.dbexec  import TDbExecutor
+from   eezz.querystats import TQueryStats
+from   eezz.indexes import TIndexAdvisor
+from   eezz.anchors import TAnchorIndex
+from   eezz.pagecache import TPageCache, TPrefetch
 
 # ---------------------------------------------------------------------------------
 # TCell
@@ -111,6 +122,13 @@ class TTable(collections.UserList):
         self.mStartInx    = 1;
         self.mColsName.extend(aColNames)
         self.mSelChanged  = True
+        self.mRowIndex    = None
+        self.mRows        = None
+        self.mSortCols    = list()
+        self.mSortCache   = TSortCache()
+        self.mSortOrder   = None
+        self.mFilter      = TFilter()
+        self.mView        = None
 
         
         self.mColsWidth   = [len(x) for x in self.mColsName]
@@ -138,6 +156,17 @@ class TTable(collections.UserList):
         """ Overloading the __str__ defines the output of the TTable object """
         return self.mHeaderStr.format(**self.mHeaderDic)
 
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getViewSize(self):
+        """ Return the number of rows passing the filter. len() returns the number
+        of all rows, which is the range of the sequence protocol
+        """
+        xView = self.getView()
+        if xView == None:
+            return len(self.data)
+        return len(xView)
+
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
     def get_path(self):
@@ -150,7 +179,7 @@ class TTable(collections.UserList):
         """ Return the dictionary """
         xRowElement = self.get_selected_row()
         
-        self.mHeaderDic['table_size']     = len(self)
+        self.mHeaderDic['table_size']     = self.getViewSize()
         self.mHeaderDic['table_position'] = self.mCurrent
         self.mHeaderDic['selected']       = xRowElement
 
@@ -192,6 +221,7 @@ class TTable(collections.UserList):
         self.mColsWidth   = [len(x) for x in self.mColsName]
         self.mColsType    = [str    for x in self.mColsName]
         self.mColsFilter  = ['*'    for x in self.mColsName]        
+        self.mView        = None
        
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
@@ -210,6 +240,7 @@ class TTable(collections.UserList):
     def set_columns_type(self, aColsType):
         """ Set column types """
         self.mColsType = aColsType
+        self.resetRows()
 
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
@@ -231,6 +262,7 @@ class TTable(collections.UserList):
         self.mRowInx   = 0
         self.mSelected = 0
         self.mCurrent  = 0
+        self.resetRows()
         super().clear()
         
     # ---------------------------------------------------------------------------------
@@ -257,22 +289,114 @@ class TTable(collections.UserList):
         
         for xElem in xRow:
             if isinstance(xElem, TTable):
-                xPath   = '{}/{}'.format(self.mPath, xElem.mPath)
-                if xPath.startswith('//'):
-                    xElem.mPath = xPath[1:]
-                else:
-                    xElem.mPath = xPath
-                xElem.mHeaderDic['table_path'] = xPath
-                xElem.mParent = self 
+                self.linkTable(xElem)
         
         if len(self.data) == 0:
             self.mColsType = [type(x) for x in xRow]                
         
-        super(collections.UserList, self).append(xRow)
+        self.data.append(xRow)
         self.set_visible_items(self.mVisibleScroll, self.mVisibleBlock)
         
-        aColsWidth      = [len(str(x)) for x in xRow]
-        self.mColsWidth = [max(x)      for x in zip(aColsWidth, self.mColsWidth)] 
+        if self.mRowIndex != None:
+            self.mRowIndex.setdefault(self.getRowKey(xRow), len(self.data) - 1)
+        
+        if self.mRows != None:
+            self.mRows.append(xRow)
+            self.mSortCache.clear()
+        
+        self.mFilter.clear()
+        if self.mView != None and self.mFilter.matchRow(self.mColsFilter, xRow):
+            self.mView.append(len(self.data) - 1)
+        
+        self.mColsWidth = None
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def extend_rows(self, aRows, aCells=None, aRowInx=None):
+        """ Add many rows in one pass. aCells and aRowInx are optional iterables with
+        the TCell and the row-id for each row, as for append. Rows with a wrong number 
+        of values are skipped
+        """
+        xNumCols = len(self.mColsName) - 1
+        xStart   = len(self.data)
+        xCells   = None
+        
+        if aCells == None and aRowInx == None:
+            xValues = [x for x in aRows if len(x) == xNumCols]
+        else:
+            xZipped = [x for x in zip(aRows, aCells or repeat(None), aRowInx or repeat(None)) if len(x[0]) == xNumCols]
+            xValues = [x[0] for x in xZipped]
+            xCells  = [x[1] for x in xZipped]
+        
+        if not xValues:
+            return
+        
+        # Row-ids are counted from mRowInx or taken from aRowInx
+        if aRowInx != None:
+            xRowIds = [int(x[2]) for x in xZipped]
+            self.mRowInx = xRowIds[-1]
+        else:
+            xRowIds = range(self.mRowInx, self.mRowInx + len(xValues))
+            self.mRowInx += len(xValues)
+        
+        xNewRows = [[xInx, *xRow] for xInx, xRow in zip(xRowIds, xValues)]
+        
+        if xCells != None:
+            for xRow, xCell in zip(xNewRows, xCells):
+                if xCell:
+                    xCell.mValue = xRow[0]
+                    xRow[0]      = xCell
+        
+        # Only tables stored in cells need a link to this table
+        if any(issubclass(x, TTable) for x in set(map(type, chain.from_iterable(xNewRows)))):
+            for xElem in chain.from_iterable(xNewRows):
+                if isinstance(xElem, TTable):
+                    self.linkTable(xElem)
+        
+        if xStart == 0:
+            self.mColsType = [type(x) for x in xNewRows[0]]
+        
+        self.data.extend(xNewRows)
+        self.mRowIndex  = None
+        self.mColsWidth = None
+        
+        if self.mRows != None:
+            self.mRows.extend(xNewRows)
+            self.mSortCache.clear()
+        
+        self.mFilter.clear()
+        if self.mView != None:
+            for xInx, xRow in enumerate(xNewRows, xStart):
+                if self.mFilter.matchRow(self.mColsFilter, xRow):
+                    self.mView.append(xInx)
+        
+        self.set_visible_items(self.mVisibleScroll, self.mVisibleBlock)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def linkTable(self, aTable):
+        """ Set path and parent of a table stored in a cell """
+        xPath   = '{}/{}'.format(self.mPath, aTable.mPath)
+        if xPath.startswith('//'):
+            aTable.mPath = xPath[1:]
+        else:
+            aTable.mPath = xPath
+        aTable.mHeaderDic['table_path'] = xPath
+        aTable.mParent = self 
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getColsWidth(self):
+        """ Return the width of each column. The widths are calculated on demand
+        after the rows have changed
+        """
+        if self.mColsWidth == None:
+            self.mColsWidth = [len(x) for x in self.mColsName]
+            if len(self.data) > 0:
+                for xInx in range(len(self.mColsWidth)):
+                    xWidth = max(map(len, map(str, self.getColumnValues(xInx))))
+                    self.mColsWidth[xInx] = max(xWidth, self.mColsWidth[xInx])
+        return self.mColsWidth
     
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
@@ -288,20 +412,105 @@ class TTable(collections.UserList):
             
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
-    def do_sort(self, index=0):
+    def do_sort(self, index=0, multiple=0):
         """ Toggle sort on a given column index
+        With multiple (shift-click) the column is added to the current sort or the
+        direction of this column is toggled, if it is already part of it
         """
-        aInx    = min(max(0, int(index)), len(self.mColsName)-1)
-        aResult = list()
-        self.mSortReverse =  not self.mSortReverse
+        aInx = min(max(0, int(index)), len(self.mColsName)-1)
+        self.setSortCols(aInx, int(multiple))
+        self.sortRows(self.mSortCols)
+        self.mRowIndex = None
+        self.mView     = None
+        self.mFilter.clear()
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def do_filter(self, index=0, value='*'):
+        """ Set the filter on a given column index and show the first block of the 
+        rows passing all column filters. See eezz.filters for the syntax
+        """
+        aInx = min(max(0, int(index)), len(self.mColsName)-1)
+        self.mColsFilter[aInx] = value if value else '*'
+        self.mView        = None
+        self.mCurrent     = 0
+        self.mSelChanged  = True
+        self.mHeaderDic['table_current'] = 0
+        self.set_visible_items(None, None)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getView(self):
+        """ Return the positions of the rows passing the filter or None without filter
+        """
+        if self.mView == None:
+            self.mView = self.mFilter.getView(self.mColsFilter, self.getColumnValues)
+        return self.mView
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getColumnValues(self, aInx):
+        """ Return the values of a column in the order of the rows
+        """
+        return [xRow[aInx] for xRow in self.data]
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getViewRows(self):
+        """ Return the visible rows of the view
+        """
+        xView   = self.getView()
+        xEndInx = min(len(self.data) if xView == None else len(xView), self.mCurrent + self.mVisibleRows)
+        xBegInx = max(0, xEndInx - self.mVisibleRows)
+        
+        if xView == None:
+            return self.data[xBegInx:xEndInx]
+        return list(map(self.data.__getitem__, xView[xBegInx:xEndInx]))
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def setSortCols(self, aInx, aMultiple):
+        """ Calculate the list of (column, reverse) for a sort request
+        """
+        if aMultiple and self.mSortCols:
+            for xPos, (xInx, xReverse) in enumerate(self.mSortCols):
+                if xInx == aInx:
+                    self.mSortCols[xPos] = (xInx, not xReverse)
+                    break
+            else:
+                self.mSortCols.append((aInx, False))
+        else:
+            self.mSortCols = [(aInx, not self.mSortReverse)]
+        self.mSortReverse = self.mSortCols[0][1]
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def sortRows(self, aSortCols):
+        """ Arrange the rows for a list of (column, reverse). The sort keys and the 
+        permutation of each column are calculated once for the rows in mRows.
+        Toggling the direction of the last order reverses the list in place
+        """
+        if self.mRows == None:
+            self.mRows = self.data
+            self.mSortCache.clear()
         
-        if self.mColsType[aInx] == int:
-            aResult = sorted(self, key=lambda xRow: int(xRow[aInx]),   reverse=self.mSortReverse)
-        elif self.mColsType[aInx] == float:
-            aResult = sorted(self, key=lambda xRow: float(xRow[aInx]), reverse=self.mSortReverse)
+        xOrder, xReverse = self.mSortCache.getOrder(len(self.mRows), aSortCols, self.createSortKey)
+        if self.mSortOrder != None and self.mSortOrder[0] is xOrder:
+            if self.mSortOrder[1] != xReverse:
+                self.data.reverse()
+        elif xReverse:
+            self.data = list(map(self.mRows.__getitem__, reversed(xOrder)))
         else:
-            aResult = sorted(self, key=lambda xRow: str(xRow[aInx]),   reverse=self.mSortReverse)
-        self.data = aResult
+            self.data = list(map(self.mRows.__getitem__, xOrder))
+        self.mSortOrder = (xOrder, xReverse)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def createSortKey(self, aInx):
+        """ Return the key function for a column of mRows
+        """
+        xConvert = {int: int, float: float}.get(self.mColsType[aInx], str)
+        return [xConvert(xRow[aInx]) for xRow in self.mRows].__getitem__
 
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
@@ -311,7 +520,7 @@ class TTable(collections.UserList):
         aInx   = int(index)
         xTable = self 
         
-        if len(self) == 0:
+        if self.getViewSize() == 0:
             return self
         
         xRowElement = self.get_selected_row(aInx)        
@@ -330,11 +539,12 @@ class TTable(collections.UserList):
         if xSaveInx == -1:
             xSaveInx = self.mSelected
         
-        for xInx, xElem in enumerate(self):
-            if int(str(xElem[0])) == xSaveInx:  
-                self.mSelected = xSaveInx
-                self.mHeaderDic['selected'] = xElem
-                return xElem 
+        xInx = self.getRowIndex().get(xSaveInx)
+        if xInx != None:
+            xElem = self.data[xInx]
+            self.mSelected = xSaveInx
+            self.mHeaderDic['selected'] = xElem
+            return xElem 
         
         if self.data:
             return self.data[0]       
@@ -351,10 +561,10 @@ class TTable(collections.UserList):
             #-- print('tbale select')
             self.mSelChanged = (xSaveInx != self.mSelected)
             
-        for xInx, xElem in enumerate(self):
-            if int(str(xElem[0])) == xSaveInx:  
-                self.mSelected = xSaveInx
-                self.mHeaderDic['selected'] = xElem
+        xInx = self.getRowIndex().get(xSaveInx)
+        if xInx != None:
+            self.mSelected = xSaveInx
+            self.mHeaderDic['selected'] = self.data[xInx]
 
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
@@ -371,10 +581,81 @@ class TTable(collections.UserList):
         if index == -1:
             index = self.mSelected
 
-        for xInx, xElem in enumerate(self):
-            if int(str(xElem[0])) == index:  
-                return xInx
-        return -1
+        return self.getRowIndex().get(index, -1)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getRowKey(self, aRow):
+        """ Return the row-id of a row, which is stored in column 0
+        """
+        try:
+            return int(str(aRow[0]))
+        except (ValueError, IndexError):
+            return None
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getRowIndex(self):
+        """ Return the mapping row-id to position. The index is calculated on first access
+        after a change of the row order and is kept up to date by append
+        """
+        if self.mRowIndex == None:
+            self.mRowIndex = dict()
+            for xInx, xElem in enumerate(self.data):
+                self.mRowIndex.setdefault(self.getRowKey(xElem), xInx)
+        return self.mRowIndex
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def resetRows(self):
+        """ Drop the row index and the sort caches after a change of the rows
+        """
+        self.mRowIndex  = None
+        self.mRows      = None
+        self.mSortOrder = None
+        self.mView      = None
+        self.mColsWidth = None
+        self.mSortCache.clear()
+        self.mFilter.clear()
+
+    # ---------------------------------------------------------------------------------
+    # Any other change of the list invalidates the row index and sort caches
+    # ---------------------------------------------------------------------------------
+    def __setitem__(self, aInx, aValue):
+        self.resetRows()
+        super().__setitem__(aInx, aValue)
+
+    def __delitem__(self, aInx):
+        self.resetRows()
+        super().__delitem__(aInx)
+
+    def __iadd__(self, aOther):
+        self.resetRows()
+        return super().__iadd__(aOther)
+
+    def insert(self, aInx, aRow):
+        self.resetRows()
+        super().insert(aInx, aRow)
+
+    def pop(self, aInx = -1):
+        self.resetRows()
+        return super().pop(aInx)
+
+    def remove(self, aRow):
+        self.resetRows()
+        super().remove(aRow)
+
+    def reverse(self):
+        self.resetRows()
+        super().reverse()
+
+    def sort(self, *args, **kwds):
+        self.resetRows()
+        super().sort(*args, **kwds)
+
+    def extend(self, aOther):
+        self.resetRows()
+        super().extend(aOther)
                 
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
@@ -382,7 +663,7 @@ class TTable(collections.UserList):
         """ Print ACII formatted table 
         """
         xFmtRow = list()
-        for xType, xWidth in zip(self.mColsType, self.mColsWidth):
+        for xType, xWidth in zip(self.mColsType, self.getColsWidth()):
             if xType in self.mFormat:
                 xFmtRow.append(self.mFormat[xType].format(xWidth))
             else:
@@ -391,16 +672,13 @@ class TTable(collections.UserList):
         if len(self.mHeaderStr) > 0: 
             print('Table = {}'.format( self.mHeaderStr.format(**self.mHeaderDic)))
             
-        xLine = [format(xVal, str(xWidth)) for xVal, xWidth in zip(self.mColsName, self.mColsWidth)]
+        xLine = [format(xVal, str(xWidth)) for xVal, xWidth in zip(self.mColsName, self.getColsWidth())]
         print('|-{}-|'.format(' |'.join(xLine)))
     
-        if len(self) == 0:
+        if self.getViewSize() == 0:
             return
-            
-        xEndInx = min(len(self.data), self.mCurrent + self.mVisibleRows)
-        xBegInx = max(0, xEndInx - self.mVisibleRows)
         
-        for xRow in self.data[xBegInx:xEndInx]:
+        for xRow in self.getViewRows():
             xLine = [format(xVal, xFmt) for xVal, xFmt in zip(xRow, xFmtRow)]
             print('| {} |'.format(' |'.join(xLine)))
     
@@ -415,7 +693,7 @@ class TTable(collections.UserList):
         if visible_block:            
             self.mVisibleBlock  = max(8, int(visible_block))
         
-        if len(self) > self.mVisibleScroll:
+        if self.getViewSize() > self.mVisibleScroll:
             self.mHeaderDic['table_nav_type'] = 'block'
             self.mVisibleRows = self.mVisibleBlock
         else:
@@ -433,15 +711,15 @@ class TTable(collections.UserList):
         aInx = int(where)
 
         if aInx   == TTable.NAVIGATION_POS:
-            self.mCurrent = max(0, min(int(pos), len(self) - self.mVisibleRows))
+            self.mCurrent = max(0, min(int(pos), self.getViewSize() - self.mVisibleRows))
         elif aInx == TTable.NAVIGATION_NEXT:
-            self.mCurrent = max(0, min(len(self) - self.mVisibleRows, self.mCurrent + self.mVisibleRows))
+            self.mCurrent = max(0, min(self.getViewSize() - self.mVisibleRows, self.mCurrent + self.mVisibleRows))
         elif aInx == TTable.NAVIGATION_PREV:
             self.mCurrent = max(0, self.mCurrent - self.mVisibleRows)
         elif aInx == TTable.NAVIGATION_TOP:
             self.mCurrent = 0
         elif aInx == TTable.NAVIGATION_LAST:
-            self.mCurrent = max(0, len(self) - self.mVisibleRows)
+            self.mCurrent = max(0, self.getViewSize() - self.mVisibleRows)
         
         self.mHeaderDic['table_current'] = self.mCurrent 
 
@@ -450,40 +728,93 @@ class TTable(collections.UserList):
     def get_raw_rows(self):
         """ Return table rows 
         """
-        if len(self) == 0:
+        if self.getViewSize() == 0:
             return list()
         
-        xEndInx = min(len(self.data), self.mCurrent + self.mVisibleRows)
-        xBegInx = max(0, xEndInx - self.mVisibleRows)
-        return self.data[xBegInx:xEndInx]
+        return self.getViewRows()
         
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
     def get_rows(self):
         """ Return formatted rows 
         """
-        if len(self) == 0:
+        if self.getViewSize() == 0:
             return list()
 
-        xFmtRow = [ self.mFormat[xType].format(xWidth)  for xType, xWidth in zip(self.mColsType, self.mColsWidth)]
+        xFmtRow = [ self.mFormat[xType].format(xWidth)  for xType, xWidth in zip(self.mColsType, self.getColsWidth())]
         aLines  = list()
-
-        xEndInx = min(len(self.data), self.mCurrent + self.mVisibleRows)
-        xBegInx = max(0, xEndInx - self.mVisibleRows)
                 
-        for xRow in self.data[xBegInx:xEndInx]:
+        for xRow in self.getViewRows():
             aLines.append( [format(xVal, xFmt) for xVal, xFmt in zip(xRow, xFmtRow)] )
         return aLines
     
+# ---------------------------------------------------------------------------------
+# ---------------------------------------------------------------------------------
+""" The TColumnTable stores the rows in typed columns for large tables """
+class TColumnTable(TTable):
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def __init__(self, aColNames=list(), aHeaderStr='', aHeaderDic=dict(), visible_items=100):
+        """ The rows are materialized on access. Changes of a returned row are not
+        stored in the table. Rows could be appended, sorted and cleared
+        """
+        super().__init__(aColNames, aHeaderStr, aHeaderDic, visible_items)
+        self.data = TColumnRows()
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def sortRows(self, aSortCols):
+        """ The rows are not moved, the table keeps a permutation instead
+        """
+        self.data.sortBy(aSortCols, self.mColsType)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getColumnValues(self, aInx):
+        """ Return the values of a column without materializing the rows
+        """
+        return self.data.getColumn(aInx)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def set_columns_type(self, aColsType):
+        """ Set column types """
+        super().set_columns_type(aColsType)
+        self.data.mSorts.clear()
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getMemorySize(self):
+        """ Return the number of bytes used by the columns """
+        return self.data.getMemorySize()
+
 # ---------------------------------------------------------------------------------
 # ---------------------------------------------------------------------------------
 """ The TDBTable defines an optimized database access """
 class TDbTable(TTable):
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
-    def __init__(self, database, select):        
+    def __init__(self, database, select, approximate = None, keyset = True, timeout = None, indexes = 0):        
         self.mOffset      = 0
+        self.mTimeout     = None if timeout == None else float(timeout)
+        self.mIndexBudget = int(indexes)
+        self.mKeyset      = keyset
+        self.mSeek        = None
+        self.mKeyFirst    = None
+        self.mKeyLast     = None
+        self.mNullKeys    = frozenset()
+        self.mNullCache   = dict()
+        self.mAnchors     = dict()
+        self.mAnchorStep  = 1000
+        self.mPageCache   = TPageCache()
+        self.mStmtCache   = dict()
+        self.mProjection  = None
+        self.mFetched     = None
+        self.mSearch      = ''
+        self.mSearchTable = None
         self.mDatabase    = database
+        self.mSizeCache   = dict()
+        self.mApproximate = approximate
         self.mSelectParam = None
         self.mSortCol     = None
         self.mSelectObj   = select
@@ -528,41 +859,473 @@ class TDbTable(TTable):
         """
         return int(self.mVirtualSize)
     
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getViewSize(self):
+        """ The filter is part of the select, the view is the virtual size
+        """
+        return int(self.mVirtualSize)
+    
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
     def do_navigate(self, where = TTable.NAVIGATION_NEXT, pos = 0):
-        """ Overwrite navigation to decide for new database access
+        """ Overwrite navigation to decide for new database access. Moving to the
+        adjacent block or to the last block is done by a seek on the sort keys of the
+        current block, so that the database does not skip the rows up to the offset.
         """
+        xOffset       = self.mOffset
         self.mCurrent = self.mOffset
         super().do_navigate(where, pos)
         self.mOffset  = self.mCurrent
         self.mCurrent = 0
         self.mExecute = True            
-                  
+        self.mSeek    = self.getSeek(int(where), xOffset, self.mOffset)
+
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
-    def getSelectStmt(self, aSelectCmd):
-        """ Create a database statement for this object
+    def getSeek(self, aWhere, aOffset, aNewOffset):
+        """ Return the navigation, which is done by a seek on the keys of the current
+        block, for a move from aOffset to aNewOffset, or None
         """
-        xSelectStmt = 'select '
+        if aWhere   == TTable.NAVIGATION_NEXT and aNewOffset == aOffset + len(self.data) and self.mKeyLast:
+            return TTable.NAVIGATION_NEXT
+        elif aWhere == TTable.NAVIGATION_PREV and aNewOffset == aOffset - self.mVisibleRows and self.mKeyFirst:
+            return TTable.NAVIGATION_PREV
+        elif aWhere in (TTable.NAVIGATION_NEXT, TTable.NAVIGATION_LAST) and aNewOffset > 0 and aNewOffset == self.getViewSize() - self.mVisibleRows:
+            return TTable.NAVIGATION_LAST
+        return None
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def set_projection(self, aColumns):
+        """ Restrict the select to the columns used for output, e.g. by the table-columns
+        of a template. aColumns are the indices of the columns, None or an empty list
+        select all columns. The data is selected again, if the current data slice misses
+        a column.
+        """
+        xProjection = frozenset(x for x in aColumns if x > 0) if aColumns else None
+        if xProjection == self.mProjection:
+            return
+        
+        self.mProjection = xProjection
+        if self.mFetched == None or (xProjection != None and xProjection <= self.mFetched):
+            return
+        
+        xSelected     = self.mSelected
+        self.mExecute = True
+        self.get_selected_obj(parameter = self.mSelectParam or tuple())
+        self.do_select(xSelected)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getProjection(self):
+        """ Return the select list for the projection. The columns, which are not
+        used, are selected as NULL with the name of the column, so that the positions
+        and names of the columns do not change. The columns of the sort, the order and
+        the filters are selected in any case: The order by would find the NULL by the
+        name of the column, while the seek and the filter compare the column of the table.
+        """
+        if self.mProjection == None:
+            return self.mSelectCmd['select']
+        
+        # Column 0 of the table is INX
+        xUsed   = self.getProjectedColumns()
+        xSelect = list()
+        for xInx, xExpr in enumerate(self.mSelectCmd['select'], 1):
+            if xInx in xUsed or xInx >= len(self.mColsName):
+                xSelect.append(xExpr)
+            else:
+                xSelect.append('NULL as "{}"'.format(self.mColsName[xInx].replace('"', '""')))
+        return xSelect
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getProjectedColumns(self):
+        """ Return the indices of the selected columns or None for all columns
+        """
+        if self.mProjection == None:
+            return None
+        return self.mProjection | self.getOrderColumns()
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getOrderColumns(self):
+        """ Return the indices of the columns used by the sort, the order and the
+        column filters
+        """
+        xNames = set(re.findall(r'\w+', self.mSelectCmd.get('order') or ''))
+        xUsed  = {x for x, y in self.mSortCols}
+        xUsed.update(x for x in range(1, len(self.mColsName)) if self.mColsName[x] in xNames)
+        xUsed.update(x for x in range(1, len(self.mColsFilter)) if parseFilter(self.mColsFilter[x]) != None)
+        return frozenset(xUsed)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getColumnExpr(self, aInx):
+        """ Return the expression of a column in the select list without alias.
+        Column 0 of the table is INX
+        """
+        xExpr  = self.mSelectCmd['select'][aInx - 1]
+        xMatch = re.match(r'(.*)\s+as\s+\w+\s*$', xExpr, re.S | re.I)
+        return (xMatch.group(1) if xMatch else xExpr).strip()
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getView(self):
+        """ The rows are filtered by the database
+        """
+        return None
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def do_filter(self, index=0, value='*'):
+        """ Set the filter on a given column index. The filter is evaluated by the
+        database and the navigation starts at the first block. See eezz.filters for the
+        syntax
+        """
+        aInx = min(max(0, int(index)), len(self.mColsName)-1)
+        self.mColsFilter[aInx] = value if value else '*'
+        self.setFilterCmd()
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def do_search(self, value=''):
+        """ Search the words of value in the text columns. The search uses a FTS5 table
+        on the database, which is created on the first search, and matches the words
+        as prefix, e.g. 'mot car' finds 'motor cars'
+        """
+        self.mSearch = value.strip() if value else ''
+        self.setFilterCmd()
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def setFilterCmd(self):
+        """ Translate the column filters and the search into the condition 'filter' of
+        the select command and reset the navigation
+        """
+        xConds  = list()
+        xParams = list()
+        for xInx, xFilter in enumerate(self.mColsFilter):
+            xCond = parseFilter(xFilter)
+            if xInx == 0 or xCond == None or xInx > len(self.mSelectCmd['select']):
+                continue
+            xText, xParam = sqlCondition(self.getColumnExpr(xInx), xCond)
+            xConds.append(xText)
+            xParams.extend(xParam)
+        
+        if self.mSearch:
+            xText, xParam = self.getSearchCondition(self.mSearch)
+            xConds.append(xText)
+            xParams.extend(xParam)
         
+        if xConds:
+            self.mSelectCmd['filter'] = (' and '.join(xConds), tuple(xParams))
+        else:
+            self.mSelectCmd.pop('filter', None)
+        
+        self.mExecute    = True
+        self.mSeek       = None
+        self.mKeyFirst   = None
+        self.mKeyLast    = None
+        self.mOffset     = 0
+        self.mCurrent    = 0
+        self.mSelected   = 0
+        self.mSelChanged = True
+        self.mHeaderDic['table_current'] = 0
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getSearchCondition(self, aText):
+        """ Return the condition and parameters for a search. Without FTS5 the words
+        are searched with LIKE in the text columns
+        """
+        xWords = re.findall(r'\w+', aText)
+        if not xWords:
+            return '1', tuple()
+        
+        xSearch = self.createSearchTable()
+        if xSearch != None:
+            xQuery = ' '.join('"{}"*'.format(x) for x in xWords)
+            return 'rowid in (select rowid from {0} where {0} match ?)'.format(xSearch[0]), (xQuery,)
+        
+        xColumns = [self.getColumnExpr(x) for x in range(1, len(self.mSelectCmd['select']) + 1)]
+        xColumns = [x for x in xColumns if not '?' in x]
+        xConds, xParams = list(), list()
+        for xWord in xWords:
+            xWordConds = [sqlCondition(x, ('substring', xWord.lower())) for x in xColumns]
+            xConds.append('(' + ' or '.join(x[0] for x in xWordConds) + ')')
+            xParams.extend(x[1][0] for x in xWordConds)
+        return ' and '.join(xConds), tuple(xParams)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def createSearchTable(self):
+        """ Create the FTS5 table for the text columns of a single table in the select
+        list. The FTS5 table uses the table as external content and is kept in sync by
+        triggers. Returns (name, columns) or None, if no FTS5 table could be created
+        """
+        if self.mSearchTable != None:
+            return self.mSearchTable or None
+        self.mSearchTable = tuple()
+        
+        if len(self.mSelectCmd['from']) != 1:
+            return None
+        
+        xTable    = self.mSelectCmd['from'][0].split()[0]
+        xName     = 'eezz_fts_' + xTable
+        xDatabase = TDbPool().getConnection(self.mDatabase)
+        try:
+            xTypes   = {x[1]: x[2].upper() for x in xDatabase.execute('pragma table_info({})'.format(xTable))}
+            xColumns = [x for x in map(self.getColumnExpr, range(1, len(self.mSelectCmd['select']) + 1))
+                        if x in xTypes and (xTypes[x] == '' or any(y in xTypes[x] for y in ('CHAR', 'CLOB', 'TEXT')))]
+            if not xColumns:
+                return None
+            
+            if xDatabase.execute('select 1 from sqlite_master where name = ?', (xName,)).fetchone() == None:
+                xCols = ', '.join(xColumns)
+                xNew  = ', '.join('new.' + x for x in xColumns)
+                xOld  = ', '.join('old.' + x for x in xColumns)
+                xDatabase.execute("create virtual table {} using fts5({}, content='{}', content_rowid='rowid', prefix='2 3')".format(xName, xCols, xTable))
+                xDatabase.execute("create trigger {0}_ai after insert on {1} begin insert into {0}(rowid, {2}) values (new.rowid, {3}); end".format(xName, xTable, xCols, xNew))
+                xDatabase.execute("create trigger {0}_ad after delete on {1} begin insert into {0}({0}, rowid, {2}) values ('delete', old.rowid, {4}); end".format(xName, xTable, xCols, xNew, xOld))
+                xDatabase.execute("create trigger {0}_au after update on {1} begin insert into {0}({0}, rowid, {2}) values ('delete', old.rowid, {4}); insert into {0}(rowid, {2}) values (new.rowid, {3}); end".format(xName, xTable, xCols, xNew, xOld))
+                xDatabase.execute("insert into {0}({0}) values ('rebuild')".format(xName))
+                xDatabase.commit()
+        except sqlite3.Error:
+            xDatabase.rollback()
+            return None
+        
+        self.mSearchTable = (xName, xColumns)
+        return self.mSearchTable
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getKeyColumns(self):
+        """ Return the sort keys as list of (expression, descending) completed by the
+        rowid, or None if the statement does not allow keyset navigation
+        """
+        xSelectCmd = self.mSelectCmd
+        if not self.mKeyset or len(xSelectCmd['from']) != 1:
+            return None
+        if any(xSelectCmd.get(x) != None for x in ('group', 'distinct')):
+            return None
+        if xSelectCmd.get('order') != None and not self.mSortCols:
+            return None
+        
+        xKeys = list()
+        for xInx, xReverse in self.mSortCols:
+            xExpr = self.getColumnExpr(xInx)
+            if '?' in xExpr:
+                return None
+            xKeys.append((xExpr, xReverse))
+        xKeys.append(('rowid', self.mSortCols[-1][1] if self.mSortCols else False))
+        return xKeys
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getSeekCondition(self, aKeys, aValues, aAfter):
+        """ Return the condition and parameters for the rows after or before the given
+        key values in the order of aKeys. sqlite sorts NULL before all values, but the
+        comparison with NULL is never true: The keys in mNullKeys and the key values
+        NULL are compared with IS NULL, the other keys by the row values.
+        """
+        xOps   = ['>' if aAfter != xDesc else '<' for xExpr, xDesc in aKeys]
+        xNulls = [x[0] in self.mNullKeys or y == None for x, y in zip(aKeys, aValues)]
+        if len(set(xOps)) == 1 and None not in aValues and (xOps[0] == '>' or not any(xNulls)):
+            xCond = '({}) {} ({})'.format(', '.join(x[0] for x in aKeys), xOps[0], ', '.join('?' * len(aKeys)))
+            return xCond, tuple(aValues)
+        
+        xTerms, xParams = list(), list()
+        for xInx, (xExpr, xDesc) in enumerate(aKeys):
+            xEqual = ['{} = ?'.format(x[0]) if y != None else '{} is null'.format(x[0]) for x, y in zip(aKeys[:xInx], aValues)]
+            xValue = aValues[xInx]
+            if xValue == None and xOps[xInx] == '<':
+                # No value is sorted before NULL
+                continue
+            elif xValue == None:
+                xTerm = '{} is not null'.format(xExpr)
+            elif xOps[xInx] == '<' and xNulls[xInx]:
+                xTerm = '({} < ? or {} is null)'.format(xExpr, xExpr)
+            else:
+                xTerm = '{} {} ?'.format(xExpr, xOps[xInx])
+            xTerms.append('(' + ' and '.join(xEqual + [xTerm]) + ')')
+            xParams.extend(x for x in aValues[:xInx + 1] if x != None)
+        if not xTerms:
+            return '0', tuple()
+        return '(' + ' or '.join(xTerms) + ')', tuple(xParams)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getNullKeys(self, aDatabase, aKeys, aVersion):
+        """ Return the key expressions, which are NULL for some rows of the table. Only
+        these need the terms for NULL in the seek condition, which prevent the search
+        in an index. The result is kept for the data version.
+        """
+        xNullKeys = set()
+        for xExpr, xDesc in aKeys[:-1]:
+            xEntry = self.mNullCache.get(xExpr)
+            if xEntry == None or xEntry[0] != aVersion:
+                xStmt  = 'select exists (select 1 from {} where {} is null)'.format(self.mSelectCmd['from'][0], xExpr)
+                try:
+                    xEntry = self.mNullCache[xExpr] = (aVersion, aDatabase.execute(xStmt).fetchone()[0] == 1)
+                except sqlite3.OperationalError:
+                    TDbExecutor().checkTask()
+                    xEntry = (aVersion, True)
+            if xEntry[1]:
+                xNullKeys.add(xExpr)
+        return frozenset(xNullKeys)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getSeekCmd(self, aSelect, aKeys, aParameter, aValues = None, aAfter = True, aReverse = False):
+        """ Return the select command and the parameters for the given columns of the
+        rows after or before the key values aValues in the order of aKeys
+        """
+        # The entries are replaced and not modified, so a flat copy is sufficient
+        xSelectCmd = dict(self.mSelectCmd)
+        xSelectCmd['select'] = aSelect
+        xSelectCmd.pop('sort',   None)
+        xParameter = tuple(aParameter)
+        
+        if aValues != None:
+            xCond, xSeekParam = self.getSeekCondition(aKeys, aValues, aAfter)
+            if xSelectCmd.get('where') != None:
+                xCond = '({}) and {}'.format(xSelectCmd['where'], xCond)
+            xSelectCmd['where'] = xCond
+            xParameter += xSeekParam
+        
+        xSelectCmd['order'] = ', '.join('{} {}'.format(xExpr, 'DESC' if xDesc != aReverse else 'ASC') for xExpr, xDesc in aKeys)
+        return xSelectCmd, xParameter
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getKeysetCmd(self, aKeys, aParameter, aIndex, aSeek, aOffset):
+        """ Return the select command, the parameters and the reverse flag for the
+        next data slice in keyset mode. The key values are selected behind the columns.
+        PREV and LAST read in reverse order. Other jumps start at the nearest anchor of
+        the position index aIndex.
+        """
+        xReverse   = aSeek in (TTable.NAVIGATION_PREV, TTable.NAVIGATION_LAST)
+        xValues    = {TTable.NAVIGATION_NEXT: self.mKeyLast, TTable.NAVIGATION_PREV: self.mKeyFirst}.get(aSeek)
+        xOffset    = 0
+        
+        if aSeek == None:
+            xOffset = aOffset
+            if aIndex != None:
+                xValues, xPos = aIndex.getAnchor(aOffset)
+                xOffset      -= xPos
+        
+        xSelectCmd, xParameter = self.getSeekCmd(self.getProjection() + [x[0] for x in aKeys], 
+            aKeys, aParameter, xValues, aSeek != TTable.NAVIGATION_PREV, xReverse)
+        xSelectCmd['limit'] = self.mVisibleRows
+        if xOffset > 0:
+            xSelectCmd['offset'] = xOffset
+        return xSelectCmd, xParameter, xReverse
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getAnchorIndex(self, aKeys, aParameter, aVersion):
+        """ Return the position index for the current order and parameters. The index
+        is built in the background and built again after a change of the data. Small
+        results do not need an index.
+        """
+        if self.mVirtualSize < 2 * self.mAnchorStep:
+            return None
+        
+        # The seek before a key with NULL is not searched in an index. Each anchor
+        # would scan the rows up to its position, the offset is as fast
+        if any(xDesc and xExpr in self.mNullKeys for xExpr, xDesc in aKeys):
+            return None
+        
+        xSelectCmd, xParameter = self.getSeekCmd([x[0] for x in aKeys], aKeys, aParameter)
+        xKey       = self.getSelectStmt(xSelectCmd, xParameter)
+        xEntry     = self.mAnchors.pop(xKey, None)
+        
+        if xEntry != None and xEntry[0] == aVersion:
+            self.mAnchors[xKey] = xEntry
+            return xEntry[1]
+        if xEntry != None:
+            xEntry[1].stop()
+        if len(self.mAnchors) >= 4:
+            self.mAnchors.pop(next(iter(self.mAnchors)))[1].stop()
+        
+        xIndex = TAnchorIndex(self.mDatabase, self.mAnchorStep, lambda aValues: self.getAnchorStmt(aKeys, aParameter, aValues))
+        self.mAnchors[xKey] = (aVersion, xIndex)
+        xIndex.start()
+        return xIndex
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getAnchorStmt(self, aKeys, aParameter, aValues):
+        """ Return the statement and parameters to select the key of the mAnchorStep-th
+        row after the key values aValues
+        """
+        xSelectCmd, xParameter = self.getSeekCmd([x[0] for x in aKeys], aKeys, aParameter, aValues)
+        xSelectCmd['limit']  = 1
+        xSelectCmd['offset'] = self.mAnchorStep - 1
+        return self.getSelectStmt(xSelectCmd, xParameter)
+                  
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getSelectStmt(self, aSelectCmd, aParameter = tuple()):
+        """ Create a database statement for this object. Returns the statement and the
+        parameters: aParameter for the placeholders in the select command, followed by
+        the parameters of 'filter' and the values of 'equal', 'limit' and 'offset',
+        which are bound as well. So the
+        statement text only depends on the shape of the select command, it is cached
+        and sqlite can reuse the prepared statement.
+        """
         if aSelectCmd.get('select') == None or aSelectCmd.get('from') == None:
             raise Exception('select statement required')
         
+        xEqual      = aSelectCmd.get('equal') or dict()
+        xFilter     = aSelectCmd.get('filter') or ('', tuple())
+        xShape      = (tuple(aSelectCmd['select']), tuple(aSelectCmd['from']), tuple(xEqual), xFilter[0], 
+                       aSelectCmd.get('distinct') != None, aSelectCmd.get('limit') != None, aSelectCmd.get('offset') != None,
+                       aSelectCmd.get('where'), aSelectCmd.get('group'), aSelectCmd.get('order'), aSelectCmd.get('sort'))
+        
+        xSelectStmt = self.mStmtCache.get(xShape)
+        if xSelectStmt == None:
+            xSelectStmt = self.createSelectStmt(aSelectCmd)
+            if len(self.mStmtCache) >= 256:
+                del self.mStmtCache[next(iter(self.mStmtCache))]
+            self.mStmtCache[xShape] = xSelectStmt
+        
+        xParameter  = tuple(aParameter) + xFilter[1] + tuple(xEqual.values())
+        if aSelectCmd.get('limit')  != None:
+            xParameter += (int(aSelectCmd['limit']),)
+        if aSelectCmd.get('offset') != None:
+            xParameter += (int(aSelectCmd['offset']),)
+        return xSelectStmt, xParameter
+        
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def createSelectStmt(self, aSelectCmd):
+        """ Create the statement text with placeholders for the values of 'equal',
+        'limit' and 'offset'
+        """
+        xSelectStmt = 'select '
+        
         if aSelectCmd.get('distinct') != None:
-            xSelectStmt += ' distinct'
+            xSelectStmt += 'distinct '
 
         xSelectStmt += ','.join(aSelectCmd['select'])
         xSelectStmt += ' from '
         xSelectStmt += ','.join(aSelectCmd['from'])
         
+        xWhere = list()
         if aSelectCmd.get('where')  != None:
-            xSelectStmt += ' where ' + aSelectCmd['where']
+            xWhere.append('(' + aSelectCmd['where'] + ')')
+
+        if aSelectCmd.get('filter') != None:
+            xWhere.append('(' + aSelectCmd['filter'][0] + ')')
 
         if aSelectCmd.get('equal')  != None:
-            xSelectStmt += ' where '
-            for xCol, xVal in aSelectCmd['equal'].items():
-                xSelectStmt += ' ' + xCol + '=' + xVal 
+            for xCol in aSelectCmd['equal']:
+                xWhere.append(xCol + ' = ?')
+        
+        if xWhere:
+            xSelectStmt += ' where ' + ' and '.join(xWhere)
 
         if aSelectCmd.get('group')  != None:
             xSelectStmt += ' group by ' + aSelectCmd['group']
@@ -574,13 +1337,75 @@ class TDbTable(TTable):
                 xSelectStmt += '  ' + aSelectCmd.get('sort')
 
         if aSelectCmd.get('limit')  != None:
-            xSelectStmt += ' limit ' + aSelectCmd['limit']
+            xSelectStmt += ' limit ?'
 
         if aSelectCmd.get('offset') != None:
-            xSelectStmt += ' offset ' + aSelectCmd['offset']
+            xSelectStmt += ' offset ?'
  
         return xSelectStmt
         
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getCountCmd(self):
+        """ Return the select command to count the rows
+        """
+        xSelectCmd  = dict(self.mSelectCmd)
+        xSelectCmd['select'] = ['count(*) as CCount']
+        xSelectCmd.pop('order', None)
+        xSelectCmd.pop('sort',  None)
+        return xSelectCmd
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getVirtualSize(self, aDatabase, aParameter, aVersion):
+        """ Return the number of rows of the select statement. The count is cached for
+        statement and parameters and evaluated again, if the data version of the database
+        changes. The sort order does not change the count.
+        """
+        xSelectCmd  = self.getCountCmd()
+        xKey        = self.getSelectStmt(xSelectCmd, aParameter)
+        xEntry      = self.mSizeCache.get(xKey)
+        if xEntry != None and xEntry[0] == aVersion:
+            TQueryStats().addHit(xKey[0])
+            return xEntry[1]
+        
+        xSize       = self.getApproximateSize(aDatabase, xSelectCmd)
+        if xSize == None:
+            xSize   = TQueryStats().execute(aDatabase, *xKey)[0][0][0]
+        
+        if len(self.mSizeCache) >= 64:
+            del self.mSizeCache[next(iter(self.mSizeCache))]
+        self.mSizeCache[xKey] = (aVersion, xSize)
+        return xSize
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getApproximateSize(self, aDatabase, aSelectCmd):
+        """ Estimate the number of rows for huge tables, if mApproximate is set:
+        'rowid' reads max(rowid), which is exact as long as no rows are deleted,
+        'stat1' reads the row count of the last 'analyze' from sqlite_stat1.
+        Only a select on a single table without condition is estimated. Returns None
+        if the exact count is required.
+        """
+        if self.mApproximate == None or len(aSelectCmd['from']) != 1:
+            return None
+        if any(aSelectCmd.get(x) != None for x in ('where', 'filter', 'equal', 'group', 'distinct')):
+            return None
+        
+        xTable = aSelectCmd['from'][0].split()[0]
+        try:
+            if self.mApproximate == 'rowid':
+                xRow = TQueryStats().execute(aDatabase, 'select max(rowid) from ' + xTable)[0][0]
+            else:
+                xRows = TQueryStats().execute(aDatabase, 'select stat from sqlite_stat1 where tbl = ? order by idx is not null limit 1', (xTable,))[0]
+                xRow  = xRows and (int(xRows[0][0].split()[0]),)
+        except sqlite3.Error:
+            return None
+        
+        if not xRow or xRow[0] == None:
+            return None
+        return int(xRow[0])
+
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
     def get_selected_obj(self, index = -1, visible_items = None, visible_block = None, parameter = tuple()):
@@ -595,68 +1420,176 @@ class TDbTable(TTable):
         if not self.mExecute:
             if self.mSelectParam == parameter:
                 return self
+        if self.mSelectParam != parameter:
+            self.mSeek    = None
         self.mSelectParam = parameter
         
-        xDatabase   = sqlite3.connect(self.mDatabase)
-        xCursor     = xDatabase.cursor()
+        xResultSet, xColNames, xStmt, xKeys, xIndex, xReverse, xVersion = TDbExecutor().execute(
+            self.mDatabase, self.readSlice, xParameter, aTimeout=self.mTimeout)
+        xStart = time.perf_counter()
+        self.adviseIndexes(xStmt, parameter)
         
-        xSelectCmd  = deepcopy(self.mSelectCmd)
-        xSelectCmd['select'] = ['count(*) as CCount']
-        xSelectStmt = self.getSelectStmt(xSelectCmd)
+        if xReverse:
+            xResultSet = xResultSet[::-1]
         
-        xCursor.execute(xSelectStmt, xParameter)            
-        self.mVirtualSize = xCursor.fetchone()[0]
-
-        
-        xSelectCmd  = deepcopy(self.mSelectCmd)
-        xSelectCmd['limit']  = str(self.mVisibleRows)
-        xSelectCmd['offset'] = str(self.mOffset)
-        xSelectStmt = self.getSelectStmt(xSelectCmd)
-
-        xCursor.execute(xSelectStmt, xParameter)
-        xResultSet     = xCursor.fetchall()
+        self.mSeek     = None
+        self.mKeyFirst = None
+        self.mKeyLast  = None
+        self.mFetched  = self.getProjectedColumns() or frozenset(range(1, len(self.mSelectCmd['select']) + 1))
+        xNumCols       = len(self.mSelectCmd['select'])
+        if xKeys != None:
+            if xResultSet:
+                self.mKeyFirst = xResultSet[0][xNumCols:]
+                self.mKeyLast  = xResultSet[-1][xNumCols:]
+            xResultSet = [x[:xNumCols] for x in xResultSet]
+        # The column filters are evaluated by the database and stay set
+        xColsFilter    = self.mColsFilter
         super().clear()
-        
-        xColNames = list()
-        for xCol in xCursor.description:
-            xColNames.append(xCol[0])
-        self.setColumns(xColNames)
+        self.setColumns(xColNames[:xNumCols])
+        if len(xColsFilter) == len(self.mColsFilter):
+            self.mColsFilter = xColsFilter
         
         self.mRowInx   = self.mOffset
         self.mSelected = 0
         self.mCurrent  = 0        
         xNumRows       = len(xResultSet)
         
-        for xInx, xResult in enumerate(xResultSet):
-            if self.mSortReverse:
-                xRowInx = self.mOffset + xNumRows - xInx - 1
-            else:
-                xRowInx = self.mOffset + xInx
-            self.append(list(xResult), aRowInx = xRowInx)
-            
-        xCursor.close()
-        xDatabase.close()
+        if self.mSortReverse:
+            xRowInx = range(self.mOffset + xNumRows - 1, self.mOffset - 1, -1)
+        else:
+            xRowInx = range(self.mOffset, self.mOffset + xNumRows)
+        self.extend_rows(xResultSet, aRowInx = xRowInx)
+        TQueryStats().addConversion(xStmt[0], time.perf_counter() - xStart)
+        self.prefetch(xKeys, parameter, xIndex, xVersion)
         
         self.mSelChanged = True
         self.mExecute    = False
         return self
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def readSlice(self, aDatabase, aParameter):
+        """ Read the size and the rows of the data slice. Executed by a worker of
+        TDbExecutor, the calling thread waits for the result
+        """
+        xVersion    = TDbPool().getDataVersion(aDatabase)
+        
+        self.mVirtualSize = self.getVirtualSize(aDatabase, aParameter, xVersion)
+        
+        xKeys       = self.getKeyColumns()
+        xIndex      = None
+        xReverse    = False
+        xResultSet  = None
+        if xKeys != None:
+            self.mNullKeys = self.getNullKeys(aDatabase, xKeys, xVersion)
+            xIndex = self.getAnchorIndex(xKeys, aParameter, xVersion)
+            xSelectCmd, xKeyParam, xReverse = self.getKeysetCmd(xKeys, aParameter, xIndex, self.mSeek, self.mOffset)
+            try:
+                xResultSet, xColNames, xStmt = self.fetchPage(aDatabase, xSelectCmd, xKeyParam, xVersion)
+            except sqlite3.OperationalError:
+                TDbExecutor().checkTask()
+            
+            if xResultSet == None or (xResultSet and xResultSet[0][-1] == None):
+                # No rowid, e.g. a view: Continue with offset navigation
+                self.mKeyset = False
+                xKeys        = None
+                xReverse     = False
+                xResultSet   = None
+        
+        if xResultSet == None:
+            xResultSet, xColNames, xStmt = self.fetchPage(aDatabase, self.getOffsetCmd(self.mOffset), aParameter, xVersion)
+        return xResultSet, xColNames, xStmt, xKeys, xIndex, xReverse, xVersion
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def getOffsetCmd(self, aOffset):
+        """ Return the select command for the data slice at a given offset
+        """
+        xSelectCmd = dict(self.mSelectCmd)
+        xSelectCmd['select'] = self.getProjection()
+        xSelectCmd['limit']  = self.mVisibleRows
+        xSelectCmd['offset'] = aOffset
+        return xSelectCmd
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def fetchPage(self, aDatabase, aSelectCmd, aParameter, aVersion):
+        """ Return the rows, the column names and the statement (text, parameters) of a
+        data slice from the page cache or from the database. The rows must not be modified.
+        """
+        xKey  = self.getSelectStmt(aSelectCmd, aParameter)
+        xPage = self.mPageCache.get(xKey, aVersion)
+        if xPage == None:
+            xPage = TQueryStats().execute(aDatabase, *xKey)
+            self.mPageCache.put(xKey, aVersion, xPage)
+        else:
+            TQueryStats().addHit(xKey[0])
+        return xPage + (xKey,)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def adviseIndexes(self, aPageStmt, aParameter):
+        """ Report the sort and filter columns to the index advisor, if an index budget
+        is set. The sort columns are reported with the columns of 'equal' in front, the
+        selected columns to cover and the statement of the data slice, each filter
+        column with the count statement
+        """
+        if self.mIndexBudget <= 0 or len(self.mSelectCmd['from']) != 1:
+            return
+        
+        xTable = self.mSelectCmd['from'][0].split()[0]
+        if self.mSortCols:
+            xColumns = [(x, False) for x in self.mSelectCmd.get('equal') or list()]
+            xColumns.extend((self.getColumnExpr(x), xReverse) for x, xReverse in self.mSortCols)
+            xCover   = sorted(self.getProjectedColumns() or range(1, len(self.mSelectCmd['select']) + 1))
+            xCover   = [self.getColumnExpr(x) for x in xCover if x <= len(self.mSelectCmd['select'])]
+            TIndexAdvisor().observe(self.mDatabase, xTable, xColumns, aPageStmt, self.mIndexBudget, xCover)
+        
+        xFilters = [x for x in range(1, len(self.mSelectCmd['select']) + 1) if parseFilter(self.mColsFilter[x]) != None]
+        if xFilters:
+            xCountStmt = self.getSelectStmt(self.getCountCmd(), aParameter)
+            for xInx in xFilters:
+                TIndexAdvisor().observe(self.mDatabase, xTable, [(self.getColumnExpr(xInx), False)], xCountStmt, self.mIndexBudget)
+
+    # ---------------------------------------------------------------------------------
+    # ---------------------------------------------------------------------------------
+    def prefetch(self, aKeys, aParameter, aIndex, aVersion):
+        """ Load the next and the previous data slice into the page cache in the
+        background
+        """
+        xRows = self.mVisibleRows
+        for xWhere, xOffset in ((TTable.NAVIGATION_NEXT, max(0, min(self.getViewSize() - xRows, self.mOffset + xRows))),
+                                (TTable.NAVIGATION_PREV, max(0, self.mOffset - xRows))):
+            if xOffset == self.mOffset:
+                continue
+            if aKeys != None:
+                xSelectCmd, xParameter, xReverse = self.getKeysetCmd(aKeys, aParameter, aIndex, self.getSeek(xWhere, self.mOffset, xOffset), xOffset)
+            else:
+                xSelectCmd, xParameter = self.getOffsetCmd(xOffset), tuple(aParameter)
+            TPrefetch().submit(self.mDatabase, self.mPageCache, self.getSelectStmt(xSelectCmd, xParameter), aVersion)
     
     # ---------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------
-    def do_sort(self, index=1):
+    def do_sort(self, index=1, multiple=0):
         """ Create a sort for a given column index on database
         """
         aInx = min(max(1, int(index)), len(self.mColsName)-1)
         self.mSortCol     = aInx
-        self.mSortReverse =  not self.mSortReverse
+        self.setSortCols(aInx, int(multiple))
 
-        self.mSelectCmd['order'] = self.mColsName[aInx]
-        if self.mSortReverse:
+        xOrder = ['{} {}'.format(self.mColsName[xInx], 'DESC' if xReverse else 'ASC') for xInx, xReverse in self.mSortCols[:-1]]
+        xOrder.append(self.mColsName[self.mSortCols[-1][0]])
+        
+        self.mSelectCmd['order'] = ', '.join(xOrder)
+        if self.mSortCols[-1][1]:
             self.mSelectCmd['sort'] = 'DESC'
         else:
             self.mSelectCmd['sort'] = 'ASC'
         
         self.mExecute  = True
+        self.mSeek     = None
+        self.mKeyFirst = None
+        self.mKeyLast  = None
         self.mOffset   = 0
         self.mCurrent  = 0
         self.mSelected = 0
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   A HTML document is parsed once into a list of instructions, which
+   is replayed by the TEezzAgent for each request. The cache keeps the
+   compiled documents by path and modification time for all sessions.
+
+   For an update request the template calculates a plan, which replays
+   only the named elements, their ancestors and the elements they
+   depend on, instead of the entire document.
+
+"""
+import os
+import json
+import threading
+from   html.parser   import HTMLParser
+from   eezz.service  import singleton
+
+
+# --------------------------------------------------------
+# Copy a decoded JSON structure
+# The compiled objects are shared and must not be modified
+# --------------------------------------------------------
+def cloneJson(aValue):
+    if isinstance(aValue, dict):
+        return {xKey: cloneJson(xValue) for xKey, xValue in aValue.items()}
+    if isinstance(aValue, list):
+        return [cloneJson(xValue) for xValue in aValue]
+    return aValue
+
+
+# --------------------------------------------------------
+# Records the parser events of a HTML document
+# --------------------------------------------------------
+class TTemplateParser(HTMLParser):
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        super().__init__()
+        self.mCode = list()
+
+    # --------------------------------------------------------
+    # Decode the eezz attributes once at compile time
+    # A value of None marks a syntax error
+    # --------------------------------------------------------
+    def handle_starttag(self, aTagName, aAttrs):
+        xJsonAttr = dict()
+
+        for xKey, xValue in aAttrs:
+            if xKey in ['data-eezz-action', 'data-eezz-event', 'data-eezz-push']:
+                pass
+            elif xKey == 'data-eezz-template' and xValue not in ['database', 'template']:
+                pass
+            else:
+                continue
+
+            try:
+                xJsonAttr[xKey] = json.loads(xValue.replace('\'', '\"'))
+            except (ValueError, AttributeError):
+                xJsonAttr[xKey] = None
+
+        self.mCode.append((TTemplate.START, self.getpos(), (aTagName, tuple(aAttrs), xJsonAttr)))
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def handle_endtag(self, aTagName):
+        self.mCode.append((TTemplate.END, self.getpos(), (aTagName,)))
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def handle_data(self, aData):
+        self.mCode.append((TTemplate.DATA, self.getpos(), (aData,)))
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def handle_charref(self, aData):
+        self.mCode.append((TTemplate.CHARREF, self.getpos(), (aData,)))
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def handle_decl(self, aData):
+        self.mCode.append((TTemplate.DECL, self.getpos(), (aData,)))
+
+
+# --------------------------------------------------------
+# Compiled HTML document
+# --------------------------------------------------------
+class TTemplate:
+    START   = 0
+    END     = 1
+    DATA    = 2
+    CHARREF = 3
+    DECL    = 4
+
+    # Replay modes of a plan
+    REPLAY  = 0
+    POP     = 1
+
+    # --------------------------------------------------------
+    # The document is fed line by line, so that the sequence
+    # of events is the same as for the interpreting parser
+    # --------------------------------------------------------
+    def __init__(self, aPath, aMtime):
+        self.mPath  = aPath
+        self.mMtime = aMtime
+        xParser     = TTemplateParser()
+
+        with open(aPath, 'r') as xFile:
+            for xContent in xFile:
+                xParser.feed(xContent)
+
+        self.mCode  = tuple(xParser.mCode)
+        self.mPlans = dict()
+        self.mLock  = threading.Lock()
+        self.analyze()
+
+    # --------------------------------------------------------
+    # Calculate the element structure the same way the agent
+    # does: Each end tag closes the element on top of the stack
+    # --------------------------------------------------------
+    def analyze(self):
+        self.mEnd      = dict()
+        self.mParent   = dict()
+        self.mNames    = dict()
+        self.mRefs     = dict()
+        self.mTemplate = set()
+        self.mDatabase = list()
+        xStack         = [-1]
+
+        for xInx, (xCode, xPos, xArgs) in enumerate(self.mCode):
+            if xCode == TTemplate.START:
+                xTagName, xAttrs, xJsonAttr = xArgs
+                xDictAttr = dict(xAttrs)
+                xName     = xDictAttr.get('name')
+
+                if xTagName == 'body':
+                    xName = xDictAttr.get('name', '_body_')
+                if xName:
+                    self.mNames.setdefault(xName, list()).append(xInx)
+
+                if 'data-eezz-template' in xDictAttr:
+                    self.mTemplate.add(xInx)
+                if xDictAttr.get('data-eezz-template') == 'database':
+                    self.mDatabase.append(xInx)
+
+                self.mRefs[xInx]   = self.findRefs(xJsonAttr)
+                self.mParent[xInx] = xStack[-1]
+                xStack.append(xInx)
+            elif xCode == TTemplate.END:
+                if len(xStack) > 1:
+                    self.mEnd[xStack.pop()] = xInx
+
+    # --------------------------------------------------------
+    # Collect the element names referenced by an action
+    # e.g. {'eezzAgent.assign':{'aDirList.get_selected_obj':{}}}
+    # --------------------------------------------------------
+    def findRefs(self, aJsonAttr):
+        xRefs = set()
+        xJsonObj = aJsonAttr.get('data-eezz-action')
+
+        if not isinstance(xJsonObj, dict):
+            return xRefs
+
+        for xKey in ('eezzAgent.assign', 'eezzAgent.async', 'eezzAgent.dictionary'):
+            xValue = xJsonObj.get(xKey)
+            if isinstance(xValue, dict):
+                xPaths = xValue.keys()
+            elif isinstance(xValue, str):
+                xPaths = [xValue]
+            else:
+                continue
+
+            for xPath in xPaths:
+                xParts = xPath.split('.')
+                if len(xParts) == 2 and '/' not in xPath:
+                    xRefs.add(xParts[0])
+        return xRefs
+
+    # --------------------------------------------------------
+    # Return the element, which has to be replayed in total to
+    # render the element at aInx. Elements inside a template
+    # are generated by the enclosing table or select.
+    # --------------------------------------------------------
+    def findUnit(self, aInx):
+        xUnit = aInx
+        xInx  = aInx
+
+        while xInx != -1:
+            if xInx in self.mTemplate:
+                xUnit = xInx
+            xInx = self.mParent[xInx]
+
+        if xUnit != aInx or aInx in self.mTemplate:
+            xInx = xUnit
+            while xInx != -1:
+                if self.mCode[xInx][2][0] in ('table', 'select'):
+                    return xInx
+                xInx = self.mParent[xInx]
+        return xUnit
+
+    # --------------------------------------------------------
+    # Return True if aInx is placed inside the element aOuter
+    # --------------------------------------------------------
+    def isInside(self, aInx, aOuter):
+        xInx = self.mParent[aInx]
+        while xInx != -1:
+            if xInx == aOuter:
+                return True
+            xInx = self.mParent[xInx]
+        return False
+
+    # --------------------------------------------------------
+    # Return True if an element named aName is placed inside
+    # an element named aOuter
+    # --------------------------------------------------------
+    def isNameInside(self, aName, aOuter):
+        return any(self.isInside(x, y) for x in self.mNames.get(aName, []) for y in self.mNames.get(aOuter, []))
+
+    # --------------------------------------------------------
+    # Calculate a plan to update the given elements
+    # aRender: Elements which have to be rendered (innerHTML)
+    # aAttrs:  Elements for which only the attributes are read
+    # The plan is a list of instruction ranges (start, end, mode)
+    # --------------------------------------------------------
+    def getPlan(self, aRender, aAttrs):
+        xKey = (frozenset(aRender), frozenset(aAttrs))
+
+        with self.mLock:
+            xPlan = self.mPlans.get(xKey)
+            if xPlan != None:
+                return xPlan
+
+        xFull   = set(self.mDatabase)
+        xAction = set()
+        xDone   = set()
+
+        for xName in aRender:
+            for xInx in self.mNames.get(xName, []):
+                xFull.add(self.findUnit(xInx))
+
+        for xName in aAttrs:
+            for xInx in self.mNames.get(xName, []):
+                xAction.add(xInx)
+
+        # Add the elements referenced by the actions in the replay
+        xWork = list(xFull) + list(xAction)
+        while xWork:
+            xInx = xWork.pop()
+            if xInx in xDone:
+                continue
+            xDone.add(xInx)
+
+            if xInx in xFull:
+                xRange = [x for x in range(xInx, self.mEnd.get(xInx, len(self.mCode))) if x in self.mRefs]
+            else:
+                xRange = [xInx]
+
+            xInx = self.mParent[xInx]
+            while xInx != -1:
+                xRange.append(xInx)
+                xInx = self.mParent[xInx]
+
+            for xElem in xRange:
+                for xName in self.mRefs[xElem]:
+                    for xRef in self.mNames.get(xName, []):
+                        if xRef not in xAction and xRef not in xFull:
+                            xAction.add(xRef)
+                            xWork.append(xRef)
+
+        xFull   = {x for x in xFull   if not any(self.isInside(x, y) for y in xFull)}
+        xAction = {x for x in xAction if not any(self.isInside(x, y) or x == y for y in xFull)}
+
+        xPath = set()
+        for xInx in xFull | xAction:
+            xInx = self.mParent[xInx]
+            while xInx != -1:
+                xPath.add(xInx)
+                xInx = self.mParent[xInx]
+        xAction -= xPath
+
+        xPlan = list()
+        for xInx in xFull:
+            xPlan.append((xInx, self.mEnd.get(xInx, len(self.mCode) - 1) + 1, TTemplate.REPLAY))
+
+        for xInx in xPath | xAction:
+            xPlan.append((xInx, xInx + 1, TTemplate.REPLAY))
+            if xInx in self.mEnd:
+                xMode = TTemplate.REPLAY if xInx in xPath else TTemplate.POP
+                xPlan.append((self.mEnd[xInx], self.mEnd[xInx] + 1, xMode))
+
+        xPlan = tuple(sorted(xPlan))
+        with self.mLock:
+            self.mPlans[xKey] = xPlan
+        return xPlan
+
+
+# --------------------------------------------------------
+# Process wide cache of compiled documents
+# --------------------------------------------------------
+@singleton
+class TTemplateCache:
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def __init__(self):
+        self.mTemplates = dict()
+        self.mLock      = threading.Lock()
+
+    # --------------------------------------------------------
+    # Return the compiled document, compile on first access
+    # or if the file has changed since the last compile
+    # --------------------------------------------------------
+    def getTemplate(self, aPath):
+        xPath  = os.path.abspath(aPath)
+        xMtime = os.stat(xPath).st_mtime_ns
+
+        with self.mLock:
+            xTemplate = self.mTemplates.get(xPath)
+            if xTemplate != None and xTemplate.mMtime == xMtime:
+                return xTemplate
+
+        xTemplate = TTemplate(xPath, xMtime)
+        with self.mLock:
+            self.mTemplates[xPath] = xTemplate
+        return xTemplate
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def clear(self):
+        with self.mLock:
+            self.mTemplates.clear()
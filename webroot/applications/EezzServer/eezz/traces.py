@@ -9,7 +9,8 @@
 """
 from   eezz.service  import TBlackBoard
 from   eezz.table    import TTable, TDbTable
-import sqlite3
+from   eezz.dbpool   import TDbPool
+from   eezz.querystats import TQueryStats
 import os, sys
 import uuid
 import traceback
@@ -45,7 +46,7 @@ class TTracer:
         if not xExists:
             os.makedirs(os.path.join(self.mBlackboard.mRootPath, 'database'), exist_ok=True)
             
-        xTraceDB = sqlite3.connect(self.mLocation)
+        xTraceDB = TDbPool().getConnection(self.mLocation)
         xCursor  = xTraceDB.cursor()
         
         if not xExists:
@@ -103,7 +104,10 @@ class TTracer:
             ) 
          
         xTraceDB.commit()
-        xTraceDB.close()
+        xCursor.close()
+        
+        # Log the slow statements of TDbTable
+        TQueryStats().setLogger(self.writeSlowQuery)
         
     # ------------------------------------------------------------------------------------
     # Set the trace level. 
@@ -132,14 +136,14 @@ class TTracer:
         xStatement   = xLine[3]        
         xCombinedMsg = '{}:{}:{}'.format(xAppMsg, xStatement, xValue)
 
-        xTraceDB     = sqlite3.connect(self.mLocation)
+        xTraceDB     = TDbPool().getConnection(self.mLocation)
         xCursor      = xTraceDB.cursor()
         xCursor.execute("""
             insert into TTrace (CTraceTime, CLevel, CReason, CFileName, CFunction, CLine, CAppErrNo, CAppText) 
                 values (?, ?, ?, ?, ?, ?, ?, ?)""", 
             (time.time(), aLevel, xType.__name__, xFileName, xFunction, xLineNo, xAppErr, xCombinedMsg))
         xTraceDB.commit()
-        xTraceDB.close()
+        xCursor.close()
         
     # ------------------------------------------------------------------------------------
     # Method to be used for traces
@@ -165,14 +169,40 @@ class TTracer:
         
         xCombinedMsg = ':'.join( [xAppMsg, aMessage] )
             
-        xTraceDB     = sqlite3.connect(self.mLocation)
+        xTraceDB     = TDbPool().getConnection(self.mLocation)
         xCursor      = xTraceDB.cursor()
         xCursor.execute("""
             insert into TTrace (CTraceTime, CLevel, CReason, CFileName, CFunction, CLine, CAppErrNo, CAppText) 
                 values (?, ?, ?, ?, ?, ?, ?, ?)""", 
             (time.time(), aLevel, aReason, xFileName, xFunction, xLineNo, xAppErr, xCombinedMsg))
         xTraceDB.commit()
-        xTraceDB.close()
+        xCursor.close()
+
+    # ------------------------------------------------------------------------------------
+    # Trace a slow statement with its query plan
+    # ------------------------------------------------------------------------------------
+    def writeSlowQuery(self, aStmt, aSeconds, aRows, aPlan):
+        xPrepare, xExecute, xFetch = [x * 1000.0 for x in aSeconds]
+        xMessage = '{:.1f} ms (prepare {:.1f}, execute {:.1f}, fetch {:.1f}), {} rows: {} -- plan: {}'.format(
+            xPrepare + xExecute + xFetch, xPrepare, xExecute, xFetch, aRows, ' '.join(aStmt.split()), '; '.join(aPlan))
+        self.write(2, 'SlowQuery', aMessage=xMessage)
+
+    # ------------------------------------------------------------------------------------
+    # Statistics of the statements of TDbTable per statement. The times are
+    # the average in milliseconds per execution, Convert per execution or cache
+    # hit. Average is prepare, execute and fetch, Max the slowest execution
+    # ------------------------------------------------------------------------------------
+    def get_query_stats(self, index=-1, visible_items=None, visible_block=None):
+        xStats  = TQueryStats()
+        xOutput = TTable(aColNames = ['Statement', 'Count', 'Hits', 'Rows', 'Prepare', 'Execute', 'Fetch', 'Convert', 'Average', 'Max', 'Slow'])
+        
+        for xStmt, xValues in xStats.getStatistics():
+            xCount   = max(1, xValues[xStats.COUNT])
+            xTimes   = [1000.0 * x / xCount for x in xValues[xStats.PREPARE:xStats.CONVERT]]
+            xConvert = 1000.0 * xValues[xStats.CONVERT] / max(1, xValues[xStats.COUNT] + xValues[xStats.HITS])
+            xOutput.append([' '.join(xStmt.split()), xValues[xStats.COUNT], xValues[xStats.HITS], xValues[xStats.ROWS]] +
+                           xTimes + [xConvert, sum(xTimes), 1000.0 * xValues[xStats.MAX], xValues[xStats.SLOW]])
+        return xOutput.get_selected_obj(index, visible_items, visible_block)
 
     # ------------------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------
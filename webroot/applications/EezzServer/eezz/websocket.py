@@ -31,8 +31,13 @@ import hashlib
 import base64
 import select
 import json
+import queue
 import threading
-from   eezz.agent import TEezzAgent
+from   eezz.agent  import TEezzAgent
+from   eezz.dbexec import TDbExecutor
+from   eezz.dbpool import TDbPool
+from   eezz.masking import applyMask
+from   eezz.deflate import negotiateDeflate
   
 # Define exception
 # ----------------------------------------------------------------
@@ -46,6 +51,19 @@ class TWebSocketException(Exception):
 # Define a client web socket handler
 # ----------------------------------------------------------------
 class TWebSocketClient():
+    # Largest message accepted from a client
+    mMaxMessage = 64 * 1024 * 1024
+    
+    # Compression permessage-deflate, if the client offers it.
+    # Messages smaller than mDeflateSize are sent uncompressed
+    mDeflate         = True
+    mDeflateSize     = 256
+    mContextTakeover = True
+    
+    # Send small frames without waiting for the ACK of the
+    # previous ones (Nagle)
+    mNoDelay         = True
+    
     # Initialize Thread
     # --------------------------------------------------------
     def __init__(self, xCltAddr, xWebAddr):
@@ -55,8 +73,24 @@ class TWebSocketClient():
         self.mAgent   = None
         self.mCnt     = 0
         self.mBuffer  = None
+        self.mBufferSize = 65536*4
+        self.mStart   = 0
+        self.mEnd     = 0
+        self.mHeader  = None
+        self.mMessage = bytearray()
+        self.mMsgOpcode = None
+        self.mMsgSize = 0
+        self.mMsgDeflate = False
+        self.mDeflater= None
+        self.mDownload= None
         self.mLock    = threading.Lock()
         self.mProtocol= str()
+        self.mRequests= queue.Queue()
+        self.mHandler = None
+        self.mCancel  = threading.Event()
+        
+        if self.mNoDelay and self.mSocket.family in (socket.AF_INET, socket.AF_INET6):
+            self.mSocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         
     # --------------------------------------------------------             
     # thread main method
@@ -64,7 +98,6 @@ class TWebSocketClient():
     def doInput(self):
         if self.mState == -1:
             raise TWebSocketException('input: connection closed');
-        xFinal, xOpcode, xMaskVector, xPayloadLen = (False,0,0,0)
         
         try:
             if self.mState == 0:
@@ -79,7 +112,7 @@ class TWebSocketClient():
                 xResponse    = self.genHandshake(xData)    
                 xNrBytes     = self.mSocket.send(xResponse.encode('utf-8'))
                 self.mAgent  = TEezzAgent(None, self.mAddress, self)
-                self.mBuffer = bytearray(65536*2)
+                self.mBuffer = bytearray(self.mBufferSize)
                 return None
             
             if self.mProtocol == 'peezz':
@@ -88,51 +121,94 @@ class TWebSocketClient():
                 
                 if 'file' in xJsonObj:
                     xStream   = self.mSocket.recv(65536*2)
-                    xJsonResp = self.mAgent.handle_download(xJsonObj, xStream)                            
+                    self.dispatch(self.handleDownload, xJsonObj, xStream, False)
                 else:
-                    aResponse = self.mAgent.handle_websocket(xJsonObj)
-                
-                if aResponse != None:
-                    self.mSocket.sendall(aResponse.encode('utf-8'))
+                    self.dispatch(self.handleMessage, xJsonObj)
                 return
             
-            xFinal = False
-            while not xFinal:
-                xFinal, xOpcode, xMaskVector, xPayloadLen = self.readHeader()
-                
-                if xOpcode == 0x8:
-                    raise TWebSocketException("closed connection")
-                elif xOpcode == 0x1:
-                    xJsonStr = self.readFrame(xOpcode, xMaskVector, xPayloadLen)
-                    xJsonObj = json.loads(xJsonStr[:xPayloadLen].decode('utf-8'))
-
-                    if 'file' in xJsonObj:
-                        xStream   = self.doInput()
-                        xJsonResp = self.mAgent.handle_download(xJsonObj, xStream)                            
-                        self.writeFrame(json.dumps(xJsonResp).encode('utf-8'))
-                        return
-                    
-                    aResponse = self.mAgent.handle_websocket(xJsonObj)                        
-                    if aResponse != None:
-                        self.writeFrame(aResponse.encode('utf-8'))
-                        
-                elif xOpcode == 0x2:
-                    return self.readFrame(xOpcode, xMaskVector, xPayloadLen) 
-                elif xOpcode == 0x9:
-                    xData = self.readFrame(xOpcode, xMaskVector, xPayloadLen)
-                    self.writeFrame(aData=xData[:xPayloadLen], aOpCode=0xA, aFinal=(1<<7), aMaskVector = None)
-                elif xOpcode == 0xA:
-                    xData = self.readFrame(xOpcode, xMaskVector, xPayloadLen)
-                    self.writeFrame(aData=xData[:xPayloadLen], aOpCode=0x9, aFinal=(1<<7), aMaskVector = None)
-                else:
-                    raise TWebSocketException("unknown opcode={}".format(xOpcode))         
+            # Parse all complete frames of the received data. The
+            # rest of a frame is read with the next input event
+            self.receive()
+            while True:
+                xFrame = self.parseFrame()
+                if xFrame == None:
+                    break
+                xFinal, xOpcode, xDeflate, xPayload, xLast = xFrame
+                with xPayload:
+                    self.handleFrame(xFinal, xOpcode, xDeflate, xPayload, xLast)
         except Exception as xEx:
             if self.mAgent:
                 print("communication: connection closed: " + str(xEx))
                 self.mAgent.shutdown()
             self.mState = -1;
+            self.stopHandler()
             raise
         return None
+    
+    # --------------------------------------------------------
+    # The requests of a client are executed in order by its
+    # handler thread, so the select loop continues with the
+    # other clients while a request waits for the database
+    # --------------------------------------------------------
+    def dispatch(self, aFunction, *aArgs):
+        if self.mHandler == None:
+            self.mHandler = threading.Thread(target=self.handleRequests, daemon=True)
+            self.mHandler.start()
+        self.mRequests.put((aFunction, aArgs))
+    
+    # --------------------------------------------------------
+    # Cancel the running database queries and stop the handler
+    # --------------------------------------------------------
+    def stopHandler(self):
+        self.mCancel.set()
+        self.mRequests.put(None)
+    
+    # --------------------------------------------------------
+    # Handler thread main method. Queries of the requests are
+    # cancelled, when the connection is closed. The database
+    # connections opened by the handler are closed on exit
+    # --------------------------------------------------------
+    def handleRequests(self):
+        TDbExecutor().setScope(self.mCancel)
+        try:
+            while True:
+                xRequest = self.mRequests.get()
+                if xRequest == None or self.mState == -1:
+                    break
+                
+                xFunction, xArgs = xRequest
+                try:
+                    xFunction(*xArgs)
+                except Exception as xEx:
+                    print("communication: connection closed: " + str(xEx))
+                    self.mAgent.shutdown()
+                    self.mState = -1
+                    self.mCancel.set()
+                    try:
+                        self.mSocket.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    break
+        finally:
+            TDbPool().closeThread()
+    
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def handleMessage(self, aJsonObj):
+        aResponse = self.mAgent.handle_websocket(aJsonObj)
+        if aResponse == None:
+            return
+        if self.mProtocol == 'peezz':
+            self.mSocket.sendall(aResponse.encode('utf-8'))
+        else:
+            self.writeFrame(aResponse.encode('utf-8'))
+    
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def handleDownload(self, aJsonObj, aStream, aReply = True):
+        xJsonResp = self.mAgent.handle_download(aJsonObj, aStream)
+        if aReply:
+            self.writeFrame(json.dumps(xJsonResp).encode('utf-8'))
         
     # --------------------------------------------------------
     # --------------------------------------------------------
@@ -145,7 +221,7 @@ class TWebSocketClient():
         if aResponse != None:
             try:
                 if self.mProtocol == 'peezz':
-                    self.socket.send(aResponse.encode('utf-8'))
+                    self.mSocket.sendall(aResponse.encode('utf-8'))
                 else:
                     self.writeFrame(aResponse.encode('utf-8'))                 
             except:
@@ -167,11 +243,17 @@ class TWebSocketClient():
         except:
             pass
         
+        xExtension = None
+        if self.mProtocol != 'peezz' and self.mDeflate:
+            self.mDeflater, xExtension = negotiateDeflate(self.mHeaders.get('Sec-WebSocket-Extensions', ''), self.mContextTakeover)
+        
         with io.StringIO() as xHandshake:
             xHandshake.write('HTTP/1.1 101 Switching Protocols\r\n')
             xHandshake.write('Connection: Upgrade\r\n')
             xHandshake.write('Upgrade: websocket\r\n')
             xHandshake.write('Sec-WebSocket-Accept: {}\r\n'.format(xKey))
+            if xExtension:
+                xHandshake.write('Sec-WebSocket-Extensions: {}\r\n'.format(xExtension))
             xHandshake.write('\r\n')
             aResult = xHandshake.getvalue() 
         
@@ -188,68 +270,188 @@ class TWebSocketClient():
         return base64.b64encode(xhash.digest()).decode('utf-8')    
 
     # --------------------------------------------------------
-    # Read a single frame
+    # Receive the available data into the buffer. The received
+    # data are mBuffer[mStart:mEnd]. The rest of a frame is
+    # moved to the front, if the free space gets small
     # --------------------------------------------------------
-    def readHeader(self):
-        xBytes      = self.mSocket.recv(2)
+    def receive(self):
+        if self.mStart == self.mEnd:
+            self.mStart = self.mEnd = 0
+        elif self.mStart > 0 and len(self.mBuffer) - self.mEnd < len(self.mBuffer) // 4:
+            xRest = self.mEnd - self.mStart
+            self.mBuffer[:xRest] = self.mBuffer[self.mStart:self.mEnd]
+            self.mStart, self.mEnd = 0, xRest
+        
+        with memoryview(self.mBuffer) as xView:
+            xNumBytes = self.mSocket.recv_into(xView[self.mEnd:])
         
-        if len(xBytes) == 0:
+        if xNumBytes == 0:
             raise TWebSocketException('no data received')
-                
-        xMaskVector = None
-        xFinal      = ((1<<7) & xBytes[0]) != 0 
-        xOpcode     = xBytes[0] & 0xf
-
-        xMasked     = ((1<<7) & xBytes[1]) != 0
-        xPayloadLen = int( xBytes[1] & 0x7f )        
-
+        self.mEnd += xNumBytes
+    
+    # --------------------------------------------------------
+    # Parse the header of the next frame. Returns a list
+    # [final, opcode, mask, header size, payload length, done,
+    # compressed] or None, if the header is incomplete. done
+    # counts the payload bytes already passed on
+    # --------------------------------------------------------
+    def parseHeader(self):
+        xAvailable  = self.mEnd - self.mStart
+        if xAvailable < 2:
+            return None
+        
+        xByte0, xByte1 = self.mBuffer[self.mStart], self.mBuffer[self.mStart + 1]
+        xFinal      = ((1<<7) & xByte0) != 0
+        xOpcode     = xByte0 & 0xf
+        xDeflate    = ((1<<6) & xByte0) != 0
+        xMasked     = ((1<<7) & xByte1) != 0
+        xPayloadLen = xByte1 & 0x7f
+        xSize       = 2
+        
         # calculate extended length
         if xPayloadLen == 126:
-            xBytes = self.mSocket.recv(2)
-            xPayloadLen = struct.unpack('>H', xBytes)[0]
+            xSize += 2
         elif xPayloadLen == 127:
-            xBytes = self.mSocket.recv(8)
-            xPayloadLen = struct.unpack('>Q', xBytes)[0]
-
-        # unpack data
+            xSize += 8
         if xMasked:
-            xMaskVector = self.mSocket.recv(4) 
+            xSize += 4
+        if xAvailable < xSize:
+            return None
+        
+        if xPayloadLen == 126:
+            xPayloadLen = struct.unpack_from('>H', self.mBuffer, self.mStart + 2)[0]
+        elif xPayloadLen == 127:
+            xPayloadLen = struct.unpack_from('>Q', self.mBuffer, self.mStart + 2)[0]
         
-        return (xFinal, xOpcode, xMaskVector, xPayloadLen)
+        xMaskVector = None
+        if xMasked:
+            xMaskVector = bytes(self.mBuffer[self.mStart + xSize - 4:self.mStart + xSize])
         
-
+        # RSV1 marks the first frame of a compressed message
+        if xByte0 & 0x30 or (xDeflate and (self.mDeflater == None or xOpcode not in (0x1, 0x2))):
+            raise TWebSocketException('invalid reserved bits: opcode={}'.format(xOpcode))
+        
+        # Control frames are not fragmented and fit into the buffer
+        if xOpcode >= 0x8 and (not xFinal or xPayloadLen > 125):
+            raise TWebSocketException('invalid control frame: opcode={}'.format(xOpcode))
+        if xOpcode < 0x8 and self.mMsgSize + xPayloadLen > self.mMaxMessage:
+            raise TWebSocketException('message exceeds {} bytes'.format(self.mMaxMessage))
+        return [xFinal, xOpcode, xMaskVector, xSize, xPayloadLen, 0, xDeflate]
+    
     # --------------------------------------------------------
-    # Read a single frame
+    # Return the next part of a frame as (final, opcode,
+    # compressed, payload, last) or None. A frame, which fits into the buffer, is
+    # returned in one part. The payload of a larger frame is
+    # returned in parts as it arrives, last is set for the end
+    # of the frame. The payload is an unmasked memoryview into
+    # the buffer, which is valid until the next receive
     # --------------------------------------------------------
-    def readFrame(self, xOpcode, xMaskVector, xPayloadLen):
-        if xPayloadLen == 0:
-            return str()
+    def parseFrame(self):
+        if self.mHeader == None:
+            self.mHeader = self.parseHeader()
+            if self.mHeader == None:
+                return None
         
-        xRest   = xPayloadLen 
-        xView   = memoryview(self.mBuffer)
+        xFinal, xOpcode, xMaskVector, xSize, xPayloadLen, xDone, xDeflate = self.mHeader
+        xStart = self.mStart + xSize
+        xRest  = xPayloadLen - xDone
+        xLast  = self.mEnd - xStart >= xRest
         
-        while xRest > 0:
-            xNumBytes = self.mSocket.recv_into(xView, xRest)
-            xRest     = xRest - xNumBytes
-            xView     = xView[xNumBytes:]
-                    
+        if xLast:
+            xEnd = xStart + xRest
+        elif xSize + xRest <= len(self.mBuffer) or self.mEnd == xStart:
+            # Wait for the rest of the frame
+            return None
+        else:
+            xEnd = self.mEnd
+        
+        # The mask continues with the byte of the payload position
         if xMaskVector:
-            xDimension  = divmod((xPayloadLen + 3), 4)
-            xView       = memoryview(self.mBuffer)
-            
-            xIntSize    = xDimension[0]                
-            xSeqMask    = struct.unpack('>I', bytearray(reversed(xMaskVector)))[0]
-            xViewSli    = xView[: xIntSize * 4]
-            xViewInt    = xViewSli.cast('I')
-            
-            # Calculate un-mask with int4
-            for i in range(xIntSize):
-                xViewInt[i] ^= xSeqMask
+            xShift = xDone % 4
+            applyMask(self.mBuffer, xMaskVector[xShift:] + xMaskVector[:xShift], xEnd - xStart, xStart)
+        
+        # The following parts of a frame continue the message
+        if xDone > 0:
+            xOpcode = 0x0
 
-            xViewInt.release()
-            xViewSli.release()
-                                
-        return self.mBuffer
+        self.mStart = xEnd
+        if xLast:
+            self.mHeader = None
+        else:
+            self.mHeader[3]  = 0
+            self.mHeader[5] += xEnd - xStart
+        return (xFinal, xOpcode, xDeflate, memoryview(self.mBuffer)[xStart:xEnd], xLast)
+    
+    # --------------------------------------------------------
+    # Process a part of a frame. Fragmented messages are joined:
+    # the parts of a text message in mMessage, the parts of a
+    # binary message are passed on to handle_download as they
+    # arrive. A text message with 'file' is the header of the
+    # next binary message. Compressed messages are decompressed
+    # part by part
+    # --------------------------------------------------------
+    def handleFrame(self, aFinal, aOpcode, aDeflate, aPayload, aLast):
+        if aOpcode == 0x8:
+            raise TWebSocketException("closed connection")
+        elif aOpcode == 0x9:
+            self.writeFrame(aData=bytes(aPayload), aOpCode=0xA, aFinal=(1<<7), aMaskVector = None)
+            return
+        elif aOpcode == 0xA:
+            self.writeFrame(aData=bytes(aPayload), aOpCode=0x9, aFinal=(1<<7), aMaskVector = None)
+            return
+        elif aOpcode == 0x0:
+            if self.mMsgOpcode == None:
+                raise TWebSocketException("continuation without message")
+        elif aOpcode in (0x1, 0x2):
+            if self.mMsgOpcode != None:
+                raise TWebSocketException("message interrupted by opcode={}".format(aOpcode))
+            self.mMsgOpcode  = aOpcode
+            self.mMsgDeflate = aDeflate
+        else:
+            raise TWebSocketException("unknown opcode={}".format(aOpcode))
+        
+        xComplete = aFinal and aLast
+        xData     = aPayload
+        if self.mMsgDeflate:
+            xLimit = self.mMaxMessage - self.mMsgSize
+            xData  = self.mDeflater.decompress(aPayload, xComplete, xLimit)
+            if len(xData) > xLimit:
+                raise TWebSocketException('message exceeds {} bytes'.format(self.mMaxMessage))
+        
+        if self.mMsgOpcode == 0x1:
+            if xComplete and self.mMsgSize == 0:
+                # Decode a message of a single part from the buffer
+                self.handleMessageData(xData)
+            else:
+                self.mMessage.extend(xData)
+                if xComplete:
+                    self.handleMessageData(self.mMessage)
+                    self.mMessage = bytearray()
+        elif self.mDownload != None and (xData or xComplete):
+            xHeader = self.mDownload
+            if not xComplete or self.mMsgSize > 0:
+                # Describe the part by its position in the file
+                xHeader = dict(self.mDownload)
+                xHeader['file'] = dict(self.mDownload['file'])
+                xHeader['file']['start']     = int(self.mDownload['file'].get('start', 0)) + self.mMsgSize
+                xHeader['file']['chunkSize'] = len(xData)
+            self.dispatch(self.handleDownload, xHeader, bytes(xData))
+        
+        self.mMsgSize += len(xData)
+        if xComplete:
+            if self.mMsgOpcode == 0x2:
+                self.mDownload = None
+            self.mMsgOpcode = None
+            self.mMsgSize   = 0
+    
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def handleMessageData(self, aData):
+        xJsonObj = json.loads(str(aData, 'utf-8'))
+        if 'file' in xJsonObj:
+            self.mDownload = xJsonObj
+        else:
+            self.dispatch(self.handleMessage, xJsonObj)
 
     # --------------------------------------------------------
     # Write a single frame
@@ -257,47 +459,50 @@ class TWebSocketClient():
     def writeFrame(self, aData, aOpCode=0x1, aFinal=(1<<7), aMaskVector = None):
         with self.mLock:
             xPayloadLen  = len(aData)
-            xBytes       = bytearray(10)
-            xPos         = 0
             xMasked      = 0x0
+            xDeflate     = 0x0
             
             if aMaskVector != None and len(aMaskVector) == 4:
                 xMasked = 1<<7
-                
-            xBytes[xPos] = aFinal | aOpCode 
-            xPos        += 1
             
-            if xPayloadLen > 126:
-                if xPayloadLen < 0xffff:
-                    xBytes[xPos]  = 0x7E | xMasked
-                    xPos += 1
-                    xBytes[xPos:xPos+2] = struct.pack('>H', xPayloadLen)
-                    xPos += 2
-                else:
-                    xBytes[xPos]  = 0x7F | xMasked
-                    xPos += 1
-                    xBytes[xPos:xPos+8] = struct.pack('>Q', xPayloadLen)
-                    xPos += 8
+            # Compress a complete data message in one frame
+            if self.mDeflater != None and aOpCode in (0x1, 0x2) and aFinal and len(aData) >= self.mDeflateSize:
+                aData        = self.mDeflater.compress(aData)
+                xPayloadLen  = len(aData)
+                xDeflate     = 1<<6
+                
+            # The length is encoded in 7, 16 or 64 bit
+            xByte0 = aFinal | xDeflate | aOpCode
+            if xPayloadLen < 126:
+                xHeader = struct.pack('>BB',  xByte0, xPayloadLen | xMasked)
+            elif xPayloadLen <= 0xffff:
+                xHeader = struct.pack('>BBH', xByte0, 0x7E | xMasked, xPayloadLen)
             else:
-                xBytes[xPos] = (xPayloadLen) | xMasked
-                xPos += 1
-
-            if xMasked:
-                xBytes[xPos:xPos+4] = aMaskVector
-                xPos += 4
+                xHeader = struct.pack('>BBQ', xByte0, 0x7F | xMasked, xPayloadLen)
             
-            self.mSocket.send(xBytes[0:xPos])
-            if xPayloadLen == 0:
-                return
+            if xMasked:
+                xHeader += bytes(aMaskVector)
+                aData    = bytearray(aData)
+                applyMask(aData, aMaskVector, xPayloadLen)
             
-            if xMasked != 0:
-                xMasked = bytearray(xPayloadLen)
-                
-                for i in range(xPayloadLen):
-                    xMasked[i] = ord(aData [i]) ^ aMaskVector[i % 4]
-                self.mSocket.send(xMasked)
+            self.sendBuffers([xHeader, aData])
+    
+    # --------------------------------------------------------
+    # Send the buffers with one system call. The rest of a
+    # partial write is sent with sendall
+    # --------------------------------------------------------
+    def sendBuffers(self, aBuffers):
+        if not hasattr(self.mSocket, 'sendmsg'):
+            self.mSocket.sendall(b''.join(aBuffers))
+            return
+        
+        xSent = self.mSocket.sendmsg(aBuffers)
+        for xBuffer in aBuffers:
+            if xSent < len(xBuffer):
+                self.mSocket.sendall(memoryview(xBuffer)[xSent:])
+                xSent = 0
             else:
-                self.mSocket.sendall(aData)
+                xSent -= len(xBuffer)
 
 # ------------------------------------------------------------
 # Manage the web socket port
@@ -372,7 +577,7 @@ class TWebSocket(threading.Thread):
                     self.mWebClient = None
                     xSocket.close()
                     aReadList.remove(xSocket)                    
-                    self.mClients.pop(xSocket)
+                    self.mClients.pop(xSocket).stopHandler()
                 pass
             
             for xSocket in xRd:
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Row patches of TEezzAgent compared to the full rendering of a table
+   python3 -m unittest discover tests
+
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import urllib.parse
+from   eezz.service  import TBlackBoard
+from   eezz.agent    import TEezzAgent
+
+
+PAGE = """<!DOCTYPE html>
+<html>
+<body name="aBody">
+    <div name="aPanel">
+        <table name="aNames" data-eezz-action="{'eezzAgent.assign':{'eezz.table/TTable':{'aColNames':['name'], 'aHeaderStr':'names'}}}">
+            <tbody>
+                <tr data-eezz-template="{'table-rows':[':']}">
+                    <td data-eezz-template="{'table-columns':['1:']}">{}</td></tr></tbody></table></div>
+</body>
+</html>
+"""
+
+
+# --------------------------------------------------------
+# The rows of table aNames as the browser shows them.
+# Fragments replace the rows, patches are applied the
+# same way as eezzPatchRows in websocket.js
+# --------------------------------------------------------
+class TBrowserRows:
+    def __init__(self):
+        self.mRows = list()
+
+    # --------------------------------------------------------
+    # Return the list of (row-id, html) of a fragment
+    # --------------------------------------------------------
+    @staticmethod
+    def parseRows(aHtml):
+        xRows = re.findall(r'(<tr[^>]*data-eezz-row="([^"]*)"[^>]*>.*?</tr>)', aHtml, re.S)
+        return [(y, x) for x, y in xRows]
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def apply(self, aResponse):
+        xJsonObj = json.loads(aResponse)
+
+        for xKey, xValue in xJsonObj.get('update', {}).items():
+            xHtml = urllib.parse.unquote(xValue)
+            if xKey.endswith('.innerHTML') and 'name="aNames"' in xHtml or xKey == 'aNames.innerHTML':
+                self.mRows = self.parseRows(xHtml)
+
+        xPatch = xJsonObj.get('patch', {}).get('aNames')
+        if xPatch == None:
+            return
+
+        xRemove    = xPatch.get('remove', [])
+        self.mRows = [x for x in self.mRows if x[0] not in xRemove]
+        for xRowId, xHtml in xPatch.get('change', {}).items():
+            xRows = [x for x in self.mRows if x[0] != xRowId]
+            if len(xRows) == len(self.mRows):
+                self.mRows.append((xRowId, urllib.parse.unquote(xHtml)))
+            else:
+                self.mRows = [(x, urllib.parse.unquote(xHtml) if x == xRowId else y) for x, y in self.mRows]
+        for xRowId, xHtml in xPatch.get('insert', {}).items():
+            self.mRows.append((xRowId, urllib.parse.unquote(xHtml)))
+
+        # Only the last row of an id is moved, like the row map of the browser
+        for xRowId in xPatch.get('order', []):
+            xInx = [x for x, y in enumerate(self.mRows) if y[0] == xRowId]
+            if xInx:
+                self.mRows.append(self.mRows.pop(xInx[-1]))
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestRowPatch(unittest.TestCase):
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def setUp(self):
+        self.mDocRoot = tempfile.mkdtemp()
+        with open(os.path.join(self.mDocRoot, 'page.html'), 'w') as xFile:
+            xFile.write(PAGE)
+
+        xBlackboard = TBlackBoard()
+        xBlackboard.mDocRoot  = self.mDocRoot
+        xBlackboard.mRootPath = self.mDocRoot
+
+        self.mAgent   = TEezzAgent(self.mDocRoot, ('localhost', 8100))
+        self.mBrowser = TBrowserRows()
+        self.mBrowser.apply(self.mAgent.handle_websocket({'path': '/page.html'}))
+        self.mTable   = self.mAgent.mGlobals['aNames']
+
+    def tearDown(self):
+        shutil.rmtree(self.mDocRoot)
+
+    # --------------------------------------------------------
+    # Send the update and compare the rows on the page with
+    # the rows rendered in total
+    # --------------------------------------------------------
+    def assertUpdate(self, aUpdate, aPatch):
+        xResponse = self.mAgent.handle_websocket({'update': aUpdate})
+        self.mBrowser.apply(xResponse)
+        self.assertEqual('aNames' in json.loads(xResponse).get('patch', {}), aPatch)
+
+        xRows = self.mBrowser.parseRows(self.mAgent.mElements['aNames'].mInnerHtml.getvalue())
+        self.assertEqual(self.mBrowser.mRows, xRows)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_patch(self):
+        self.mTable.extend_rows([['a'], ['b'], ['c']])
+        self.assertUpdate({'aNames.innerHTML': '*'}, True)
+
+        self.mTable.pop(1)
+        self.mTable.append(['d'])
+        self.assertUpdate({'aNames.innerHTML': '*'}, True)
+
+    # --------------------------------------------------------
+    # The enclosing element sent in total refreshes the rows
+    # of the table for the next patch
+    # --------------------------------------------------------
+    def test_enclosing_fragment(self):
+        self.mTable.extend_rows([['a'], ['b'], ['c']])
+        self.assertUpdate({'aNames.innerHTML': '*'}, True)
+
+        self.mTable.append(['d'])
+        self.assertUpdate({'aPanel.innerHTML': '*'}, False)
+
+        self.mTable.pop(0)
+        self.mTable.append(['e'])
+        self.assertUpdate({'aNames.innerHTML': '*'}, True)
+
+    # --------------------------------------------------------
+    # A patch in the same response as the enclosing element
+    # would add the rows a second time
+    # --------------------------------------------------------
+    def test_patch_and_fragment(self):
+        self.mTable.extend_rows([['a'], ['b'], ['c']])
+        self.assertUpdate({'aNames.innerHTML': '*'}, True)
+
+        self.mTable.append(['d'])
+        self.assertUpdate({'aNames.innerHTML': '*', 'aPanel.innerHTML': '*'}, False)
+
+        self.mTable.append(['e'])
+        self.assertUpdate({'aNames.innerHTML': '*'}, True)
+
+
+if __name__ == '__main__':
+    unittest.main()
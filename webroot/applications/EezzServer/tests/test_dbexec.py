@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Cancel and timeout of the tasks of TDbExecutor, also of nested tasks
+   python3 -m unittest discover tests
+
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from   eezz.dbexec   import TDbExecutor, TDbCancelled
+
+
+# A statement running for seconds, unless it is interrupted
+LONG_QUERY = 'with recursive c(x) as (select 1 union all select x + 1 from c where x < 50000000) select count(*) from c'
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestNestedCancel(unittest.TestCase):
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    @classmethod
+    def setUpClass(cls):
+        cls.mDocRoot   = tempfile.mkdtemp()
+        cls.mDatabase  = os.path.join(cls.mDocRoot, 'exec.db')
+        cls.mDatabase2 = os.path.join(cls.mDocRoot, 'exec2.db')
+        for xDatabase in (cls.mDatabase, cls.mDatabase2):
+            with sqlite3.connect(xDatabase) as xConnection:
+                xConnection.execute('create table t (a integer)')
+                xConnection.executemany('insert into t values (?)', [(x,) for x in range(100)])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.mDocRoot)
+
+    # --------------------------------------------------------
+    # The function runs a nested task, signals aReady and runs
+    # aQuery. Returns the result of the nested task, the task
+    # of the worker after it and the result of aQuery
+    # --------------------------------------------------------
+    def runNested(self, aConnection, aReady, aDatabase, aQuery = LONG_QUERY):
+        xNested = TDbExecutor().execute(aDatabase, self.runQuery, 'select count(*) from t')
+        xTask   = TDbExecutor().mLocal.mTask
+        aReady.set()
+        try:
+            return xNested, xTask, aConnection.execute(aQuery).fetchone()[0]
+        except sqlite3.OperationalError:
+            TDbExecutor().checkTask()
+            raise
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def runQuery(self, aConnection, aQuery):
+        return aConnection.execute(aQuery).fetchone()[0]
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_cancel_after_nested(self):
+        for xDatabase in (self.mDatabase, self.mDatabase2):
+            xReady = threading.Event()
+            xTask  = TDbExecutor().submit(self.mDatabase, self.runNested, xReady, xDatabase)
+            self.assertTrue(xReady.wait(10))
+
+            xStart = time.monotonic()
+            xTask.cancel()
+            with self.assertRaises(TDbCancelled) as xCheck:
+                xTask.wait()
+            self.assertLess(time.monotonic() - xStart, 2)
+            self.assertIn('cancelled', str(xCheck.exception))
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_timeout_after_nested(self):
+        xStart = time.monotonic()
+        with self.assertRaises(TDbCancelled) as xCheck:
+            TDbExecutor().execute(self.mDatabase, self.runNested, threading.Event(), self.mDatabase, aTimeout=0.5)
+        self.assertLess(time.monotonic() - xStart, 2.5)
+        self.assertIn('timeout', str(xCheck.exception))
+
+    # --------------------------------------------------------
+    # The nested task returns and the outer task is restored
+    # --------------------------------------------------------
+    def test_nested_result(self):
+        xTask = TDbExecutor().submit(self.mDatabase, self.runNested, threading.Event(), self.mDatabase, 'select 7')
+        self.assertEqual(xTask.wait(), (100, xTask, 7))
+
+    # --------------------------------------------------------
+    # Cancel of the outer task stops the nested task
+    # --------------------------------------------------------
+    def test_cancel_nested(self):
+        xReady = threading.Event()
+        xTask  = TDbExecutor().submit(self.mDatabase, lambda x: xReady.set() or TDbExecutor().execute(self.mDatabase, self.runQuery, LONG_QUERY))
+        self.assertTrue(xReady.wait(10))
+
+        xStart = time.monotonic()
+        xTask.cancel()
+        with self.assertRaises(TDbCancelled):
+            xTask.wait()
+        self.assertLess(time.monotonic() - xStart, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   permessage-deflate of TDeflate compared to the zlib of a client
+   python3 -m unittest discover tests
+
+"""
+import json
+import zlib
+import unittest
+from   eezz.deflate  import TDeflate, negotiateDeflate, DEFLATE_TAIL
+
+
+# Messages with the repeated markup of table updates
+MESSAGES = [json.dumps({'update': {'aTable.innerHTML': '<tr><td>row {}</td><td>{}</td></tr>'.format(x, 'v' * (x % 7)) * 40}}).encode('utf-8') for x in range(5)]
+
+
+# --------------------------------------------------------
+# The zlib contexts of a client
+# --------------------------------------------------------
+class TClient:
+    def __init__(self, aTakeover = True):
+        self.mTakeover = aTakeover
+        self.mDeflater = zlib.compressobj(6, zlib.DEFLATED, -15)
+        self.mInflater = zlib.decompressobj(-15)
+
+    def compress(self, aData):
+        if not self.mTakeover:
+            self.mDeflater = zlib.compressobj(6, zlib.DEFLATED, -15)
+        xData = self.mDeflater.compress(aData) + self.mDeflater.flush(zlib.Z_SYNC_FLUSH)
+        return xData[:-len(DEFLATE_TAIL)]
+
+    def decompress(self, aData):
+        if not self.mTakeover:
+            self.mInflater = zlib.decompressobj(-15)
+        return self.mInflater.decompress(aData + DEFLATE_TAIL)
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestDeflate(unittest.TestCase):
+    # --------------------------------------------------------
+    # The messages sent are decompressed by the client. With
+    # context takeover the next messages refer to the first
+    # --------------------------------------------------------
+    def test_compress(self):
+        xSizes = dict()
+        for xTakeover in (True, False):
+            xDeflate = TDeflate(aServerTakeover=xTakeover)
+            xClient  = TClient(xTakeover)
+            xSizes[xTakeover] = list()
+            for xMessage in MESSAGES:
+                xData = xDeflate.compress(xMessage)
+                self.assertFalse(xData.endswith(DEFLATE_TAIL))
+                self.assertEqual(xClient.decompress(xData), xMessage)
+                xSizes[xTakeover].append(len(xData))
+
+        self.assertEqual(xSizes[True][0], xSizes[False][0])
+        self.assertLess(sum(xSizes[True][1:]), sum(xSizes[False][1:]) / 2)
+
+    # --------------------------------------------------------
+    # The messages received are decompressed in parts
+    # --------------------------------------------------------
+    def test_decompress(self):
+        for xTakeover in (True, False):
+            xDeflate = TDeflate(aClientTakeover=xTakeover)
+            xClient  = TClient(xTakeover)
+            for xMessage in MESSAGES:
+                xData  = xClient.compress(xMessage)
+                xParts = [xData[x:x + 50] for x in range(0, len(xData), 50)]
+                xText  = b''.join(xDeflate.decompress(x, y == len(xParts) - 1, 1 << 20) for y, x in enumerate(xParts))
+                self.assertEqual(xText, xMessage)
+
+    # --------------------------------------------------------
+    # At most one byte more than the limit is returned
+    # --------------------------------------------------------
+    def test_limit(self):
+        xData = TClient().compress(bytes(100000))
+        self.assertEqual(len(TDeflate().decompress(xData, True, 1000)), 1001)
+        self.assertEqual(len(TDeflate().decompress(xData, True, 100000)), 100000)
+
+    # --------------------------------------------------------
+    # The window of the sent messages follows the offer
+    # --------------------------------------------------------
+    def test_window_bits(self):
+        xDeflate, xResponse = negotiateDeflate('permessage-deflate; server_max_window_bits=9')
+        xInflater = zlib.decompressobj(-9)
+        for xMessage in MESSAGES:
+            self.assertEqual(xInflater.decompress(xDeflate.compress(xMessage) + DEFLATE_TAIL), xMessage)
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestNegotiate(unittest.TestCase):
+    # --------------------------------------------------------
+    # Return the response and the contexts for the offers
+    # --------------------------------------------------------
+    def negotiate(self, aExtensions, aTakeover = True):
+        xDeflate, xResponse = negotiateDeflate(aExtensions, aTakeover)
+        if xDeflate == None:
+            return None
+        return xResponse, xDeflate.mServerTakeover, xDeflate.mClientTakeover, xDeflate.mWindowBits
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_offers(self):
+        self.assertEqual(self.negotiate(''), None)
+        self.assertEqual(self.negotiate('x-webkit-deflate-frame'), None)
+        self.assertEqual(self.negotiate('permessage-deflate'), ('permessage-deflate', True, True, 15))
+        self.assertEqual(self.negotiate(' permessage-deflate; client_max_window_bits'), ('permessage-deflate', True, True, 15))
+        self.assertEqual(self.negotiate('permessage-deflate; client_max_window_bits=10'), ('permessage-deflate', True, True, 15))
+        self.assertEqual(self.negotiate('permessage-deflate; server_no_context_takeover'),
+                         ('permessage-deflate; server_no_context_takeover', False, True, 15))
+        self.assertEqual(self.negotiate('permessage-deflate; server_max_window_bits="12"'),
+                         ('permessage-deflate; server_max_window_bits=12', True, True, 12))
+
+    # --------------------------------------------------------
+    # Invalid offers are declined, the next one is selected
+    # --------------------------------------------------------
+    def test_declined(self):
+        for xOffer in ('permessage-deflate; server_max_window_bits=8', 'permessage-deflate; server_max_window_bits',
+                       'permessage-deflate; client_max_window_bits=16', 'permessage-deflate; unknown',
+                       'permessage-deflate; client_no_context_takeover; client_no_context_takeover',
+                       'permessage-deflate; server_no_context_takeover=1'):
+            self.assertEqual(self.negotiate(xOffer), None)
+            self.assertEqual(self.negotiate(xOffer + ', permessage-deflate; client_no_context_takeover'),
+                             ('permessage-deflate', True, True, 15))
+
+    # --------------------------------------------------------
+    # Without context takeover of the server both sides drop
+    # their contexts after each message
+    # --------------------------------------------------------
+    def test_no_takeover(self):
+        self.assertEqual(self.negotiate('permessage-deflate', False),
+                         ('permessage-deflate; server_no_context_takeover; client_no_context_takeover', False, False, 15))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Indexes created by TIndexAdvisor for the sort of TDbTable
+   python3 -m unittest discover tests
+
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from   eezz.table    import TTable, TDbTable
+from   eezz.indexes  import TIndexAdvisor
+
+
+# --------------------------------------------------------
+# Keeps the statement of the last page
+# --------------------------------------------------------
+class TPlanTable(TDbTable):
+    def adviseIndexes(self, aPageStmt, aParameter):
+        self.mPageStmt = aPageStmt
+        super().adviseIndexes(aPageStmt, aParameter)
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestIndexAdvisor(unittest.TestCase):
+    mNumRows = 2000
+    mPage    = 50
+
+    # --------------------------------------------------------
+    # Each test uses a database of its own, the advisor keeps
+    # the checked columns for the process
+    # --------------------------------------------------------
+    def setUp(self):
+        self.mDocRoot = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.mDocRoot)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def getDatabase(self, aName, aKey):
+        xDatabase = os.path.join(self.mDocRoot, aName)
+        with sqlite3.connect(xDatabase) as xConnection:
+            xConnection.execute('create table items ({}name text, size integer, kind text, note text)'.format('id integer primary key, ' if aKey else ''))
+            xConnection.executemany('insert into items (name, size, kind, note) values (?, ?, ?, ?)',
+                [('n{}'.format(x), x * 7919 % self.mNumRows, 'k{}'.format(x % 5), 'x' * 20) for x in range(self.mNumRows)])
+        return xDatabase
+
+    # --------------------------------------------------------
+    # Sort on size and read some pages
+    # --------------------------------------------------------
+    def sortTable(self, aDatabase, aReverse = True):
+        xTable = TPlanTable(aDatabase, {'select': ['name', 'size', 'kind', 'note'], 'from': ['items']}, indexes=2)
+        xTable.get_selected_obj(visible_items=self.mPage, visible_block=self.mPage)
+        xTable.set_projection({1, 3})
+        xTable.do_sort(2)
+        if not aReverse:
+            xTable.do_sort(2)
+
+        for xInx in range(TIndexAdvisor().mHotCount + 1):
+            xTable.do_navigate(TTable.NAVIGATION_NEXT)
+            xTable.get_selected_obj()
+        return xTable
+
+    # --------------------------------------------------------
+    # Return the sql of the eezz indexes, as soon as there is
+    # one of them or after aWait seconds
+    # --------------------------------------------------------
+    def getIndexes(self, aDatabase, aWait = 10):
+        xStart = time.monotonic()
+        while True:
+            with sqlite3.connect(aDatabase) as xConnection:
+                xIndexes = [x[0] for x in xConnection.execute("select sql from sqlite_master where type = 'index' and name like 'eezz_idx_%'")]
+            if xIndexes or time.monotonic() - xStart > aWait:
+                return xIndexes
+            time.sleep(0.05)
+
+    # --------------------------------------------------------
+    # Return the plan of the statement of the last page
+    # --------------------------------------------------------
+    def getPlan(self, aDatabase, aTable):
+        xStmt, xParameter = aTable.mPageStmt
+        with sqlite3.connect(aDatabase) as xConnection:
+            return [x[-1] for x in xConnection.execute('explain query plan ' + xStmt, xParameter)]
+
+    # --------------------------------------------------------
+    # The INTEGER PRIMARY KEY follows the sort column, the
+    # selected columns are covered
+    # --------------------------------------------------------
+    def test_covering_index(self):
+        for xReverse in (True, False):
+            xDatabase = self.getDatabase('cover{}.db'.format(xReverse), True)
+            xTable    = self.sortTable(xDatabase, xReverse)
+            self.assertEqual(self.getIndexes(xDatabase), ['CREATE INDEX eezz_idx_items_size_id_name_kind on items (size, id, name, kind)'])
+
+            xTable.do_navigate(TTable.NAVIGATION_NEXT)
+            xTable.get_selected_obj()
+            xPlan = self.getPlan(xDatabase, xTable)
+            self.assertTrue(any('COVERING INDEX eezz_idx_items_size_id_name_kind' in x for x in xPlan), xPlan)
+            self.assertFalse(any('TEMP B-TREE' in x for x in xPlan), xPlan)
+
+    # --------------------------------------------------------
+    # The rowid of a table without such a key is not covered
+    # --------------------------------------------------------
+    def test_rowid_table(self):
+        for xReverse in (True, False):
+            xDatabase = self.getDatabase('rowid{}.db'.format(xReverse), False)
+            xTable    = self.sortTable(xDatabase, xReverse)
+            self.assertEqual(self.getIndexes(xDatabase), ['CREATE INDEX eezz_idx_items_size on items (size)'])
+
+            xTable.do_navigate(TTable.NAVIGATION_NEXT)
+            xTable.get_selected_obj()
+            xPlan = self.getPlan(xDatabase, xTable)
+            self.assertTrue(any('USING INDEX eezz_idx_items_size' in x for x in xPlan), xPlan)
+            self.assertFalse(any('TEMP B-TREE' in x for x in xPlan), xPlan)
+
+    # --------------------------------------------------------
+    # A writer holding the lock delays the index to the reports
+    # after it has finished
+    # --------------------------------------------------------
+    def test_busy_database(self):
+        xDatabase = self.getDatabase('busy.db', True)
+        xBusy     = TIndexAdvisor().mBusyTimeout
+        xWriter   = sqlite3.connect(xDatabase)
+        try:
+            TIndexAdvisor().mBusyTimeout = 0.1
+            xWriter.execute('begin immediate')
+            self.sortTable(xDatabase)
+
+            # The failed check is released for the next reports
+            xStart = time.monotonic()
+            while any(x[0] == xDatabase for x in TIndexAdvisor().mChecked) and time.monotonic() - xStart < 10:
+                time.sleep(0.05)
+            self.assertEqual(self.getIndexes(xDatabase, aWait=0), [])
+        finally:
+            xWriter.rollback()
+            xWriter.close()
+            TIndexAdvisor().mBusyTimeout = xBusy
+
+        self.sortTable(xDatabase)
+        self.assertEqual(len(self.getIndexes(xDatabase)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
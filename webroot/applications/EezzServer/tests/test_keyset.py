@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Keyset navigation of TDbTable compared to the navigation by offset
+   python3 -m unittest discover tests
+
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from   eezz.table    import TTable, TDbTable
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestKeysetNull(unittest.TestCase):
+    mNumRows = 5000
+    mPage    = 100
+
+    # --------------------------------------------------------
+    # Every 50th value of a and every 3rd value of c is NULL
+    # --------------------------------------------------------
+    @classmethod
+    def setUpClass(cls):
+        cls.mDocRoot  = tempfile.mkdtemp()
+        cls.mDatabase = os.path.join(cls.mDocRoot, 'keyset.db')
+        with sqlite3.connect(cls.mDatabase) as xConnection:
+            xConnection.execute('create table t (a integer, b text, c integer)')
+            xConnection.executemany('insert into t values (?, ?, ?)',
+                [(None if i % 50 == 0 else i * 7 % 997, 'b{}'.format(i), None if i % 3 == 0 else i % 5) for i in range(cls.mNumRows)])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.mDocRoot)
+
+    # --------------------------------------------------------
+    # Return a table sorted on column a, descending for
+    # aReverse. The first sort request sorts descending
+    # --------------------------------------------------------
+    def getTable(self, aKeyset, aReverse, aSortCols = 1):
+        xTable = TDbTable(self.mDatabase, {'select': ['a', 'c', 'b'], 'from': ['t']}, keyset=aKeyset)
+        self.getPage(xTable)
+        xTable.do_sort(1)
+        if not aReverse:
+            xTable.do_sort(1)
+        if aSortCols > 1:
+            xTable.do_sort(2, 1)
+        self.assertEqual(xTable.mSortCols[0], (1, aReverse))
+        return xTable
+
+    # --------------------------------------------------------
+    # Return the offset and the sort keys of the current page.
+    # The order of rows with equal keys is not defined
+    # --------------------------------------------------------
+    def getPage(self, aTable, aSortCols = 1):
+        aTable.get_selected_obj(visible_items=self.mPage, visible_block=self.mPage)
+        return (aTable.mOffset, [tuple(x[1:1 + aSortCols]) for x in aTable.data])
+
+    # --------------------------------------------------------
+    # Compare the pages of a list of (where, pos) with the
+    # pages read by offset
+    # --------------------------------------------------------
+    def assertNavigation(self, aReverse, aSteps, aSortCols = 1):
+        xPages = list()
+        for xKeyset in (True, False):
+            xTable = self.getTable(xKeyset, aReverse, aSortCols)
+            xPage  = [self.getPage(xTable, aSortCols)]
+            for xWhere, xPos in aSteps:
+                xTable.do_navigate(xWhere, xPos)
+                xPage.append(self.getPage(xTable, aSortCols))
+            xPages.append(xPage)
+
+        for xKeyset, xOffset in zip(*xPages):
+            self.assertEqual(xKeyset[0], xOffset[0])
+            self.assertEqual(len(xKeyset[1]), self.mPage)
+            self.assertEqual(xKeyset, xOffset)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_next_descending(self):
+        xSteps = [(TTable.NAVIGATION_NEXT, 0)] * (self.mNumRows // self.mPage - 1)
+        self.assertNavigation(True, xSteps)
+
+    def test_next_ascending(self):
+        xSteps = [(TTable.NAVIGATION_NEXT, 0)] * (self.mNumRows // self.mPage - 1)
+        self.assertNavigation(False, xSteps)
+
+    def test_prev_ascending(self):
+        xSteps = [(TTable.NAVIGATION_POS, 120), (TTable.NAVIGATION_PREV, 0), (TTable.NAVIGATION_PREV, 0)]
+        self.assertNavigation(False, xSteps)
+
+    def test_prev_descending(self):
+        xSteps = [(TTable.NAVIGATION_LAST, 0)] + [(TTable.NAVIGATION_PREV, 0)] * 5
+        self.assertNavigation(True, xSteps)
+
+    def test_two_columns(self):
+        xSteps = [(TTable.NAVIGATION_NEXT, 0)] * 5 + [(TTable.NAVIGATION_LAST, 0)] + [(TTable.NAVIGATION_PREV, 0)] * 5
+        for xReverse in (True, False):
+            self.assertNavigation(xReverse, xSteps, 2)
+
+    # --------------------------------------------------------
+    # The keys of the page before a sort are not used for the
+    # next page, if the sorted page was not read
+    # --------------------------------------------------------
+    def test_navigate_after_sort(self):
+        for xReverse in (True, False):
+            xPages = list()
+            for xKeyset in (True, False):
+                xTable = self.getTable(xKeyset, xReverse)
+                xTable.do_navigate(TTable.NAVIGATION_NEXT)
+                xPage  = [self.getPage(xTable)]
+                
+                xTable.do_sort(2, 1)
+                xTable.do_navigate(TTable.NAVIGATION_NEXT)
+                xPage.append(self.getPage(xTable, 2))
+                xPages.append(xPage)
+            
+            self.assertEqual([x[0] for x in xPages[0]], [self.mPage, self.mPage])
+            self.assertEqual(xPages[0], xPages[1])
+
+    # --------------------------------------------------------
+    # Jumps to a position start at the anchors, which include
+    # the rows with NULL keys
+    # --------------------------------------------------------
+    def test_anchors(self):
+        xSteps = [(TTable.NAVIGATION_POS, x) for x in (4950, 4900, 20, 1234, 4321, 120, 4999)]
+        for xReverse in (True, False):
+            xPages = list()
+            for xKeyset in (True, False):
+                xTable = self.getTable(xKeyset, xReverse)
+                xTable.mAnchorStep = 50
+                self.getPage(xTable)
+                
+                # No index for the seek before NULL in descending order
+                xIndexes = [x for y, x in xTable.mAnchors.values() if x.mStep == 50]
+                self.assertEqual(len(xIndexes), int(xKeyset and not xReverse))
+                for xIndex in xIndexes:
+                    xIndex.join()
+                    self.assertTrue(xIndex.mComplete)
+                    self.assertEqual(len(xIndex.mAnchors), self.mNumRows // 50)
+                    self.assertIn(None, xIndex.mAnchors[0])
+                
+                xPage = list()
+                for xWhere, xPos in xSteps:
+                    xTable.do_navigate(xWhere, xPos)
+                    xPage.append(self.getPage(xTable))
+                xPages.append(xPage)
+            
+            for xKeyset, xOffset in zip(*xPages):
+                self.assertEqual(len(xKeyset[1]), self.mPage)
+                self.assertEqual(xKeyset, xOffset)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Projection of TDbTable compared to the select of all columns
+   python3 -m unittest discover tests
+
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from   eezz.table    import TTable, TDbTable
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestProjection(unittest.TestCase):
+    mNumRows = 1000
+    mPage    = 50
+
+    # --------------------------------------------------------
+    # The values of descr are unique and not in rowid order
+    # --------------------------------------------------------
+    @classmethod
+    def setUpClass(cls):
+        cls.mDocRoot  = tempfile.mkdtemp()
+        cls.mDatabase = os.path.join(cls.mDocRoot, 'projection.db')
+        with sqlite3.connect(cls.mDatabase) as xConnection:
+            xConnection.execute('create table t (a integer, b text, descr text)')
+            xConnection.executemany('insert into t values (?, ?, ?)',
+                [(x, 'b{}'.format(x % 10), 'd{:05}'.format(x * 7919 % cls.mNumRows)) for x in range(cls.mNumRows)])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.mDocRoot)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def getTable(self, aKeyset, aProjection):
+        xTable = TDbTable(self.mDatabase, {'select': ['a', 'b', 'descr'], 'from': ['t']}, keyset=aKeyset)
+        self.getPage(xTable)
+        xTable.set_projection(aProjection)
+        return xTable
+
+    def getPage(self, aTable):
+        aTable.get_selected_obj(visible_items=self.mPage, visible_block=self.mPage)
+        return (aTable.mOffset, [x[1] for x in aTable.data])
+
+    # --------------------------------------------------------
+    # Sort on the hidden column descr and compare the pages
+    # with the pages of all columns
+    # --------------------------------------------------------
+    def test_sort_hidden_column(self):
+        xSteps = [(TTable.NAVIGATION_NEXT, 0)] * 3 + [(TTable.NAVIGATION_POS, 500), (TTable.NAVIGATION_LAST, 0), (TTable.NAVIGATION_PREV, 0)]
+        for xKeyset in (True, False):
+            for xClicks in (1, 2):
+                xPages = list()
+                for xProjection in (None, {1}):
+                    xTable = self.getTable(xKeyset, xProjection)
+                    for xInx in range(xClicks):
+                        xTable.do_sort(3)
+
+                    xPage = [self.getPage(xTable)]
+                    for xWhere, xPos in xSteps:
+                        xTable.do_navigate(xWhere, xPos)
+                        xPage.append(self.getPage(xTable))
+                    xPages.append(xPage)
+
+                    # The sort column is selected, the hidden column b is not
+                    self.assertTrue(all(x[3] != None for x in xTable.data))
+                    self.assertEqual(all(x[2] == None for x in xTable.data), xProjection != None)
+
+                self.assertEqual(xPages[0], xPages[1])
+                xValues = [x * 7919 % self.mNumRows for x in range(self.mNumRows)]
+                xOrder  = sorted(range(self.mNumRows), key=xValues.__getitem__, reverse=(xClicks == 1))
+                self.assertEqual(xPages[0][0][1], xOrder[:self.mPage])
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_filter_hidden_column(self):
+        for xKeyset in (True, False):
+            xTable = self.getTable(xKeyset, {1})
+            xTable.do_filter(2, 'b3')
+            xTable.do_sort(1)
+            xTable.do_sort(1)
+
+            xOffset, xRows = self.getPage(xTable)
+            self.assertEqual(xTable.getViewSize(), self.mNumRows // 10)
+            self.assertEqual(xRows, list(range(3, 10 * self.mPage, 10)))
+            self.assertEqual({x[2] for x in xTable.data}, {'b3'})
+
+    # --------------------------------------------------------
+    # A projection with a column not selected before selects
+    # the data again
+    # --------------------------------------------------------
+    def test_projection_fallback(self):
+        xTable = self.getTable(True, {1})
+        self.assertEqual(xTable.data[1][2], 'b1')
+
+        xTable.mExecute = True
+        self.getPage(xTable)
+        self.assertEqual(xTable.data[1][1:], [1, None, None])
+
+        xTable.set_projection({1, 2})
+        self.assertEqual(xTable.data[1][1:], [1, 'b1', None])
+
+        xTable.set_projection({2})
+        self.assertEqual(xTable.data[1][1:], [1, 'b1', None])
+
+        xTable.set_projection(None)
+        self.assertEqual(xTable.data[1][1:], [1, 'b1', 'd{:05}'.format(7919 % self.mNumRows)])
+
+
+if __name__ == '__main__':
+    unittest.main()
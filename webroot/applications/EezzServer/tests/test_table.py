@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Loading, sort and filter of TTable and TColumnTable compared to the rows
+   python3 -m unittest discover tests
+
+"""
+import unittest
+from   eezz.table    import TTable, TColumnTable, TCell
+from   eezz.columns  import TSortCache
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestSortCache(unittest.TestCase):
+    mKeys = [3, 1, 2, 1, 0]
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_single_column(self):
+        xCache  = TSortCache()
+        xCreate = lambda xInx: self.mKeys.__getitem__
+
+        xOrder, xReverse = xCache.getOrder(len(self.mKeys), [(1, False)], xCreate)
+        self.assertEqual(list(xOrder), [4, 1, 3, 2, 0])
+        self.assertFalse(xReverse)
+
+        # The direction is toggled on the cached permutation
+        xToggle, xReverse = xCache.getOrder(len(self.mKeys), [(1, True)], xCreate)
+        self.assertIs(xToggle, xOrder)
+        self.assertTrue(xReverse)
+
+        xCache.clear()
+        xOrder, xReverse = xCache.getOrder(len(self.mKeys), [(1, True)], xCreate)
+        self.assertIsNot(xToggle, xOrder)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_multiple_columns(self):
+        xCache  = TSortCache()
+        xKeys   = {1: self.mKeys, 2: ['a', 'b', 'c', 'a', 'b']}
+        xCreate = lambda xInx: xKeys[xInx].__getitem__
+
+        xOrder, xReverse = xCache.getOrder(5, [(1, True), (2, False)], xCreate)
+        self.assertEqual(list(xOrder), [0, 2, 3, 1, 4])
+        self.assertFalse(xReverse)
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestTableSort(unittest.TestCase):
+    mRows = [[x * 7 % 13, 'v{}'.format(x % 5)] for x in range(200)]
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def getTable(self, aClass):
+        xTable = aClass(['a', 'b'], 'sort', visible_items=20)
+        xTable.extend_rows(self.mRows)
+        return xTable
+
+    # --------------------------------------------------------
+    # Compare the sort keys of the rows with the rows sorted
+    # for a list of (column, reverse). The order of rows with
+    # equal keys is not defined
+    # --------------------------------------------------------
+    def assertOrder(self, aTable, aSortCols, aRows = None):
+        self.assertEqual(aTable.mSortCols, aSortCols)
+
+        xExpected = [[x] + y for x, y in enumerate(aRows or self.mRows)]
+        xRows     = [list(x) for x in aTable]
+        self.assertEqual(sorted(xRows), sorted(xExpected))
+
+        for xInx, xReverse in reversed(aSortCols):
+            xExpected.sort(key=lambda x: x[xInx], reverse=xReverse)
+
+        xColumns = [x for x, y in aSortCols]
+        self.assertEqual([[x[y] for y in xColumns] for x in xRows], [[x[y] for y in xColumns] for x in xExpected])
+
+    # --------------------------------------------------------
+    # The first click sorts descending, the next one toggles
+    # --------------------------------------------------------
+    def test_toggle(self):
+        for xClass in (TTable, TColumnTable):
+            xTable = self.getTable(xClass)
+            for xReverse in (True, False, True, False):
+                xTable.do_sort(1)
+                self.assertOrder(xTable, [(1, xReverse)])
+
+            xTable.do_sort(2)
+            self.assertOrder(xTable, [(2, True)])
+
+    # --------------------------------------------------------
+    # The rows read in reverse keep the rows of equal keys
+    # --------------------------------------------------------
+    def test_reverse(self):
+        for xClass in (TTable, TColumnTable):
+            xTable = self.getTable(xClass)
+            xTable.do_sort(1)
+            xRows  = [list(x) for x in xTable]
+            xTable.do_sort(1)
+            self.assertEqual([list(x) for x in xTable], xRows[::-1])
+
+    # --------------------------------------------------------
+    # Shift-click adds a column or toggles its direction
+    # --------------------------------------------------------
+    def test_multiple_columns(self):
+        for xClass in (TTable, TColumnTable):
+            xTable = self.getTable(xClass)
+            xTable.do_sort(2)
+            xTable.do_sort(1, 1)
+            self.assertOrder(xTable, [(2, True), (1, False)])
+
+            xTable.do_sort(1, 1)
+            self.assertOrder(xTable, [(2, True), (1, True)])
+
+            xTable.do_sort(2, 1)
+            self.assertOrder(xTable, [(2, False), (1, True)])
+
+    # --------------------------------------------------------
+    # Rows appended after a sort are part of the next sort
+    # --------------------------------------------------------
+    def test_append(self):
+        for xClass in (TTable, TColumnTable):
+            xTable = self.getTable(xClass)
+            xTable.do_sort(1)
+            xTable.do_sort(1)
+
+            xTable.append([20, 'v9'])
+            xTable.append([-1, 'v9'])
+            xRows = self.mRows + [[20, 'v9'], [-1, 'v9']]
+
+            xTable.do_sort(1)
+            self.assertOrder(xTable, [(1, True)], xRows)
+            xTable.do_sort(1)
+            self.assertOrder(xTable, [(1, False)], xRows)
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestTableFilter(unittest.TestCase):
+    mRows = [['name{}'.format(x), 'Group{}'.format(x % 7)] for x in range(500)]
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def getTable(self, aClass):
+        xTable = aClass(['name', 'group'], 'filter', visible_items=20)
+        xTable.extend_rows(self.mRows)
+        return xTable
+
+    # --------------------------------------------------------
+    # The view holds the rows passing the filter, the sequence
+    # protocol covers all rows
+    # --------------------------------------------------------
+    def assertView(self, aTable, aMatch, aRows = None):
+        xRows = [[x] + y for x, y in enumerate(aRows or self.mRows)]
+        xView = [x for x in xRows if aMatch(x)]
+
+        self.assertEqual(aTable.getViewSize(), len(xView))
+        self.assertEqual(len(aTable), len(xRows))
+        self.assertEqual(len([x for x in aTable]), len(xRows))
+        self.assertEqual(aTable.get_header()['table_size'], len(xView))
+
+        # The last page ends with the last row of the view
+        xPages = [None] * len(xView)
+        aTable.do_navigate(TTable.NAVIGATION_TOP)
+        for xInx in range(0, len(xView), aTable.mVisibleRows):
+            for xPos, xRow in enumerate(aTable.get_raw_rows(), aTable.mCurrent):
+                xPages[xPos] = list(xRow)
+            aTable.do_navigate(TTable.NAVIGATION_NEXT)
+        self.assertEqual(xPages, xView)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_counts(self):
+        for xClass in (TTable, TColumnTable):
+            xTable = self.getTable(xClass)
+            self.assertView(xTable, lambda x: True)
+
+            xTable.do_filter(2, 'group3')
+            self.assertView(xTable, lambda x: x[2] == 'Group3')
+
+            xTable.do_filter(1, 'name1*')
+            self.assertView(xTable, lambda x: x[2] == 'Group3' and x[1].startswith('name1'))
+
+            xTable.do_filter(2, '')
+            xTable.do_filter(1, '*9?')
+            self.assertView(xTable, lambda x: len(x[1]) > 5 and x[1][-2] == '9')
+
+            xTable.do_filter(1, 'nothing')
+            self.assertView(xTable, lambda x: False)
+
+    # --------------------------------------------------------
+    # Appended rows passing the filter are added to the view
+    # --------------------------------------------------------
+    def test_append(self):
+        for xClass in (TTable, TColumnTable):
+            xTable = self.getTable(xClass)
+            xTable.do_filter(2, 'group3')
+            self.assertEqual(xTable.getViewSize(), 71)
+
+            xTable.append(['extra', 'Group3'])
+            xTable.append(['other', 'Group4'])
+            self.assertView(xTable, lambda x: x[2] == 'Group3', self.mRows + [['extra', 'Group3'], ['other', 'Group4']])
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestTableExtend(unittest.TestCase):
+    mRows = [[x, 'name{}'.format(x * 37 % 101), 1.5 * x] for x in range(150)]
+
+    # --------------------------------------------------------
+    # Return a table loaded by append and one by extend_rows
+    # --------------------------------------------------------
+    def getTables(self, aClass, aRows):
+        xAppend = aClass(['a', 'b', 'c'], 'load', visible_items=20)
+        for xRow in aRows:
+            xAppend.append(xRow)
+
+        xExtend = aClass(['a', 'b', 'c'], 'load', visible_items=20)
+        xExtend.extend_rows(aRows[:50])
+        xExtend.extend_rows(iter(aRows[50:]))
+        return xAppend, xExtend
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_same_as_append(self):
+        for xClass in (TTable, TColumnTable):
+            xAppend, xExtend = self.getTables(xClass, self.mRows + [['short']])
+
+            self.assertEqual([list(x) for x in xExtend], [list(x) for x in xAppend])
+            self.assertEqual(len(xExtend), len(self.mRows))
+            self.assertEqual(xExtend.mRowInx, xAppend.mRowInx)
+            self.assertEqual(xExtend.mColsType, xAppend.mColsType)
+            self.assertEqual(xExtend.getColsWidth(), xAppend.getColsWidth())
+            self.assertEqual(xExtend.get_header()['table_nav_type'], 'block')
+            self.assertEqual(list(xExtend.get_selected_row(42)), [42] + self.mRows[42])
+
+    # --------------------------------------------------------
+    # The column widths follow the rows loaded after the first
+    # output of the table
+    # --------------------------------------------------------
+    def test_width(self):
+        for xClass in (TTable, TColumnTable):
+            xTable = xClass(['a', 'b', 'c'], 'load', visible_items=20)
+            xTable.extend_rows(self.mRows[:5])
+            self.assertEqual(xTable.getColsWidth()[2], max(len(x[1]) for x in self.mRows[:5]))
+
+            xTable.extend_rows([[200, 'a' * 30, 2.5]])
+            self.assertEqual(xTable.getColsWidth()[2], 30)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_cells_and_row_ids(self):
+        xTable = TTable(['a'], 'load')
+        xCells = [TCell(aType=x) for x in range(3)]
+        xTable.extend_rows([['x'], ['y'], ['z']], xCells, [10, 20, 30])
+        xTable.extend_rows([['w']])
+
+        self.assertEqual([x[0].mValue for x in xTable.data[:3]], [10, 20, 30])
+        self.assertIs(xTable.get_selected_row(20)[0], xCells[1])
+
+        # The row-ids continue as for append
+        xAppend = TTable(['a'], 'load')
+        for xRow, xCell, xRowInx in zip([['x'], ['y'], ['z']], xCells, [10, 20, 30]):
+            xAppend.append(xRow, xCell, xRowInx)
+        xAppend.append(['w'])
+        self.assertEqual(xTable.data[-1], xAppend.data[-1])
+        self.assertEqual(xTable.mRowInx, xAppend.mRowInx)
+
+    # --------------------------------------------------------
+    # Tables stored in a cell are linked to the loading table
+    # --------------------------------------------------------
+    def test_nested_tables(self):
+        xTable   = TTable(['name', 'table'], 'root')
+        xNested  = [TTable(['a'], 'sub{}'.format(x)) for x in range(3)]
+        xTable.extend_rows([['n{}'.format(x), y] for x, y in enumerate(xNested)])
+
+        for xInx, xSub in enumerate(xNested):
+            self.assertIs(xSub.get_parent(), xTable)
+            self.assertEqual(xSub.get_path(), 'root/sub{}'.format(xInx))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+    EezzServer:
+    High speed application development and
+    high speed execution based on HTML5
+
+    Copyright (C) 2015  Albert Zedlitz
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Description:
+   Frames of TWebSocketClient compared to the messages of the client
+   python3 -m unittest discover tests
+
+"""
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+import unittest
+import zlib
+from   eezz.websocket import TWebSocketClient, TWebSocketException
+from   eezz.deflate   import TDeflate, DEFLATE_TAIL
+
+
+# --------------------------------------------------------
+# Return a frame as sent by a client, masked for aMask
+# --------------------------------------------------------
+def getFrame(aPayload, aOpcode = 0x1, aFinal = True, aMask = None, aDeflate = False):
+    xByte0 = (0x80 if aFinal else 0) | (0x40 if aDeflate else 0) | aOpcode
+    xMask  = 0x80 if aMask else 0
+    if len(aPayload) < 126:
+        xFrame = struct.pack('>BB', xByte0, xMask | len(aPayload))
+    elif len(aPayload) <= 0xffff:
+        xFrame = struct.pack('>BBH', xByte0, xMask | 126, len(aPayload))
+    else:
+        xFrame = struct.pack('>BBQ', xByte0, xMask | 127, len(aPayload))
+
+    if aMask:
+        aPayload = bytes(x ^ aMask[i % 4] for i, x in enumerate(aPayload))
+        xFrame  += aMask
+    return xFrame + aPayload
+
+
+# --------------------------------------------------------
+# Read a frame sent by the server. Returns the first byte,
+# the mask and the unmasked payload
+# --------------------------------------------------------
+def readFrame(aSocket):
+    def readBytes(aSize):
+        xData = bytearray()
+        while len(xData) < aSize:
+            xPart = aSocket.recv(aSize - len(xData))
+            if not xPart:
+                raise EOFError('connection closed')
+            xData.extend(xPart)
+        return bytes(xData)
+
+    xByte0, xByte1 = readBytes(2)
+    xLength = xByte1 & 0x7f
+    if xLength == 126:
+        xLength = struct.unpack('>H', readBytes(2))[0]
+    elif xLength == 127:
+        xLength = struct.unpack('>Q', readBytes(8))[0]
+
+    xMask    = readBytes(4) if xByte1 & 0x80 else None
+    xPayload = readBytes(xLength)
+    if xMask:
+        xPayload = bytes(x ^ xMask[i % 4] for i, x in enumerate(xPayload))
+    return xByte0, xMask, xPayload
+
+
+# --------------------------------------------------------
+# Keeps the requests instead of executing them
+# --------------------------------------------------------
+class TFrameClient(TWebSocketClient):
+    def __init__(self, aSocket, aBufferSize = 65536 * 4):
+        super().__init__((aSocket, None), None)
+        self.mBufferSize = aBufferSize
+        self.mBuffer     = bytearray(aBufferSize)
+        self.mState      = 1
+        self.mCalls      = list()
+
+    def dispatch(self, aFunction, *aArgs):
+        self.mCalls.append((aFunction.__name__,) + aArgs)
+
+
+# --------------------------------------------------------
+# A client connected to a socket of the test
+# --------------------------------------------------------
+class TFrameTestCase(unittest.TestCase):
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def setUp(self):
+        self.mPeer, xSocket = socket.socketpair()
+        self.mClient = TFrameClient(xSocket)
+
+    def tearDown(self):
+        self.mPeer.close()
+        self.mClient.mSocket.close()
+
+    # --------------------------------------------------------
+    # Send the data in parts of aChunk bytes and parse each
+    # part as soon as it arrives
+    # --------------------------------------------------------
+    def feed(self, aData, aChunk = 4096):
+        for xInx in range(0, len(aData), aChunk):
+            self.mPeer.sendall(aData[xInx:xInx + aChunk])
+            while select.select([self.mClient.mSocket], [], [], 0)[0]:
+                self.mClient.doInput()
+
+    # --------------------------------------------------------
+    # Return the text messages of the requests
+    # --------------------------------------------------------
+    def getMessages(self):
+        return [x[1] for x in self.mClient.mCalls if x[0] == 'handleMessage']
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestFrameParser(TFrameTestCase):
+    # --------------------------------------------------------
+    # The length is encoded in 7, 16 and 64 bit
+    # --------------------------------------------------------
+    def test_masked_frames(self):
+        xMessages = [{'data': 'x' * x} for x in (0, 100, 200, 70000)]
+        for xMessage in xMessages:
+            self.feed(getFrame(json.dumps(xMessage).encode('utf-8'), aMask=os.urandom(4)))
+        self.assertEqual(self.getMessages(), xMessages)
+        self.assertEqual(self.mClient.mStart, self.mClient.mEnd)
+
+    # --------------------------------------------------------
+    # Headers, masks and payloads are split at any position
+    # --------------------------------------------------------
+    def test_split_frames(self):
+        xMessages = [{'data': 'y' * x, 'inx': x} for x in range(0, 300, 37)]
+        xData     = b''.join(getFrame(json.dumps(x).encode('utf-8'), aMask=os.urandom(4)) for x in xMessages)
+        for xChunk in (1, 2, 3, 5, 7, 1000, len(xData)):
+            self.mClient.mCalls.clear()
+            self.feed(xData, xChunk)
+            self.assertEqual(self.getMessages(), xMessages)
+
+    # --------------------------------------------------------
+    # The rest of a frame is moved to the front of the buffer
+    # --------------------------------------------------------
+    def test_small_buffer(self):
+        self.mClient = TFrameClient(self.mClient.mSocket, 256)
+        xMessages    = [{'data': 'z' * (x % 200)} for x in range(100)]
+        xData        = b''.join(getFrame(json.dumps(x).encode('utf-8'), aMask=os.urandom(4)) for x in xMessages)
+        for xChunk in (100, 1000):
+            self.mClient.mCalls.clear()
+            self.feed(xData, xChunk)
+            self.assertEqual(self.getMessages(), xMessages)
+
+    # --------------------------------------------------------
+    # Unmasked frames of a client are accepted
+    # --------------------------------------------------------
+    def test_unmasked_frames(self):
+        self.feed(getFrame(b'{"a": 1}') + getFrame(b'{"b": 2}', aMask=b'\x00\x00\x00\x00'))
+        self.assertEqual(self.getMessages(), [{'a': 1}, {'b': 2}])
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_invalid_frames(self):
+        xFrames = [getFrame(b'{}', aDeflate=True), getFrame(b'{}', 0x3),
+                   getFrame(b'', 0x9, aFinal=False), getFrame(b'x' * 126, 0x9)]
+        for xFrame in xFrames:
+            self.tearDown()
+            self.setUp()
+            with self.assertRaises(TWebSocketException):
+                self.feed(xFrame)
+            self.assertEqual(self.mClient.mState, -1)
+
+    # --------------------------------------------------------
+    # The client closes the connection with a close frame
+    # --------------------------------------------------------
+    def test_close_frame(self):
+        with self.assertRaises(TWebSocketException):
+            self.feed(getFrame(b'{"a": 1}', aMask=os.urandom(4)) + getFrame(b'', 0x8, aMask=os.urandom(4)))
+        self.assertEqual(self.getMessages(), [{'a': 1}])
+
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestFragments(TFrameTestCase):
+    # --------------------------------------------------------
+    # Return the parts of a download as (start, data)
+    # --------------------------------------------------------
+    def getDownload(self):
+        xParts = [x for x in self.mClient.mCalls if x[0] == 'handleDownload']
+        for xName, xHeader, xData in xParts:
+            self.assertEqual(xHeader['file']['name'], 'data.bin')
+            self.assertEqual(xHeader['file'].get('chunkSize', len(xData)), len(xData))
+        return [(x[1]['file'].get('start', 0), x[2]) for x in xParts]
+
+    # --------------------------------------------------------
+    # Control frames are answered between the fragments
+    # --------------------------------------------------------
+    def test_fragmented_text(self):
+        xText  = json.dumps({'data': 'abc' * 500}).encode('utf-8')
+        xData  = getFrame(xText[:10], 0x1, False, os.urandom(4))
+        xData += getFrame(b'hi', 0x9, aMask=os.urandom(4))
+        xData += getFrame(xText[10:1000], 0x0, False, os.urandom(4))
+        xData += getFrame(xText[1000:], 0x0, True, os.urandom(4))
+        for xChunk in (1, 7, 4096):
+            self.mClient.mCalls.clear()
+            self.feed(xData, xChunk)
+            self.assertEqual(self.getMessages(), [{'data': 'abc' * 500}])
+            self.assertEqual(self.mPeer.recv(16), b'\x8a\x02hi')
+            self.assertEqual(self.mClient.mMessage, bytearray())
+
+    # --------------------------------------------------------
+    # A frame larger than the buffer is passed on in parts
+    # --------------------------------------------------------
+    def test_streamed_binary(self):
+        self.mClient = TFrameClient(self.mClient.mSocket, 1024)
+        xContent     = os.urandom(10000)
+        self.feed(getFrame(json.dumps({'file': {'name': 'data.bin', 'start': 100}}).encode('utf-8'), aMask=os.urandom(4)))
+        self.feed(getFrame(xContent, 0x2, aMask=os.urandom(4)), 999)
+
+        xParts = self.getDownload()
+        self.assertGreater(len(xParts), 1)
+        self.assertTrue(all(len(x[1]) <= 1024 for x in xParts))
+        self.assertEqual(b''.join(x[1] for x in xParts), xContent)
+        self.assertEqual([x[0] for x in xParts], [100 + sum(len(y[1]) for y in xParts[:x]) for x in range(len(xParts))])
+        self.assertEqual(self.mClient.mDownload, None)
+
+    # --------------------------------------------------------
+    # Each fragment of a binary message is a part of the file
+    # --------------------------------------------------------
+    def test_fragmented_binary(self):
+        xContent = os.urandom(9000)
+        xData    = getFrame(json.dumps({'file': {'name': 'data.bin'}}).encode('utf-8'), aMask=os.urandom(4))
+        xData   += getFrame(xContent[:3000], 0x2, False, os.urandom(4))
+        xData   += getFrame(xContent[3000:6000], 0x0, False, os.urandom(4))
+        xData   += getFrame(xContent[6000:], 0x0, True, os.urandom(4))
+        self.feed(xData)
+        self.assertEqual(self.getDownload(), [(0, xContent[:3000]), (3000, xContent[3000:6000]), (6000, xContent[6000:])])
+
+        # A message of one frame is passed on with its header
+        self.mClient.mCalls.clear()
+        xHeader = {'file': {'name': 'data.bin', 'chunkSize': 500}}
+        self.feed(getFrame(json.dumps(xHeader).encode('utf-8')) + getFrame(xContent[:500], 0x2))
+        self.assertEqual(self.mClient.mCalls, [('handleDownload', xHeader, xContent[:500])])
+
+        # Without header the binary message is dropped
+        self.mClient.mCalls.clear()
+        self.feed(getFrame(xContent, 0x2, aMask=os.urandom(4)))
+        self.assertEqual(self.mClient.mCalls, [])
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_invalid_fragments(self):
+        xFrames = [getFrame(b'{}', 0x0),
+                   getFrame(b'{', 0x1, False) + getFrame(b'}', 0x1),
+                   getFrame(b'{', 0x1, False) + getFrame(b'}', 0x2)]
+        for xFrame in xFrames:
+            self.tearDown()
+            self.setUp()
+            with self.assertRaises(TWebSocketException):
+                self.feed(xFrame)
+
+    # --------------------------------------------------------
+    # The size of all fragments is limited
+    # --------------------------------------------------------
+    def test_message_limit(self):
+        self.mClient.mMaxMessage = 1000
+        self.feed(getFrame(b'"' + b'x' * 997 + b'"', aMask=os.urandom(4)))
+        self.assertEqual(self.getMessages(), ['x' * 997])
+
+        with self.assertRaises(TWebSocketException):
+            self.feed(getFrame(b'"' + b'x' * 600, 0x1, False) + getFrame(b'x' * 400 + b'"', 0x0))
+
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestDeflateFrames(TFrameTestCase):
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def setUp(self):
+        super().setUp()
+        self.mClient.mDeflater = TDeflate()
+        self.mDeflater = zlib.compressobj(6, zlib.DEFLATED, -15)
+        self.mInflater = zlib.decompressobj(-15)
+
+    # --------------------------------------------------------
+    # Compress a message as the browser does
+    # --------------------------------------------------------
+    def compress(self, aData):
+        return (self.mDeflater.compress(aData) + self.mDeflater.flush(zlib.Z_SYNC_FLUSH))[:-len(DEFLATE_TAIL)]
+
+    # --------------------------------------------------------
+    # The extension is confirmed in the handshake
+    # --------------------------------------------------------
+    def test_handshake(self):
+        xRequest = 'GET / HTTP/1.1\r\nUpgrade: websocket\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n'
+        xOffer   = 'Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits\r\n'
+        for xDeflate in (True, False):
+            self.mClient.mDeflate  = xDeflate
+            self.mClient.mDeflater = None
+            xResponse = self.mClient.genHandshake(xRequest + xOffer + '\r\n')
+            self.assertIn('Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=\r\n', xResponse)
+            self.assertEqual('Sec-WebSocket-Extensions: permessage-deflate\r\n' in xResponse, xDeflate)
+            self.assertEqual(self.mClient.mDeflater != None, xDeflate)
+
+        xResponse = self.mClient.genHandshake(xRequest + '\r\n')
+        self.assertNotIn('Sec-WebSocket-Extensions', xResponse)
+        self.assertEqual(self.mClient.mDeflater, None)
+
+    # --------------------------------------------------------
+    # Messages from mDeflateSize bytes are sent compressed
+    # --------------------------------------------------------
+    def test_send(self):
+        xMessages = [json.dumps({'update': {'aTable.innerHTML': '<tr><td>{}</td></tr>'.format(x) * x}}).encode('utf-8') for x in range(0, 100, 9)]
+        for xMessage in xMessages:
+            self.mClient.writeFrame(xMessage)
+            xByte0, xMask, xPayload = readFrame(self.mPeer)
+            self.assertEqual(xMask, None)
+            self.assertEqual(xByte0 & 0x8f, 0x81)
+            if len(xMessage) < self.mClient.mDeflateSize:
+                self.assertEqual(xByte0 & 0x40, 0)
+                self.assertEqual(xPayload, xMessage)
+            else:
+                self.assertEqual(xByte0 & 0x40, 0x40)
+                self.assertLess(len(xPayload), len(xMessage))
+                self.assertEqual(self.mInflater.decompress(xPayload + DEFLATE_TAIL), xMessage)
+
+        # Control frames are not compressed
+        self.mClient.writeFrame(b'p' * 100, 0x9)
+        self.assertEqual(readFrame(self.mPeer), (0x89, None, b'p' * 100))
+
+    # --------------------------------------------------------
+    # Compressed messages of one or more fragments, mixed with
+    # uncompressed messages. The first fragment is marked
+    # --------------------------------------------------------
+    def test_receive(self):
+        xMessages = [{'data': 'abc' * x, 'inx': x} for x in range(0, 400, 40)]
+        xData     = bytearray()
+        for xInx, xMessage in enumerate(xMessages):
+            xText = json.dumps(xMessage).encode('utf-8')
+            if xInx % 3 == 0:
+                xData += getFrame(xText, aMask=os.urandom(4))
+                continue
+
+            xText = self.compress(xText)
+            if xInx % 3 == 1:
+                xData += getFrame(xText, aMask=os.urandom(4), aDeflate=True)
+            else:
+                xData += getFrame(xText[:5], 0x1, False, os.urandom(4), True)
+                xData += getFrame(xText[5:], 0x0, True, os.urandom(4))
+
+        for xChunk in (1, 10, 4096):
+            self.mClient.mCalls.clear()
+            self.mClient.mDeflater = TDeflate()
+            self.feed(bytes(xData), xChunk)
+            self.assertEqual(self.getMessages(), xMessages)
+
+    # --------------------------------------------------------
+    # The size after decompression is limited
+    # --------------------------------------------------------
+    def test_message_limit(self):
+        self.mClient.mMaxMessage = 10000
+        with self.assertRaises(TWebSocketException):
+            self.feed(getFrame(self.compress(b'"' + b' ' * 20000 + b'"'), aMask=os.urandom(4), aDeflate=True))
+
+    # --------------------------------------------------------
+    # The continuation of a compressed message is not marked
+    # --------------------------------------------------------
+    def test_invalid_continuation(self):
+        with self.assertRaises(TWebSocketException):
+            self.feed(getFrame(self.compress(b'{}'), 0x1, False, aDeflate=True) + getFrame(b'', 0x0, aDeflate=True))
+
+
+
+# --------------------------------------------------------
+# Records the data sent and the system calls
+# --------------------------------------------------------
+class TStreamSocket:
+    family = socket.AF_UNIX
+
+    def __init__(self):
+        self.mData  = bytearray()
+        self.mCalls = list()
+
+    def sendall(self, aData):
+        self.mCalls.append('sendall')
+        self.mData.extend(aData)
+
+
+    def recv(self, aSize):
+        xData = self.mData[:aSize]
+        del self.mData[:aSize]
+        return bytes(xData)
+
+
+# --------------------------------------------------------
+# Sends at most aLimit bytes with sendmsg and waits aDelay
+# seconds after the partial write
+# --------------------------------------------------------
+class TMessageSocket(TStreamSocket):
+    def __init__(self, aLimit = None, aDelay = 0):
+        super().__init__()
+        self.mLimit = aLimit
+        self.mDelay = aDelay
+
+    def sendmsg(self, aBuffers):
+        self.mCalls.append('sendmsg')
+        xData = b''.join(bytes(x) for x in aBuffers)[:self.mLimit]
+        self.mData.extend(xData)
+        time.sleep(self.mDelay)
+        return len(xData)
+
+
+# --------------------------------------------------------
+# --------------------------------------------------------
+class TestSendFrame(unittest.TestCase):
+    mLengths = [0, 1, 125, 126, 127, 65535, 65536, 300000]
+
+    # --------------------------------------------------------
+    # The length is encoded in 7, 16 or 64 bit, header and
+    # payload are sent with one call
+    # --------------------------------------------------------
+    def test_lengths(self):
+        for xLength in self.mLengths:
+            for xMask in (None, os.urandom(4)):
+                xSocket = TMessageSocket()
+                xData   = os.urandom(xLength)
+                TFrameClient(xSocket).writeFrame(xData, 0x2, aMaskVector=xMask)
+                self.assertEqual(xSocket.mCalls, ['sendmsg'])
+                self.assertEqual(bytes(xSocket.mData), getFrame(xData, 0x2, aMask=xMask))
+
+    # --------------------------------------------------------
+    # The rest of a partial write is sent with sendall
+    # --------------------------------------------------------
+    def test_partial_write(self):
+        xData = os.urandom(1000)
+        for xMask in (None, os.urandom(4)):
+            xFrame = getFrame(xData, 0x2, aMask=xMask)
+            for xLimit in (0, 1, 3, 4, 5, 8, 9, 500, len(xFrame) - 1, len(xFrame)):
+                xSocket = TMessageSocket(xLimit)
+                TFrameClient(xSocket).writeFrame(xData, 0x2, aMaskVector=xMask)
+                self.assertEqual(bytes(xSocket.mData), xFrame)
+                self.assertEqual(xSocket.mCalls[0], 'sendmsg')
+                self.assertLessEqual(len(xSocket.mCalls), 3)
+
+    # --------------------------------------------------------
+    # --------------------------------------------------------
+    def test_without_sendmsg(self):
+        xSocket = TStreamSocket()
+        TFrameClient(xSocket).writeFrame(b'{"a": 1}')
+        self.assertEqual(xSocket.mCalls, ['sendall'])
+        self.assertEqual(bytes(xSocket.mData), getFrame(b'{"a": 1}'))
+
+    # --------------------------------------------------------
+    # The frames of concurrent writers are not mixed, also if
+    # the rest of a frame is sent with a second call
+    # --------------------------------------------------------
+    def test_concurrent_writers(self):
+        xSocket  = TMessageSocket(100, 0.001)
+        xClient  = TFrameClient(xSocket)
+        xLengths = [x * 997 % 3000 for x in range(20)]
+
+        def writeFrames(aInx):
+            for xLength in xLengths:
+                xClient.writeFrame(bytes([aInx]) * xLength, 0x2)
+
+        xThreads = [threading.Thread(target=writeFrames, args=(x,)) for x in range(4)]
+        for xThread in xThreads:
+            xThread.start()
+        for xThread in xThreads:
+            xThread.join()
+
+        xFrames = [readFrame(xSocket) for x in range(len(xThreads) * len(xLengths))]
+        self.assertEqual(xSocket.mData, bytearray())
+        for xInx in range(len(xThreads)):
+            xPayloads = [x[2] for x in xFrames if x[2][:1] == bytes([xInx])]
+            self.assertEqual(xPayloads, [bytes([xInx]) * x for x in xLengths if x > 0])
+        self.assertTrue(all(x[0] == 0x82 for x in xFrames))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -137,6 +137,11 @@ function eezzConnect() {
                 }
             }
         }    
+        
+        /* update table rows: apply the row patch of the server */
+        for (xKeyElement in aJson.patch) {
+            eezzPatchRows(xKeyElement, aJson.patch[xKeyElement]);
+        }
     	
         /* Start reading files */
         if (aJson.files) {
@@ -170,6 +175,79 @@ function eezzConnect() {
     }     
 }
 
+/* --------------------------------- */
+/* Apply a row patch to a table:     */
+/* Rows are identified by the        */
+/* attribute data-eezz-row           */
+/* --------------------------------- */
+function eezzPatchRows(aName, aPatch) {
+    var xTable = document.getElementsByName( aName );
+    
+    if (xTable.length == 0 || xTable[0].tBodies.length == 0) {
+    	return;
+    }
+    
+    var xBody   = xTable[0].tBodies[0];
+    var xTemp   = document.createElement('tbody');
+    var xRowMap = {};
+    var xRow;
+    var xRowId;
+    
+    for (var i = 0; i < xBody.rows.length; i++) {
+    	xRowId = xBody.rows[i].getAttribute('data-eezz-row');
+    	if (xRowId != null) {
+    		xRowMap[xRowId] = xBody.rows[i];
+    	}
+    }
+    
+    if (aPatch.remove) {
+    	for (var i = 0; i < aPatch.remove.length; i++) {
+    		xRow = xRowMap[aPatch.remove[i]];
+    		if (xRow) {
+    			xBody.removeChild(xRow);
+    			delete xRowMap[aPatch.remove[i]];
+    		}
+    	}
+    }
+    
+    for (xRowId in aPatch.change) {
+    	xTemp.innerHTML = decodeURIComponent( aPatch.change[xRowId] );
+    	xRow = xTemp.rows[0];
+    	if (xRowMap[xRowId]) {
+    		xBody.replaceChild(xRow, xRowMap[xRowId]);
+    	}
+    	else {
+    		xBody.appendChild(xRow);
+    	}
+    	xRowMap[xRowId] = xRow;
+    }
+    
+    for (xRowId in aPatch.insert) {
+    	xTemp.innerHTML = decodeURIComponent( aPatch.insert[xRowId] );
+    	xRow = xTemp.rows[0];
+    	xBody.appendChild(xRow);
+    	xRowMap[xRowId] = xRow;
+    }
+    
+    /* appendChild moves an existing row to the end */
+    if (aPatch.order) {
+    	for (var i = 0; i < aPatch.order.length; i++) {
+    		if (xRowMap[aPatch.order[i]]) {
+    			xBody.appendChild(xRowMap[aPatch.order[i]]);
+    		}
+    	}
+    }
+    
+    if ('select' in aPatch) {
+    	for (xRowId in xRowMap) {
+    		xRowMap[xRowId].classList.remove('eezzSelected');
+    	}
+    	if (aPatch.select != null && xRowMap[aPatch.select]) {
+    		xRowMap[aPatch.select].classList.add('eezzSelected');
+    	}
+    }
+}
+
 /* --------------------------------- */
 /* --------------------------------- */
 function eezzTreeExCo(aElement) {
@@ -381,6 +459,15 @@ function easyClick(aEvent, aElement) {
         	        	
         }
         
+        /* shift-click adds a column to the sort of a table */
+        if (aEvent && aEvent.shiftKey) {
+            for (xMethod in aJson.callback) {
+                if (/\.do_sort$/.test(xMethod)) {
+                    aJson.callback[xMethod]['multiple'] = '1';
+                }
+            }
+        }
+
 	    for (xMethod in aJson.callback) {
 	        for (xArg in aJson.callback[xMethod]) {
 	            aDest = aJson.callback[xMethod][xArg];